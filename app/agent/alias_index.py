@@ -0,0 +1,47 @@
+import re
+import unicodedata
+
+TOKEN = re.compile(r"\w+")
+
+
+def normalizar(texto):
+    return "".join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c)).lower()
+
+
+class IndiceAlias:
+
+    # Trie de tokens con los alias ya normalizados. Un mensaje se recorre una
+    # sola vez y solo hay match en límites de palabra ('gober' no pega en
+    # 'gobernanza'). Si varios VIP coinciden gana el que aparece primero en
+    # el JSON, igual que el recorrido original.
+    def __init__(self, vip_data):
+        self.vip_data = vip_data
+        self.raiz = {}
+        self._orden = []
+        for orden, (key, data) in enumerate(vip_data.items()):
+            self._orden.append(data)
+            for alias in data.get("alias", []):
+                tokens = TOKEN.findall(normalizar(alias))
+                if not tokens:
+                    continue
+                nodo = self.raiz
+                for tok in tokens:
+                    nodo = nodo.setdefault(tok, {})
+                # None como llave de fin: ningún token normalizado puede ser None
+                nodo[None] = min(nodo.get(None, orden), orden)
+
+    def buscar(self, mensaje):
+        tokens = TOKEN.findall(normalizar(mensaje))
+        mejor = None
+        for i in range(len(tokens)):
+            nodo = self.raiz
+            for tok in tokens[i:]:
+                nodo = nodo.get(tok)
+                if nodo is None:
+                    break
+                orden = nodo.get(None)
+                if orden is not None and (mejor is None or orden < mejor):
+                    mejor = orden
+                    if mejor == 0:
+                        return self._orden[0]
+        return self._orden[mejor] if mejor is not None else None
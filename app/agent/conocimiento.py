@@ -0,0 +1,205 @@
+import os
+import json
+import glob
+import time
+import threading
+import vertexai
+from vertexai.generative_models import GenerativeModel, Tool, FunctionDeclaration
+from app.agent.alias_index import IndiceAlias
+from app.agent.recuperacion import IndiceBM25, fragmentar
+from app.config import CONOCIMIENTO_FRAGMENTO_PALABRAS
+
+# Todo lo que no depende de la sesión (VIPs, índice de la base de conocimiento,
+# prompt de sistema, herramientas y el GenerativeModel) se arma una sola vez por
+# proceso y lo comparten todos los agentes. Se recarga solo si cambian los
+# archivos. El conocimiento y los VIP ya no van completos en el prompt de
+# sistema: a cada turno se agregan solo los fragmentos y el VIP que aplican.
+REVISAR_CADA_SEGUNDOS = 5
+
+# Quién construye los GenerativeModel; el modo offline pone aquí un modelo falso
+_fabrica_modelo = GenerativeModel
+
+
+def construir_system_instruction():
+    return (
+        "Eres Maleón, asistente yucateco del IMET. Hablas con cortesía y calidez, usando 'nené' como forma cariñosa de decir bebé, 'mare' como expresión de asombro, 'ne’' como trato coloquial equivalente a wey o che pero respetuoso, 'waay' como sorpresa fuerte y 'maaa' como expresión suave de asombro."
+        "--- PRIORIDAD DE IDENTIFICACIÓN ---\n"
+        "Tu primera prioridad es identificar al usuario.\n"
+        "Cuando el sistema reconoce a un Invitado VIP, el mensaje trae una marca [VIP: nombre, cargo, temas].\n"
+        "Si viene esa marca (por ejemplo Daniel o el director de ALBA), recuerda su nombre durante toda kla conversacion, si busacas uno deja de buscar los demás. "
+        "salúdalo por su nombre y menciona su cargo con respeto dentro del informe.\n\n"
+        "\n--- FLUJO CONVERSACIONAL ---\n"
+        "1. Tu meta es llevar al usuario a un análisis de el usuario. La pregunta 'Que tal, cuéntame cómo te gustaría ser recordado' es tu llave para abrir la asesoría, úsala de forma natural al iniciar la charla o cuando el contexto sea propicio. Porfa pero no la metas a la fuerza, que se sienta orgánica ne’. "
+        "2. Basado en su respuesta, haz 1 o 2 preguntas sobre sus logros actuales y los retos que le gustaría superar. (esto sin sonar frozado y metelas cuando el contexto lo permita, no las metas a la fuerza). "
+        "3. FILTRO ESTRATÉGICO: Identifica discretamente si el interés es: Negocio (Crecimiento), Seguridad o Servicios. "
+        "\n--- REGLA DE NO-INTERROGATORIO Y VARIABLES DINÁMICAS ---\n"
+        "PROHIBIDO preguntar por variables técnicas (v1, v2, v3), ventas o datos financieros. Intúyelos estratégicamente según el contexto de la plática: si detectas una gran empresa usa valores de escala alta; si es un pequeño emprendimiento o negocio local, usa valores modestos ne’."
+        "\nHaz UN SOLO INTENTO sutil por el municipio (ej. '¿Eso lo ha sentido en algún rumbo en especial?'). Si no responden o hablan de Yucatán de forma general, no insistas waay. Activa la herramienta con el parámetro muni='YUCATAN' para que el sistema procese el CSV completo del estado."
+        "\n--- MAPEO DE HERRAMIENTAS ---\n"
+        "- NEGOCIO: Activa 'predecir_crecimiento'. Parámetros: [codigo, muni, v1, v2, v3].\n"
+        "- SEGURIDAD: Activa 'consultar_seguridad'. Parámetro: [muni].\n"
+        "- SERVICIOS: Activa 'buscar_servicios'. Parámetro: [muni].\n"
+        "PROHIBIDO usar 'mira'.\n\n"
+        "--- REGLA DE CHARLA ABIERTA ---"
+        "No te niegues NUNCA a charlar sobre temas generales o personales (clima, ropa, saludos, etc.) ne’. "
+        "Sé un compañero cálido primero. Si el tema no es estratégico, responde con naturalidad waay "
+        "y solo después, cuando sientas que la plática fluye, intenta llevarla sutilmente hacia el legado o los retos de gobierno. "
+        "No seas un robot de ventanilla; sé un yucateco platicador."
+        "--- CONOCIMIENTO ---\n"
+        "Cada mensaje puede traer un bloque [CONOCIMIENTO] con los fragmentos relevantes de los archivos del IMET, TechMaleón y el Renacimiento Maya. "
+        "Úsalo como fuente principal para responder; si no viene o no alcanza, responde con lo que sabes sin inventar datos institucionales.\n"
+        "--- REGLAS ---\n"
+        "1. CERO MARKDOWN. 2. BREVEDAD (30-40 palabras). 3. PUNTO FINAL."
+    )
+
+
+def construir_tools():
+    crecimiento_tool = FunctionDeclaration(
+        name="predecir_crecimiento",
+        description="Usa CatBoost para calcular el potencial de un negocio.",
+        parameters={
+            "type": "object",
+            "properties": {
+                "codigo": {"type": "string"}, 
+                "muni": {"type": "string"},
+                "v1": {"type": "number"}, 
+                "v2": {"type": "number"}, 
+                "v3": {"type": "number"}
+            },
+            "required": ["codigo", "muni", "v1", "v2", "v3"]
+        }
+    )
+    servicios_tool = FunctionDeclaration(
+        name="buscar_servicios",
+        description="Busca servicios mapeados en el CSV.",
+        parameters={
+            "type": "object",
+            "properties": {"muni": {"type": "string"}},
+            "required": ["muni"]
+        }
+    )
+
+    # Herramienta para Seguridad
+    seguridad_tool = FunctionDeclaration(
+        name="consultar_seguridad",
+        description="Consulta el nivel de riesgo y negocios aislados en un municipio.",
+        parameters={
+            "type": "object",
+            "properties": {"muni": {"type": "string"}},
+            "required": ["muni"]
+        }
+    )
+
+    return Tool(function_declarations=[crecimiento_tool, servicios_tool, seguridad_tool])
+
+
+def cargar_vip(vip_file):
+    try:
+        if os.path.exists(vip_file):
+            with open(vip_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except: pass
+    return {}
+
+
+def cargar_conocimiento(knowledge_path):
+    # Texto completo: ya no va en el paquete; lo usa el benchmark para medir el prompt de antes
+    knowledge_text = ""
+    try:
+        files = sorted(glob.glob(knowledge_path))
+        for file_path in files:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                knowledge_text += f"\n--- INFO {os.path.basename(file_path)} ---\n{f.read()}\n"
+    except: pass
+    return knowledge_text
+
+
+def cargar_fragmentos(knowledge_path, palabras=CONOCIMIENTO_FRAGMENTO_PALABRAS):
+    fragmentos = []
+    try:
+        for file_path in sorted(glob.glob(knowledge_path)):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                fragmentos.extend(fragmentar(os.path.basename(file_path), f.read(), palabras))
+    except Exception as e:
+        print(f"Error fragmentando conocimiento: {e}")
+    return fragmentos
+
+
+def firma_archivos(vip_file, knowledge_path):
+    firma = []
+    for ruta in [vip_file] + sorted(glob.glob(knowledge_path)):
+        try:
+            st = os.stat(ruta)
+            firma.append((ruta, st.st_mtime_ns, st.st_size))
+        except OSError:
+            firma.append((ruta, None, None))
+    return tuple(firma)
+
+
+class PaqueteConocimiento:
+
+    # Inmutable por convención: una recarga crea un paquete nuevo y las
+    # sesiones ya abiertas se quedan con el suyo hasta que terminan.
+    def __init__(self, vip_file, knowledge_path):
+        self.firma = firma_archivos(vip_file, knowledge_path)
+        self.vip_data = cargar_vip(vip_file)
+        self.indice_alias = IndiceAlias(self.vip_data)
+        self.indice_conocimiento = IndiceBM25(cargar_fragmentos(knowledge_path))
+        self.system_instruction = construir_system_instruction()
+        self.tools = construir_tools()
+        self.model = crear_modelo("gemini-2.5-flash", system_instruction=self.system_instruction,
+            tools=[self.tools])
+
+    def memoria_aproximada(self):
+        return (len(self.system_instruction.encode("utf-8"))
+                + sum(len(texto.encode("utf-8")) for _, texto in self.indice_conocimiento.fragmentos)
+                + len(json.dumps(self.vip_data).encode("utf-8")))
+
+
+_paquetes = {}
+_revisado = {}
+_lock = threading.Lock()
+# Aparte de _lock: crear_modelo se llama con _lock tomado al armar un paquete
+_lock_vertex = threading.Lock()
+_vertex_iniciado = False
+
+
+def iniciar_vertex():
+    # Antes corría al importar core.py; ahora la primera vez que se necesita
+    # (o en el arranque, en paralelo con lo demás)
+    global _vertex_iniciado
+    with _lock_vertex:
+        if not _vertex_iniciado:
+            vertexai.init(project=os.getenv("GCP_PROJECT_ID"), location="us-central1")
+            _vertex_iniciado = True
+
+
+def crear_modelo(nombre, **kwargs):
+    if _fabrica_modelo is GenerativeModel:
+        iniciar_vertex()
+    return _fabrica_modelo(nombre, **kwargs)
+
+
+def usar_fabrica_modelo(fabrica):
+    # Los paquetes ya armados traen el modelo anterior: se tiran todos
+    global _fabrica_modelo
+    with _lock:
+        _fabrica_modelo = fabrica
+        _paquetes.clear()
+        _revisado.clear()
+
+
+def obtener_paquete(vip_file, knowledge_path, forzar_revision=False):
+    llave = (vip_file, knowledge_path)
+    ahora = time.monotonic()
+    with _lock:
+        paquete = _paquetes.get(llave)
+        if paquete is not None and not forzar_revision and ahora - _revisado[llave] < REVISAR_CADA_SEGUNDOS:
+            return paquete
+        _revisado[llave] = ahora
+        if paquete is None or paquete.firma != firma_archivos(vip_file, knowledge_path):
+            if paquete is not None:
+                print("Conocimiento modificado en disco, recargando paquete compartido")
+            paquete = PaqueteConocimiento(vip_file, knowledge_path)
+            _paquetes[llave] = paquete
+        return paquete
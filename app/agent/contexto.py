@@ -0,0 +1,115 @@
+from vertexai.generative_models import Content, Part
+from app.config import (
+    CONTEXTO_TURNOS_RECIENTES, CONTEXTO_MAX_TURNOS, CONTEXTO_MAX_TOKENS, CONTEXTO_RESUMEN_MAX_TOKENS
+)
+
+# Ventana de contexto del ChatSession: se mandan completos solo los turnos
+# recientes y todo lo anterior queda en un resumen que se va actualizando.
+# Un turno es un mensaje del usuario más lo que contestó el modelo (texto o
+# llamada a herramienta). El resumen entra al historial como el primer par
+# usuario/modelo, porque Gemini exige que el historial empiece con el usuario.
+
+MARCA_RESUMEN = "[Resumen de la conversación anterior]"
+
+
+def estimar_tokens(texto):
+    # ~4 caracteres por token en español; alcanza para presupuestos
+    return len(texto) // 4 + 1
+
+
+def texto_de(content):
+    partes = []
+    for part in content.parts:
+        llamada = getattr(part, "function_call", None)
+        if llamada and getattr(llamada, "name", None):
+            partes.append(f"(consultó la herramienta {llamada.name})")
+            continue
+        try:
+            if part.text:
+                partes.append(part.text)
+        except (AttributeError, ValueError):
+            pass
+    return " ".join(partes)
+
+
+def es_resumen(content):
+    return content.role == "user" and texto_de(content).startswith(MARCA_RESUMEN)
+
+
+class VentanaContexto:
+
+    def __init__(self, turnos_recientes=CONTEXTO_TURNOS_RECIENTES, max_turnos=CONTEXTO_MAX_TURNOS,
+                 max_tokens=CONTEXTO_MAX_TOKENS, resumen_max_tokens=CONTEXTO_RESUMEN_MAX_TOKENS):
+        self.turnos_recientes = turnos_recientes
+        self.max_turnos = max_turnos
+        self.max_tokens = max_tokens
+        self.resumen_max_tokens = resumen_max_tokens
+
+    def turnos(self, history):
+        # Agrupa el historial en turnos, sin contar el par del resumen
+        history = list(history)
+        if len(history) >= 2 and es_resumen(history[0]):
+            history = history[2:]
+        turnos = []
+        for content in history:
+            if content.role == "user" or not turnos:
+                turnos.append([content])
+            else:
+                turnos[-1].append(content)
+        return turnos
+
+    def tokens(self, turnos):
+        return sum(estimar_tokens(texto_de(c)) for turno in turnos for c in turno)
+
+    def excedido(self, history):
+        # Se deja crecer hasta max_turnos y luego se recorta a turnos_recientes,
+        # para no pagar un resumen en cada turno
+        turnos = self.turnos(history)
+        if len(turnos) > self.max_turnos:
+            return True
+        return len(turnos) > 1 and self.tokens(turnos) > self.max_tokens
+
+    def partir(self, history):
+        # (turnos a resumir, turnos que se quedan completos)
+        turnos = self.turnos(history)
+        corte = max(0, len(turnos) - self.turnos_recientes)
+        # Aunque sean pocos, si los recientes se pasan de la mitad del presupuesto se resumen más
+        while len(turnos) - corte > 1 and self.tokens(turnos[corte:]) > self.max_tokens // 2:
+            corte += 1
+        return turnos[:corte], turnos[corte:]
+
+    def prompt_resumen(self, resumen, viejos):
+        lineas = []
+        for turno in viejos:
+            for c in turno:
+                quien = "Usuario" if c.role == "user" else "Maleón"
+                lineas.append(f"{quien}: {texto_de(c)}")
+        palabras = self.resumen_max_tokens * 3 // 4
+        return (
+            "Actualiza el resumen de una conversación entre un usuario y Maleón, asistente del IMET.\n"
+            "Conserva solo lo útil para continuarla: quién es el usuario (nombre, cargo, si es VIP), "
+            "cómo quiere ser recordado, sus metas y retos, municipios, negocios y resultados de herramientas.\n"
+            f"Texto plano, en español, máximo {palabras} palabras.\n\n"
+            f"--- RESUMEN ACTUAL ---\n{resumen or '(vacío)'}\n\n"
+            "--- TURNOS NUEVOS ---\n" + "\n".join(lineas)
+        )
+
+    def resumen_extractivo(self, resumen, viejos):
+        # Si el LLM falla: lo que dijo el usuario, recortado al presupuesto
+        dichos = [texto_de(c) for turno in viejos for c in turno if c.role == "user"]
+        return self.recortar(" ".join(filter(None, [resumen] + [f"Usuario dijo: {d}" for d in dichos])))
+
+    def recortar(self, texto):
+        limite = self.resumen_max_tokens * 4
+        texto = " ".join(texto.split())
+        # Si hay que cortar se queda lo más nuevo, que va al final
+        return texto if len(texto) <= limite else "…" + texto[-limite:]
+
+    def historial(self, resumen, recientes):
+        history = []
+        if resumen:
+            history.append(Content(role="user", parts=[Part.from_text(f"{MARCA_RESUMEN} {resumen}")]))
+            history.append(Content(role="model", parts=[Part.from_text("Entendido, lo tengo presente.")]))
+        for turno in recientes:
+            history.extend(turno)
+        return history
@@ -1,21 +1,20 @@
 import os
 import json
-import glob
-import unicodedata
 import datetime
-import re
 import uuid
-import vertexai
+import hashlib
+from collections import deque
 from fpdf import FPDF
 from dotenv import load_dotenv
-from vertexai.generative_models import GenerativeModel, ChatSession, Content, Part, Tool, FunctionDeclaration
-from vertexai.generative_models import ToolConfig
+from vertexai.generative_models import Content, Part
+from app.agent.conocimiento import obtener_paquete, crear_modelo
+from app.agent.alias_index import normalizar
+from app.agent.contexto import VentanaContexto
+from app.config import CONOCIMIENTO_TOP_K, CONOCIMIENTO_TOP_K_REPORTE
+from app.services.metricas import metricas
 
 load_dotenv()
 
-PROJECT_ID = os.getenv("GCP_PROJECT_ID")
-vertexai.init(project=PROJECT_ID, location="us-central1")
-
 class MaleonChatAgent:
     def __init__(self,
              vip_file="data/contexto/invitados_vip.json",
@@ -29,112 +28,102 @@ class MaleonChatAgent:
             "servicios": "No analizado",
             "crecimiento": "No analizado"
         }
-        self.cargar_datos()
-
-        self.system_instruction = (
-            "Eres Maleón, asistente yucateco del IMET. Hablas con cortesía y calidez, usando 'nené' como forma cariñosa de decir bebé, 'mare' como expresión de asombro, 'ne’' como trato coloquial equivalente a wey o che pero respetuoso, 'waay' como sorpresa fuerte y 'maaa' como expresión suave de asombro."
-            "--- PRIORIDAD DE IDENTIFICACIÓN ---\n"
-            "Tu primera prioridad es identificar al usuario.\n"
-            f"Si el usuario se identifica, busca en esta lista: {json.dumps(self.vip_data)}.\n"
-            "Si coincide con un Invitado VIP (por ejemplo Daniel o el director de ALBA), y recuerda su nombre durante toda kla conversacion, si busacas uno deja de buscar los demás. "
-            "salúdalo por su nombre y menciona su cargo con respeto dentro del informe.\n\n"
-            "\n--- FLUJO CONVERSACIONAL ---\n"
-            "1. Tu meta es llevar al usuario a un análisis de el usuario. La pregunta 'Que tal, cuéntame cómo te gustaría ser recordado' es tu llave para abrir la asesoría, úsala de forma natural al iniciar la charla o cuando el contexto sea propicio. Porfa pero no la metas a la fuerza, que se sienta orgánica ne’. "
-            "2. Basado en su respuesta, haz 1 o 2 preguntas sobre sus logros actuales y los retos que le gustaría superar. (esto sin sonar frozado y metelas cuando el contexto lo permita, no las metas a la fuerza). "
-            "3. FILTRO ESTRATÉGICO: Identifica discretamente si el interés es: Negocio (Crecimiento), Seguridad o Servicios. "
-            "\n--- REGLA DE NO-INTERROGATORIO Y VARIABLES DINÁMICAS ---\n"
-            "PROHIBIDO preguntar por variables técnicas (v1, v2, v3), ventas o datos financieros. Intúyelos estratégicamente según el contexto de la plática: si detectas una gran empresa usa valores de escala alta; si es un pequeño emprendimiento o negocio local, usa valores modestos ne’."
-            "\nHaz UN SOLO INTENTO sutil por el municipio (ej. '¿Eso lo ha sentido en algún rumbo en especial?'). Si no responden o hablan de Yucatán de forma general, no insistas waay. Activa la herramienta con el parámetro muni='YUCATAN' para que el sistema procese el CSV completo del estado."
-            "\n--- MAPEO DE HERRAMIENTAS ---\n"
-            "- NEGOCIO: Activa 'predecir_crecimiento'. Parámetros: [codigo, muni, v1, v2, v3].\n"
-            "- SEGURIDAD: Activa 'consultar_seguridad'. Parámetro: [muni].\n"
-            "- SERVICIOS: Activa 'buscar_servicios'. Parámetro: [muni].\n"
-            "PROHIBIDO usar 'mira'.\n\n"
-            "--- REGLA DE CHARLA ABIERTA ---"
-            "No te niegues NUNCA a charlar sobre temas generales o personales (clima, ropa, saludos, etc.) ne’. "
-            "Sé un compañero cálido primero. Si el tema no es estratégico, responde con naturalidad waay "
-            "y solo después, cuando sientas que la plática fluye, intenta llevarla sutilmente hacia el legado o los retos de gobierno. "
-            "No seas un robot de ventanilla; sé un yucateco platicador."
-            "--- CONOCIMIENTO ---\n"
-            f"{self.knowledge_text}\n"
-            "--- REGLAS ---\n"
-            "1. CERO MARKDOWN. 2. BREVEDAD (30-40 palabras). 3. PUNTO FINAL."
-        )
-        crecimiento_tool = FunctionDeclaration(
-            name="predecir_crecimiento",
-            description="Usa CatBoost para calcular el potencial de un negocio.",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "codigo": {"type": "string"}, 
-                    "muni": {"type": "string"},
-                    "v1": {"type": "number"}, 
-                    "v2": {"type": "number"}, 
-                    "v3": {"type": "number"}
-                },
-                "required": ["codigo", "muni", "v1", "v2", "v3"]
-            }
-        )
-        servicios_tool = FunctionDeclaration(
-            name="buscar_servicios",
-            description="Busca servicios mapeados en el CSV.",
-            parameters={
-                "type": "object",
-                "properties": {"muni": {"type": "string"}},
-                "required": ["muni"]
-            }
-        )
-
-        # Herramienta para Seguridad
-        seguridad_tool = FunctionDeclaration(
-            name="consultar_seguridad",
-            description="Consulta el nivel de riesgo y negocios aislados en un municipio.",
-            parameters={
-                "type": "object",
-                "properties": {"muni": {"type": "string"}},
-                "required": ["muni"]
-            }
-        )
+        # Paquete compartido por proceso: aquí solo se abre el ChatSession
+        self.paquete = obtener_paquete(vip_file, knowledge_path)
+        self.chat = self.model.start_chat(history=[])
+        # Al LLM solo van los turnos recientes; lo anterior vive en self.resumen
+        self.contexto = VentanaContexto()
+        self.resumen = ""
+        # Los últimos mensajes del usuario para el reporte, sin recorrer el historial
+        self.ultimos_usuario = deque(maxlen=5)
 
-      
-        self.tools = Tool(function_declarations=[crecimiento_tool, servicios_tool, seguridad_tool])
+    def cargar_datos(self):
+        self.paquete = obtener_paquete(self.vip_file, self.knowledge_path, forzar_revision=True)
 
-        self.model = GenerativeModel("gemini-2.5-flash", system_instruction=self.system_instruction,
-            tools=[self.tools])
-        self.chat = self.model.start_chat(history=[])
+    @property
+    def vip_data(self):
+        return self.paquete.vip_data
 
+    @property
+    def system_instruction(self):
+        return self.paquete.system_instruction
 
-    def cargar_datos(self):
-        try:
-            if os.path.exists(self.vip_file):
-                with open(self.vip_file, 'r', encoding='utf-8') as f:
-                    self.vip_data = json.load(f)
-            else: self.vip_data = {}
-        except: self.vip_data = {}
+    @property
+    def tools(self):
+        return self.paquete.tools
 
-        self.knowledge_text = ""
-        try:
-            files = glob.glob(self.knowledge_path)
-            for file_path in files:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    self.knowledge_text += f"\n--- INFO {os.path.basename(file_path)} ---\n{f.read()}\n"
-        except: pass
+    @property
+    def model(self):
+        return self.paquete.model
 
     def _normalizar(self, texto):
-        return "".join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c)).lower()
+        return normalizar(texto)
 
     def detectar_vip(self, mensaje):
-        msg_norm = self._normalizar(mensaje)
-        for key, data in self.vip_data.items():
-            for alias in data.get("alias", []):
-                if f" {self._normalizar(alias)} " in f" {msg_norm} ": return data
-        return None
+        # Alias pre-normalizados en el trie del paquete: una sola pasada por mensaje
+        return self.paquete.indice_alias.buscar(mensaje)
+
+    def _marca_vip(self, vip):
+        # Solo el VIP que coincidió viaja en el prompt, no la lista completa
+        return f"[VIP: {vip['nombre']}, {vip.get('cargo', '')}. Temas: {vip.get('temas', '')}]"
+
+    def conocimiento_para(self, consulta, k=CONOCIMIENTO_TOP_K):
+        with metricas.medir("recuperacion"):
+            return self.paquete.indice_conocimiento.bloque(consulta, k)
     
+    def memoria_aproximada(self):
+        # Estimación gruesa de lo propio de la sesión; el paquete de conocimiento es compartido
+        total = len(json.dumps(self.datos_tecnicos).encode("utf-8")) + len(self.resumen.encode("utf-8"))
+        total += sum(len(t.encode("utf-8")) for t in self.ultimos_usuario)
+        for content in self.chat.history:
+            for part in content.parts:
+                try:
+                    total += len(part.text.encode("utf-8"))
+                except (AttributeError, ValueError):
+                    total += 256
+        return total
+
+    def exportar_estado(self):
+        # Lo necesario para que otro proceso retome la conversación
+        return {
+            "history": [content.to_dict() for content in self.chat.history],
+            "datos_tecnicos": dict(self.datos_tecnicos),
+            "resumen": self.resumen,
+            "ultimos_usuario": list(self.ultimos_usuario)
+        }
+
+    def restaurar_estado(self, estado):
+        self.datos_tecnicos.update(estado.get("datos_tecnicos", {}))
+        self.resumen = estado.get("resumen", "")
+        self.ultimos_usuario.extend(estado.get("ultimos_usuario", []))
+        historial = [Content.from_dict(c) for c in estado.get("history", [])]
+        self.chat = self.model.start_chat(history=historial)
+
+    def contexto_excedido(self):
+        return self.contexto.excedido(self.chat.history)
+
+    def compactar_contexto(self):
+        # Pasa los turnos viejos al resumen y reabre el chat solo con los
+        # recientes. Regresa False si no había nada que recortar.
+        viejos, recientes = self.contexto.partir(self.chat.history)
+        if not viejos:
+            return False
+        try:
+            with metricas.medir("resumen_llm"):
+                res = crear_modelo("gemini-2.5-flash").generate_content(self.contexto.prompt_resumen(self.resumen, viejos))
+            resumen = self.contexto.recortar(res.text)
+        except Exception as e:
+            print(f"Error resumiendo contexto, se usa resumen extractivo: {e}")
+            resumen = self.contexto.resumen_extractivo(self.resumen, viejos)
+        self.resumen = resumen
+        self.chat = self.model.start_chat(history=self.contexto.historial(self.resumen, recientes))
+        return True
+
     def registrar_resultado(self, pilar, resultado):
         if pilar in self.datos_tecnicos:
             self.datos_tecnicos[pilar] = resultado
 
-    def _crear_pdf(self, titulo, contenido, incluir_grafico=False):
+    def _crear_pdf(self, titulo, contenido, incluir_grafico=False, nombre=None):
         try:
             pdf = FPDF()
             pdf.add_page()
@@ -164,14 +153,142 @@ class MaleonChatAgent:
                 pdf.cell(0, 10, "ANEXO VISUAL: IMPACTO ESTRATEGIA SSP", ln=True, align='C')
                 pdf.image("static/grafico_impacto_ssp.png", x=10, w=190)
             
-            nombre = f"reporte_{uuid.uuid4().hex[:8]}.pdf"
+            nombre = nombre or f"reporte_{uuid.uuid4().hex[:8]}.pdf"
             ruta_pdf = f"static/reportes/{nombre}"
-            pdf.output(ruta_pdf)
+            # Se escribe aparte y se renombra: nadie descarga un PDF a medias
+            pdf.output(f"{ruta_pdf}.tmp")
+            os.replace(f"{ruta_pdf}.tmp", ruta_pdf)
             return f"/static/reportes/{nombre}"
         except Exception as e:
             print(f"Error PDF: {e}")
             return None
 
+    def preparar_reporte(self, user_message):
+        # Foto de lo que necesita el reporte, tomada dentro del turno: el
+        # trabajo corre después en otro hilo y la sesión puede seguir avanzando
+        msg_lower = user_message.lower()
+        return {
+            "tema": user_message,
+            "incluir_grafico": any(kw in msg_lower for kw in ['seguridad', 'ssp', 'impacto', 'policia']),
+            "memoria_usuario": "\n".join(f"Usuario dijo: {texto}" for texto in self.ultimos_usuario),
+            "datos_tecnicos": dict(self.datos_tecnicos)
+        }
+
+    def huella_reporte(self, solicitud):
+        # Mismos datos técnicos, mismos últimos turnos, mismo tema y mismo
+        # conocimiento => mismo reporte; se reusa el PDF en vez de pedirlo otra vez
+        contenido = json.dumps({
+            "tema": " ".join(solicitud["tema"].lower().split()),
+            "incluir_grafico": solicitud["incluir_grafico"],
+            "memoria_usuario": solicitud["memoria_usuario"],
+            "datos_tecnicos": solicitud["datos_tecnicos"],
+            "conocimiento": self.paquete.firma
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(contenido.encode("utf-8")).hexdigest()[:20]
+
+    def reporte_en_cache(self, solicitud):
+        nombre = f"reporte_{self.huella_reporte(solicitud)}.pdf"
+        ruta_pdf = f"static/reportes/{nombre}"
+        try:
+            # Refrescamos la fecha para que la política de retención lo cuente como reciente
+            os.utime(ruta_pdf)
+        except FileNotFoundError:
+            return None
+        return self._respuesta_reporte(f"/static/reportes/{nombre}")
+
+    def _respuesta_reporte(self, ruta):
+        return f"Listo nené, ya terminé el análisis profundo sobre ese tema. Aquí tiene el documento para su revisión.<br><br><a href='{ruta}' target='_blank' style='display: inline-block; padding: 10px 20px; background-color: #28a745; color: white; text-decoration: none; border-radius: 5px; font-weight: bold;'>📥 DESCARGAR REPORTE PDF</a>" \
+               f"<button onclick=\"enviarPorCorreo('{ruta}')\" class='btn-email'>📧 ENVIAR A MI CORREO</button>"
+
+    def generar_reporte(self, solicitud):
+        user_message = solicitud["tema"]
+        incluir_img = solicitud["incluir_grafico"]
+        memoria_usuario = solicitud["memoria_usuario"]
+        datos_tecnicos = solicitud["datos_tecnicos"]
+
+        nombre = f"reporte_{self.huella_reporte(solicitud)}.pdf"
+        existente = self.reporte_en_cache(solicitud)
+        if existente:
+            return existente
+
+        analista_bot = crear_modelo("gemini-2.5-flash")
+        # Del conocimiento y de los VIP solo va lo que tiene que ver con este reporte
+        vip = self.detectar_vip(f"{memoria_usuario}\n{user_message}")
+        conocimiento = self.conocimiento_para(
+            f"{user_message}\n{memoria_usuario}\n{' '.join(str(v) for v in datos_tecnicos.values())}",
+            k=CONOCIMIENTO_TOP_K_REPORTE
+        )
+        
+        prompt_reporte = (
+            "Eres un motor de análisis de texto objetivo.\n"
+            "--- PRIORIDAD DE IDENTIFICACIÓN ---\n"
+            "Tu primera prioridad es identificar al usuario.\n"
+            f"Invitado VIP identificado en la charla: {self._marca_vip(vip) if vip else 'ninguno'}.\n"
+            "Si hay un Invitado VIP (por ejemplo Daniel o el director de ALBA), "
+            "salúdalo por su nombre y menciona su cargo con respeto dentro del informe.\n\n"
+
+            "--- CONTEXTO PERSONAL DEL USUARIO (SÚPER PRIORIDAD) ---\n"
+            "El usuario ha compartido estos objetivos y visión de legado durante la charla:\n"
+            f"{memoria_usuario}\n\n"
+
+            "--- DATOS TÉCNICOS CAPTURADOS (MODELOS IA) ---\n"
+            f"{json.dumps(datos_tecnicos)}\n\n"
+            "--- REGLAS DE REDACCIÓN (ESTRATÉGICO) ---\n"
+            "1. EL CENTRO ES EL USUARIO: El informe debe explicar cómo IMET y TechMaleón son el VEHÍCULO para que el usuario cumpla su visión y metas detectadas en el CONTEXTO PERSONAL.\n"
+            
+            "--- REGLAS DE REDACCIÓN (CRÍTICO) ---\n"
+            "1. PROHIBIDO mencionar categorías que digan 'No analizado'. No hables de 'brechas de información' ni de datos faltantes ne’.\n"
+            "2. UBICACIÓN: Identifica si el análisis es de un MUNICIPIO específico o de 'YUCATÁN' en general. Menciona el lugar claramente en el diagnóstico.\n"
+            "3. ENFOQUE: Habla exclusivamente de lo que SÍ se encontró. Si solo hay datos de 'Servicios', el reporte es 100% sobre servicios.\n"
+            "4. ESTILO: Evita lenguaje robótico. En lugar de 'la métrica no está detallada', integra el dato de forma natural: 'Se observa un índice de desabasto de 7.0 en la zona, lo que requiere...'.\n\n"
+            
+            f"TAREA: Analizar la siguiente base de conocimiento y redactar un informe sobre: {user_message}\n\n"
+            "1. RESUMEN GENERAL: Cómo IMET y TechMaleón ayudan al usuario basado en la base de conocimiento.\n"
+            "2. ANÁLISIS ESPECIALIZADO: Sugerencia técnica basada exclusivamente en los DATOS TÉCNICOS capturados.\n\n" f"{conocimiento}\n\n"
+
+            "--- INSTRUCCIONES ---\n"
+            "1. Si la información no está en la base de conocimiento, usa tu conocimiento general para complementar pero prioriza los archivos.\n"
+            "2. NO menciones que eres una IA o asistente.\n"
+            "3. ESTRUCTURA: Diagnóstico, Estrategia, Conclusión.\n"
+            "4. FORMATO: Texto plano (sin markdown), párrafos claros, tono formal.\n"
+            "5. LONGITUD: Mínimo 400 palabras."
+        )
+        
+        # Los errores no se atrapan aquí: corre en la cola de reportes, que deja
+        # el trabajo en estado "error" con el mensaje para el usuario
+        # Usamos generate_content directamente en el modelo limpio
+        with metricas.medir("reporte_llm"):
+            res = analista_bot.generate_content(prompt_reporte)
+        
+        # Validación estricta: Si se niega, forzamos un resumen genérico
+        texto_final = res.text
+        if not texto_final or "no puedo" in texto_final.lower():
+            texto_final = "No se encontró información específica en los archivos internos, pero aquí presento un análisis general basado en estándares del sector:\n\n" + \
+                          "1. Diagnóstico: Se requiere fortalecer la infraestructura tecnológica.\n" + \
+                          "2. Estrategia: Implementación de sistemas de vigilancia inteligente y capacitación.\n" + \
+                          "3. Conclusión: La modernización es clave para el desarrollo regional."
+
+        with metricas.medir("pdf"):
+            ruta = self._crear_pdf(f"ANALISIS ESTRATEGICO: {user_message[:40].upper()}", texto_final, incluir_grafico=incluir_img, nombre=nombre)
+        
+        if not ruta:
+            raise RuntimeError("No se pudo crear el archivo PDF")
+        return self._respuesta_reporte(ruta)
+
+    def _mensaje_usuario(self, user_message, user_time=None):
+        vip = self.detectar_vip(user_message)
+        ctx = f"\n{self._marca_vip(vip)}" if vip else ""
+        if user_time: ctx += f" [Hora: {user_time}]"
+        return f"{user_message}{ctx}"
+
+    def registrar_turno(self, user_message, respuesta, user_time=None):
+        # Turno que contestó otra sesión con la misma pregunta (vuelo compartido):
+        # queda en el historial como si este ChatSession lo hubiera respondido
+        mensaje = self._mensaje_usuario(user_message, user_time)
+        self.chat.history.append(Content(role="user", parts=[Part.from_text(mensaje)]))
+        self.chat.history.append(Content(role="model", parts=[Part.from_text(respuesta)]))
+        self.ultimos_usuario.append(mensaje)
+
     def answer(self, user_message, user_time=None):
         msg_lower = user_message.lower()
         
@@ -183,72 +300,8 @@ class MaleonChatAgent:
             if len(user_message.split()) < 3:
                 return "¡Ay mare! Con gusto le ayudo, pero dígame ¿sobre qué tema en específico quiere que prepare el reporte, nené?"
             
-            incluir_img = any(kw in msg_lower for kw in ['seguridad', 'ssp', 'impacto', 'policia'])
-            
-            memoria_usuario = "\n".join([
-                f"Usuario dijo: {m.parts[0].text}" 
-                for m in self.chat.history if m.role == "user"
-            ][-5:])
-
-            analista_bot = GenerativeModel("gemini-2.5-flash")
-            
-            prompt_reporte = (
-                "Eres un motor de análisis de texto objetivo.\n"
-                "--- PRIORIDAD DE IDENTIFICACIÓN ---\n"
-                "Tu primera prioridad es identificar al usuario.\n"
-                f"Si el usuario se identifica, busca en esta lista: {json.dumps(self.vip_data)}.\n"
-                "Si coincide con un Invitado VIP (por ejemplo Daniel o el director de ALBA), "
-                "salúdalo por su nombre y menciona su cargo con respeto dentro del informe.\n\n"
-
-                "--- CONTEXTO PERSONAL DEL USUARIO (SÚPER PRIORIDAD) ---\n"
-                "El usuario ha compartido estos objetivos y visión de legado durante la charla:\n"
-                f"{memoria_usuario}\n\n"
-
-                "--- DATOS TÉCNICOS CAPTURADOS (MODELOS IA) ---\n"
-                f"{json.dumps(self.datos_tecnicos)}\n\n"
-                "--- REGLAS DE REDACCIÓN (ESTRATÉGICO) ---\n"
-                "1. EL CENTRO ES EL USUARIO: El informe debe explicar cómo IMET y TechMaleón son el VEHÍCULO para que el usuario cumpla su visión y metas detectadas en el CONTEXTO PERSONAL.\n"
-                
-                "--- REGLAS DE REDACCIÓN (CRÍTICO) ---\n"
-                "1. PROHIBIDO mencionar categorías que digan 'No analizado'. No hables de 'brechas de información' ni de datos faltantes ne’.\n"
-                "2. UBICACIÓN: Identifica si el análisis es de un MUNICIPIO específico o de 'YUCATÁN' en general. Menciona el lugar claramente en el diagnóstico.\n"
-                "3. ENFOQUE: Habla exclusivamente de lo que SÍ se encontró. Si solo hay datos de 'Servicios', el reporte es 100% sobre servicios.\n"
-                "4. ESTILO: Evita lenguaje robótico. En lugar de 'la métrica no está detallada', integra el dato de forma natural: 'Se observa un índice de desabasto de 7.0 en la zona, lo que requiere...'.\n\n"
-                
-                f"TAREA: Analizar la siguiente base de conocimiento y redactar un informe sobre: {user_message}\n\n"
-                "1. RESUMEN GENERAL: Cómo IMET y TechMaleón ayudan al usuario basado en la base de conocimiento.\n"
-                "2. ANÁLISIS ESPECIALIZADO: Sugerencia técnica basada exclusivamente en los DATOS TÉCNICOS capturados.\n\n" f"{self.knowledge_text}\n\n"
-
-                "--- INSTRUCCIONES ---\n"
-                "1. Si la información no está en la base de conocimiento, usa tu conocimiento general para complementar pero prioriza los archivos.\n"
-                "2. NO menciones que eres una IA o asistente.\n"
-                "3. ESTRUCTURA: Diagnóstico, Estrategia, Conclusión.\n"
-                "4. FORMATO: Texto plano (sin markdown), párrafos claros, tono formal.\n"
-                "5. LONGITUD: Mínimo 400 palabras."
-            )
-            
-            try:
-                # Usamos generate_content directamente en el modelo limpio
-                res = analista_bot.generate_content(prompt_reporte)
-                
-                # Validación estricta: Si se niega, forzamos un resumen genérico
-                texto_final = res.text
-                if not texto_final or "no puedo" in texto_final.lower():
-                    texto_final = "No se encontró información específica en los archivos internos, pero aquí presento un análisis general basado en estándares del sector:\n\n" + \
-                                  "1. Diagnóstico: Se requiere fortalecer la infraestructura tecnológica.\n" + \
-                                  "2. Estrategia: Implementación de sistemas de vigilancia inteligente y capacitación.\n" + \
-                                  "3. Conclusión: La modernización es clave para el desarrollo regional."
-
-                ruta = self._crear_pdf(f"ANALISIS ESTRATEGICO: {user_message[:40].upper()}", texto_final, incluir_grafico=incluir_img)
-                
-                if ruta:
-                    return f"Listo nené, ya terminé el análisis profundo sobre ese tema. Aquí tiene el documento para su revisión.<br><br><a href='{ruta}' target='_blank' style='display: inline-block; padding: 10px 20px; background-color: #28a745; color: white; text-decoration: none; border-radius: 5px; font-weight: bold;'>📥 DESCARGAR REPORTE PDF</a>" \
-                           f"<button onclick=\"enviarPorCorreo('{ruta}')\" class='btn-email'>📧 ENVIAR A MI CORREO</button>"
-                else:
-                    return "¡Ay fo! Hubo un problema al crear el archivo PDF."
-            except Exception as e:
-                print(f"Error Crítico en Reporte: {e}")
-                return "¡Ay mare! Se me trabó el sistema al generar ese documento."
+            # El reporte tarda decenas de segundos: el router lo manda a la cola de trabajos
+            return {"type": "reporte", "solicitud": self.preparar_reporte(user_message)}
 
         # 2. Mapas
         if "mapa" in msg_lower:
@@ -258,12 +311,22 @@ class MaleonChatAgent:
                 return "Mare, aquí tiene el mapa de servicios en los municipios.<br><br><a href='/static/mapa_desabasto_yucatan.html' target='_blank' style='display: inline-block; padding: 10px 20px; background-color: #17a2b8; color: white; text-decoration: none; border-radius: 5px; font-weight: bold;'>VER MAPA DE SERVICIOS</a>"
 
         # 3. Charla Normal
-        vip = self.detectar_vip(user_message)
-        ctx = f"\n[VIP: {vip['nombre']}]" if vip else ""
-        if user_time: ctx += f" [Hora: {user_time}]"
+        mensaje = self._mensaje_usuario(user_message, user_time)
+
+        # La pregunta anterior ayuda con los seguimientos ("¿y eso cuánto cuesta?")
+        anterior = self.ultimos_usuario[-1] if self.ultimos_usuario else ""
+        conocimiento = self.conocimiento_para(f"{user_message} {anterior}")
+        partes = [Part.from_text(mensaje)]
+        if conocimiento:
+            partes.append(Part.from_text(f"[CONOCIMIENTO]\n{conocimiento}"))
 
         try:
-            response = self.chat.send_message(f"{user_message}{ctx}")
+            n = len(self.chat.history)
+            response = self.chat.send_message(partes)
+            # Los fragmentos solo sirven para este turno: al historial queda el mensaje solo
+            if conocimiento and len(self.chat.history) > n:
+                self.chat.history[n] = Content(role="user", parts=[Part.from_text(mensaje)])
+            self.ultimos_usuario.append(mensaje)
 
             candidate = response.candidates[0]
 
@@ -0,0 +1,101 @@
+import math
+import re
+from collections import Counter
+from app.agent.alias_index import normalizar
+
+# Recuperación BM25 sobre la base de conocimiento: los .txt se parten en
+# fragmentos de unas cuantas decenas de palabras (por párrafos) y a cada turno
+# solo viajan al LLM los k fragmentos más parecidos a la pregunta, en vez de
+# todo el conocimiento pegado en el system instruction.
+
+TOKEN = re.compile(r"\w+")
+
+STOPWORDS = set("""
+a al algo algun alguna algunas alguno algunos ante antes aqui asi aun bien cada como con cual cuales cuando de del
+desde donde dos el ella ellas ellos en entre era eres es esa esas ese eso esos esta estaba estan estar estas este
+esto estos fue fueron ha hace hacia han hasta hay la las le les lo los mas me mi mis mucho muy ne nene mare no nos
+o otra otro para pero poco por porque que quien se sea segun ser si sin sobre son su sus tambien te tiene tienen
+todo todos tu tus un una unas uno unos usted ustedes y ya yo
+""".split())
+
+
+def tokenizar(texto):
+    tokens = []
+    for tok in TOKEN.findall(normalizar(texto)):
+        if tok in STOPWORDS or len(tok) < 2:
+            continue
+        # Plural -> singular, lo justo para que 'servicios' pegue con 'servicio'
+        if len(tok) > 4 and tok.endswith("es"):
+            tok = tok[:-2]
+        elif len(tok) > 3 and tok.endswith("s"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+def fragmentar(fuente, texto, palabras=120):
+    # Junta párrafos hasta ~palabras; un párrafo muy largo se corta en pedazos
+    fragmentos = []
+    actual = []
+    conteo = 0
+    for parrafo in re.split(r"\n\s*\n", texto):
+        tokens = parrafo.split()
+        if not tokens:
+            continue
+        pedazos = [parrafo.strip()]
+        if len(tokens) > 2 * palabras:
+            pedazos = [" ".join(tokens[i:i + palabras]) for i in range(0, len(tokens), palabras)]
+        for pedazo in pedazos:
+            n = len(pedazo.split())
+            if actual and conteo + n > palabras:
+                fragmentos.append("\n\n".join(actual))
+                actual, conteo = [], 0
+            actual.append(pedazo)
+            conteo += n
+    if actual:
+        fragmentos.append("\n\n".join(actual))
+    return [(fuente, f) for f in fragmentos]
+
+
+class IndiceBM25:
+
+    def __init__(self, fragmentos, k1=1.5, b=0.75):
+        self.fragmentos = list(fragmentos)
+        self.k1 = k1
+        self.b = b
+        # término -> [(fragmento, frecuencia)]
+        self.postings = {}
+        self.largos = []
+        for i, (fuente, texto) in enumerate(self.fragmentos):
+            tf = Counter(tokenizar(f"{fuente} {texto}"))
+            self.largos.append(sum(tf.values()))
+            for termino, n in tf.items():
+                self.postings.setdefault(termino, []).append((i, n))
+        total = len(self.fragmentos)
+        self.promedio = sum(self.largos) / total if total else 0
+        self.idf = {
+            t: math.log(1 + (total - len(p) + 0.5) / (len(p) + 0.5))
+            for t, p in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.fragmentos)
+
+    def buscar(self, consulta, k=3):
+        # [(fuente, texto, puntaje)] de mayor a menor; vacío si nada coincide
+        puntajes = Counter()
+        for termino in set(tokenizar(consulta)):
+            idf = self.idf.get(termino)
+            if idf is None:
+                continue
+            for i, tf in self.postings[termino]:
+                norma = self.k1 * (1 - self.b + self.b * self.largos[i] / self.promedio)
+                puntajes[i] += idf * tf * (self.k1 + 1) / (tf + norma)
+        return [(self.fragmentos[i][0], self.fragmentos[i][1], p) for i, p in puntajes.most_common(k)]
+
+    def bloque(self, consulta, k=3):
+        # Texto listo para ir en el prompt, o "" si no hay nada relevante
+        resultados = self.buscar(consulta, k)
+        if not resultados:
+            return ""
+        return "\n".join(f"--- {fuente} ---\n{texto}" for fuente, texto, _ in resultados)
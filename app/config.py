@@ -4,6 +4,91 @@ from dotenv import load_dotenv
 load_dotenv()
 
 PROJECT_ID = os.getenv("GCP_PROJECT_ID", "maleon")
-CACHE_FILE = "cache_inteligente.json"
+CACHE_FILE = os.getenv("CACHE_FILE", "cache_inteligente.json")
 
 BLACKLIST = ["clima", "tiempo", "hora", "hoy", "ayer", "mañana"]
+
+# Datos y modelo de los pilares de inteligencia
+RUTA_SERVICIOS = os.getenv("RUTA_SERVICIOS", "data/prioridades_yucatan_maleon.csv")
+RUTA_SEGURIDAD = os.getenv("RUTA_SEGURIDAD", "data/seguridad_municipios_maleon.csv")
+MODELO_CRECIMIENTO = os.getenv("MODELO_CRECIMIENTO", "models/maleon_predictor.cbm")
+
+# Modo sin red: Vertex y TTS se reemplazan por falsos (pruebas de carga locales)
+MODO_OFFLINE = os.getenv("MALEON_OFFLINE", "0") == "1"
+FALSO_LATENCIA_LLM_MS = float(os.getenv("FALSO_LATENCIA_LLM_MS", "800"))
+FALSO_LATENCIA_TTS_MS = float(os.getenv("FALSO_LATENCIA_TTS_MS", "300"))
+FALSO_LATENCIA_REPORTE_MS = float(os.getenv("FALSO_LATENCIA_REPORTE_MS", "5000"))
+FALSO_TASA_FALLOS = float(os.getenv("FALSO_TASA_FALLOS", "0"))
+
+# Cache persistente: snapshot JSON + bitácora de solo-anexar
+CACHE_JOURNAL_FILE = os.getenv("CACHE_JOURNAL_FILE", "cache_inteligente.journal")
+CACHE_COMPACTAR_CADA = int(os.getenv("CACHE_COMPACTAR_CADA", "500"))
+CACHE_FSYNC = os.getenv("CACHE_FSYNC", "0") == "1"
+
+# Límites del cache de respuestas
+CACHE_MAX_CLAVES = int(os.getenv("CACHE_MAX_CLAVES", "5000"))
+CACHE_MAX_VARIANTES = int(os.getenv("CACHE_MAX_VARIANTES", "3"))
+CACHE_TTL_SEGUNDOS = int(os.getenv("CACHE_TTL_SEGUNDOS", str(7 * 24 * 3600)))
+AUDIO_DIR = os.getenv("AUDIO_DIR", "temp_audio")
+# Un MP3 que se sintetizó o se sirvió hace menos de esto no se borra al expulsar su llave
+CACHE_AUDIO_GRACIA_SEGUNDOS = int(os.getenv("CACHE_AUDIO_GRACIA_SEGUNDOS", "600"))
+
+# Estado compartido entre workers: "memoria" (un solo proceso) o "sqlite"
+ESTADO_BACKEND = os.getenv("ESTADO_BACKEND", "memoria")
+ESTADO_SQLITE = os.getenv("ESTADO_SQLITE", "estado_maleon.db")
+ESTADO_SYNC_SEGUNDOS = float(os.getenv("ESTADO_SYNC_SEGUNDOS", "1"))
+
+# Sesiones de chat en memoria
+SESION_TTL_SEGUNDOS = int(os.getenv("SESION_TTL_SEGUNDOS", "1800"))
+SESION_MAX = int(os.getenv("SESION_MAX", "500"))
+SESION_REAPER_SEGUNDOS = int(os.getenv("SESION_REAPER_SEGUNDOS", "60"))
+
+# Ventana de contexto del chat: turnos completos recientes + resumen de lo anterior
+CONTEXTO_TURNOS_RECIENTES = int(os.getenv("CONTEXTO_TURNOS_RECIENTES", "6"))
+CONTEXTO_MAX_TURNOS = int(os.getenv("CONTEXTO_MAX_TURNOS", "10"))
+CONTEXTO_MAX_TOKENS = int(os.getenv("CONTEXTO_MAX_TOKENS", "2000"))
+CONTEXTO_RESUMEN_MAX_TOKENS = int(os.getenv("CONTEXTO_RESUMEN_MAX_TOKENS", "250"))
+
+# Recuperación sobre data/conocimiento: fragmentos por turno y por reporte
+CONOCIMIENTO_FRAGMENTO_PALABRAS = int(os.getenv("CONOCIMIENTO_FRAGMENTO_PALABRAS", "120"))
+CONOCIMIENTO_TOP_K = int(os.getenv("CONOCIMIENTO_TOP_K", "3"))
+CONOCIMIENTO_TOP_K_REPORTE = int(os.getenv("CONOCIMIENTO_TOP_K_REPORTE", "6"))
+
+# Arranque en paralelo de los servicios pesados (lifespan) y snapshots binarios de los CSV
+ARRANQUE_BLOQUEANTE = os.getenv("ARRANQUE_BLOQUEANTE", "0") == "1"
+ARRANQUE_REINTENTO_SEGUNDOS = float(os.getenv("ARRANQUE_REINTENTO_SEGUNDOS", "10"))
+ARRANQUE_ESPERA_MAX_SEGUNDOS = float(os.getenv("ARRANQUE_ESPERA_MAX_SEGUNDOS", "120"))
+SNAPSHOTS_DIR = os.getenv("SNAPSHOTS_DIR", ".cache/datos")
+
+# Concurrencia máxima por etapa de /chat (hilos de cada executor)
+LIMITE_LLM = int(os.getenv("LIMITE_LLM", "16"))
+LIMITE_TTS = int(os.getenv("LIMITE_TTS", "8"))
+LIMITE_HERRAMIENTAS = int(os.getenv("LIMITE_HERRAMIENTAS", "4"))
+LIMITE_CACHE = int(os.getenv("LIMITE_CACHE", "2"))
+
+# Whisper local (POST /transcribe y modo lote): instancias residentes por proceso
+WHISPER_MODELO = os.getenv("WHISPER_MODELO", "small")
+WHISPER_TRABAJADORES = int(os.getenv("WHISPER_TRABAJADORES", "1"))
+WHISPER_IDIOMA = os.getenv("WHISPER_IDIOMA", "es")
+WHISPER_PRECARGAR = os.getenv("WHISPER_PRECARGAR", "0") == "1"
+WHISPER_MAX_PENDIENTES = int(os.getenv("WHISPER_MAX_PENDIENTES", "8"))
+TRANSCRIPCION_MAX_MB = float(os.getenv("TRANSCRIPCION_MAX_MB", "25"))
+
+# Audio sintetizado: direccionado por contenido y con cuota en disco
+TTS_AUDIO_MAX_MB = int(os.getenv("TTS_AUDIO_MAX_MB", "500"))
+TTS_AUDIO_MAX_DIAS = float(os.getenv("TTS_AUDIO_MAX_DIAS", "7"))
+TTS_JANITOR_SEGUNDOS = int(os.getenv("TTS_JANITOR_SEGUNDOS", "300"))
+
+# Predicción de crecimiento por lotes
+PREDICCION_VENTANA_MS = float(os.getenv("PREDICCION_VENTANA_MS", "5"))
+PREDICCION_MAX_LOTE = int(os.getenv("PREDICCION_MAX_LOTE", "64"))
+PREDICCION_MEMO = int(os.getenv("PREDICCION_MEMO", "4096"))
+
+# Cola de reportes PDF en segundo plano
+REPORTES_WORKERS = int(os.getenv("REPORTES_WORKERS", "2"))
+REPORTES_MAX_PENDIENTES = int(os.getenv("REPORTES_MAX_PENDIENTES", "20"))
+REPORTES_RETENER_TRABAJOS = int(os.getenv("REPORTES_RETENER_TRABAJOS", "500"))
+REPORTES_DIR = "static/reportes"
+REPORTES_MAX_DIAS = float(os.getenv("REPORTES_MAX_DIAS", "7"))
+REPORTES_MAX_ARCHIVOS = int(os.getenv("REPORTES_MAX_ARCHIVOS", "500"))
+REPORTES_JANITOR_SEGUNDOS = int(os.getenv("REPORTES_JANITOR_SEGUNDOS", "600"))
@@ -1,17 +1,54 @@
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, JSONResponse
 
 from app.routers.chat import router as chat_router
-from app.config import PROJECT_ID, CACHE_FILE, BLACKLIST
+from app.routers.transcripcion import router as transcripcion_router
+from app.config import PROJECT_ID, CACHE_FILE, BLACKLIST, AUDIO_DIR, ARRANQUE_BLOQUEANTE
+from app.static_files import StaticFilesCacheados, precomprimir, COMPRIMIDOS_DIR
+from app.services.arranque import arranque, ComponenteNoDisponible
 
-app = FastAPI()
+# Los mapas pesan megas: se sirven precomprimidos (br/gzip) con ETag y Cache-Control.
+# Brotli al máximo tarda segundos: mientras tanto se sirve sin comprimir
+arranque.registrar("estaticos", lambda: precomprimir("static", os.path.join(COMPRIMIDOS_DIR, "static")),
+                   obligatorio=False)
 
-app.mount("/avatar", StaticFiles(directory="avatar"), name="avatar")
-app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/temp_audio", StaticFiles(directory="temp_audio"), name="temp_audio")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Todos los componentes se calientan a la vez; por omisión el worker ya
+    # atiende mientras tanto y /ready dice cuándo terminó
+    await arranque.iniciar(esperar=ARRANQUE_BLOQUEANTE)
+    yield
+    arranque.cerrar()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.mount("/avatar", StaticFilesCacheados(directory="avatar", cache_control="public, max-age=86400"), name="avatar")
+app.mount("/static", StaticFilesCacheados(directory="static", cache_control="public, max-age=3600",
+                                          comprimidos_dir=os.path.join(COMPRIMIDOS_DIR, "static")), name="static")
+# El nombre del MP3 es el hash de su contenido: nunca cambia, se puede cachear para siempre
+os.makedirs(AUDIO_DIR, exist_ok=True)
+app.mount("/temp_audio", StaticFilesCacheados(directory=AUDIO_DIR, cache_control="public, max-age=31536000, immutable"), name="temp_audio")
 
 app.include_router(chat_router)
+app.include_router(transcripcion_router)
+
+
+@app.exception_handler(ComponenteNoDisponible)
+async def componente_no_disponible(request: Request, exc: ComponenteNoDisponible):
+    return JSONResponse(status_code=503, content={"detail": str(exc), "componente": exc.nombre},
+                        headers={"Retry-After": "5"})
+
+
+@app.get("/ready")
+async def ready():
+    # 200 cuando todos los componentes obligatorios están cargados; si no, 503 con el detalle
+    estado = arranque.estado()
+    return JSONResponse(status_code=200 if estado["listo"] else 503, content=estado)
+
 
 @app.get("/")
 async def index():
@@ -1,20 +1,30 @@
+import json
+import time
 import random
 import re
-from fastapi import APIRouter
+import asyncio
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from thefuzz import fuzz, process
-from uuid import uuid4 
 from app.agent.core import MaleonChatAgent
 
-from app.services.tts_service import TTSService
+from app.services.tts_service import TTSService, dividir_oraciones
 from app.services.cache_service import CacheService
 from app.services.inteligencia_service import InteligenciaService
-from app.config import BLACKLIST
+from app.services.session_service import SessionService
+from app.services.prediccion_service import PrediccionService
+from app.services.reportes_service import ReportesService
+from app.services.etapas import etapas
+from app.services.metricas import metricas, iniciar_peticion, server_timing
+from app.agent.conocimiento import usar_fabrica_modelo
+from app.services.arranque import arranque, ComponenteNoDisponible
+from app.services.vuelos import Vuelos
+from app.services.estado_sqlite import EstadoSQLite
+from app.config import BLACKLIST, MODO_OFFLINE, ESTADO_BACKEND, ESTADO_SQLITE
 
 
 
 router = APIRouter()
-sesiones_activas = {} 
 PALABRAS_CONTEXTUALES = [
     "hablamos",
     "dijiste",
@@ -33,9 +43,41 @@ def es_contextual(texto: str) -> bool:
     texto = texto.lower()
     return any(p in texto for p in PALABRAS_CONTEXTUALES)
 
-tts_service = TTSService()
-cache_service = CacheService()
-intel_service = InteligenciaService()
+if MODO_OFFLINE:
+    # Sin red (pruebas de carga): Vertex y TTS falsos con latencia configurable
+    from app.services.falsos import ModeloFalso, ClienteTTSFalso
+    print("MODO OFFLINE: usando Vertex y TTS falsos")
+    usar_fabrica_modelo(ModeloFalso.fabrica())
+    crear_tts = lambda: TTSService(client=ClienteTTSFalso())
+else:
+    crear_tts = TTSService
+# Con varios workers de uvicorn el cache, las sesiones y los reportes se comparten por SQLite
+estado_compartido = EstadoSQLite(ESTADO_SQLITE) if ESTADO_BACKEND == "sqlite" else None
+
+
+# Lo pesado se construye en el arranque, en paralelo (ver app/services/arranque.py);
+# aquí quedan Perezosos que se usan igual que los servicios
+tts_service = arranque.registrar("tts", crear_tts)
+cache_service = arranque.registrar("cache", lambda: CacheService(almacen=estado_compartido), obligatorio=False)
+intel_service = arranque.registrar("inteligencia", InteligenciaService)
+prediccion_service = arranque.registrar("prediccion", lambda: PrediccionService(
+    intel_service.model_growth,
+    ejecutar=lambda fn, *args: etapas.ejecutar("herramientas", fn, *args)
+))
+# Un agente de prueba deja listos vertexai.init y el paquete compartido (VIPs, índices, GenerativeModel)
+arranque.registrar("agente", lambda: MaleonChatAgent().paquete)
+reportes_service = ReportesService(almacen=estado_compartido)
+sesiones_activas = SessionService(MaleonChatAgent, almacen=estado_compartido)
+# Ráfagas de la misma pregunta (varios visitantes del kiosco a la vez): una
+# sola generación y un solo MP3 para todas las que están en curso
+vuelos_respuesta = Vuelos("respuesta")
+vuelos_tts = Vuelos("tts")
+
+metricas.registrar_medidor("maleon_sesiones_activas", lambda: len(sesiones_activas), "Sesiones de chat en memoria")
+metricas.registrar_medidor("maleon_cache_claves", lambda: len(cache_service.cache) if arranque.listo("cache") else 0,
+                           "Preguntas distintas en el cache")
+metricas.registrar_medidor("maleon_reportes_pendientes", lambda: reportes_service.resumen()["pendientes"], "Reportes en cola o en proceso")
+metricas.registrar_medidor("maleon_vuelos_en_curso", lambda: len(vuelos_respuesta), "Generaciones de /chat compartibles en curso")
 
 
 class Msg(BaseModel):
@@ -44,115 +86,395 @@ class Msg(BaseModel):
     session_id: str
 
 
+def ejecutar_herramienta(bot_personal, respuesta):
+    # Se corre en el executor de herramientas: CatBoost y pandas son bloqueantes
+    respuesta_texto = ""
+    args = respuesta["args"]
+    muni_sucio = args.get("muni", "").strip()
+
+    # CASO B: SERVICIOS
+    if respuesta["name"] == "buscar_servicios":
+        # --- LÓGICA ESTATAL YUCATÁN ---
+        if muni_sucio.lower() in ["yucatan", "yucatán", "estado", "todo el estado"]:
+            resumen = intel_service.resumen_estatal("servicios")
+            avg_desabasto = resumen["desabasto_promedio"]
+            cat_top = resumen["categoria_top"]
+            info = f"Análisis Estatal: {cat_top} - Desabasto Promedio: {avg_desabasto:.2f}"
+            bot_personal.registrar_resultado("servicios", info)
+            respuesta_texto = f"Maaa nené, en todo el estado la tendencia es {cat_top} ne’. Ya lo incluí en el análisis general para su reporte."
+        else:
+            muni_real = intel_service.limpiar_municipio(muni_sucio, pilar="servicios")
+            datos = intel_service.registro(muni_real, pilar="servicios")
+            if datos is not None:
+                info = f"Municipio: {muni_real} - Situación: {datos['CATEGORIA']} - Desabasto: {datos['INDICE_DESABASTO']}"
+                bot_personal.registrar_resultado("servicios", info)
+                respuesta_texto = f"Mira nene, en {muni_real} la situación es {datos['CATEGORIA']}. Ya lo anoté."
+            else:
+                respuesta_texto = f"Mare nene, no encontré datos específicos de {muni_sucio}, pero lo tomaremos como tendencia general ne’."
+
+    # CASO C: SEGURIDAD
+    elif respuesta["name"] == "consultar_seguridad":
+        # --- LÓGICA ESTATAL YUCATÁN ---
+        if muni_sucio.lower() in ["yucatan", "yucatán", "estado", "todo el estado"]:
+            resumen = intel_service.resumen_estatal("seguridad")
+            riesgo_top = resumen["riesgo_top"]
+            aislados_tot = resumen["aislados_total"]
+            info = f"Análisis Estatal Seguridad: {riesgo_top} - Negocios Aislados Totales: {aislados_tot}"
+            bot_personal.registrar_resultado("seguridad", info)
+            respuesta_texto = f"A nivel estatal la seguridad pinta como {riesgo_top} ne’. Ya registré los puntos críticos para el análisis estratégico."
+        else:
+            muni_real = intel_service.limpiar_municipio(muni_sucio, pilar="seguridad")
+            datos = intel_service.registro(muni_real, pilar="seguridad")
+            if datos is not None:
+                info = f"Municipio: {muni_real} - Riesgo: {datos['CATEGORIA_SEGURIDAD']} - Aislados: {int(datos['NEGOCIOS_AISLADOS'])}"
+                bot_personal.registrar_resultado("seguridad", info)
+                respuesta_texto = f"Chequé lo de seguridad en {muni_real} y está {datos['CATEGORIA_SEGURIDAD']}."
+            else:
+                respuesta_texto = f"Fíjate que no tengo el reporte de seguridad de {muni_sucio} a la mano ne’."
+
+    return respuesta_texto
 
-@router.post("/chat")
-async def chat(msg: Msg):
 
+async def herramienta_crecimiento(bot_personal, args):
+    # CASO A: CRECIMIENTO (CatBoost), agrupado con otras peticiones concurrentes
+    muni_sucio = args.get("muni", "").strip()
+    muni_real = await etapas.ejecutar("herramientas", intel_service.limpiar_municipio, muni_sucio, "servicios")
+    try:
+        pred = await prediccion_service.predecir(args["codigo"], muni_real, args["v1"], args["v2"], args["v3"])
+    except (KeyError, TypeError, ValueError) as e:
+        # El LLM a veces inventa valores que no son números
+        print(f"Argumentos inválidos para predecir_crecimiento: {e}")
+        return "¡Ay fo! No me cuadraron los números de ese negocio, ¿me los repites?"
+    bot_personal.registrar_resultado("crecimiento", f"Negocio {pred} en {muni_real}")
+    return f"Mare nene, ese negocio en {muni_real} pinta para ser {pred}."
+
+
+def clasificar(msg):
     texto_input = msg.text.lower().strip()
     es_dinamico = any(word in texto_input for word in BLACKLIST)
     es_memoria = es_contextual(texto_input)
+    return texto_input, es_dinamico, es_memoria
 
 
-    sid = msg.session_id
-
-    if sid not in sesiones_activas:
-        sesiones_activas[sid] = MaleonChatAgent()
+async def consultar_cache(texto_input, es_dinamico):
+    # Regresa (llave que hizo match, variante lista para servir o None)
+    match_clave = variantes = None
+    # Mientras el cache carga (o si falló) se contesta sin él
+    if not arranque.disponible("cache"):
+        return None, None
 
-    bot_personal = sesiones_activas[sid]
+    # Sin revisar si el cache local está vacío: buscar() también trae lo que escribieron otros workers
+    if not es_dinamico:
+        with metricas.medir("cache_busqueda"):
+            match_clave, variantes = await etapas.ejecutar("cache", cache_service.buscar_y_leer, texto_input)
 
-    match_clave = None
-
-    if not es_dinamico and cache_service.cache:
-        mejor_match, score = process.extractOne(
-            texto_input,
-            cache_service.cache.keys(),
-            scorer=fuzz.token_set_ratio
-        )
+    if variantes is None:
+        # Sin match, o expiró / fue expulsada entre la búsqueda y la lectura
+        match_clave = None
+    elif len(variantes) >= cache_service.max_variantes:
+        return match_clave, random.choice(variantes)
 
-        if score > 75:
-            match_clave = mejor_match
+    return match_clave, None
 
-    if match_clave:
-        variantes = cache_service.get(match_clave)
-        if len(variantes) >= 3:
-            return random.choice(variantes)
 
-    # --- Generar respuesta nueva ---
-    respuesta = bot_personal.handle(msg.text)
-    print(f"DEBUG: Respuesta del Agente: {respuesta}", flush=True)
-    respuesta_texto = ""
-    # --- Manejo de Inteligencia Especializada ---
-    if isinstance(respuesta, dict) and respuesta.get("type") == "function_call":
-        args = respuesta["args"]
-        muni_sucio = args.get("muni", "").strip()
-        
-        # CASO A: CRECIMIENTO (CatBoost)
-        if respuesta["name"] == "predecir_crecimiento":
-            muni_real = intel_service.limpiar_municipio(muni_sucio, pilar="servicios")
-            pred = intel_service.model_growth.predict([args["codigo"], muni_real, args["v1"], args["v2"], args["v3"]])[0]
-            bot_personal.registrar_resultado("crecimiento", f"Negocio {pred} en {muni_real}")
-            respuesta_texto = f"Mare nene, ese negocio en {muni_real} pinta para ser {pred}."
-
-        # CASO B: SERVICIOS
-        elif respuesta["name"] == "buscar_servicios":
-            # --- LÓGICA ESTATAL YUCATÁN ---
-            if muni_sucio.lower() in ["yucatan", "yucatán", "estado", "todo el estado"]:
-                avg_desabasto = intel_service.df_servicios['INDICE_DESABASTO'].mean()
-                cat_top = intel_service.df_servicios['CATEGORIA'].mode()[0]
-                info = f"Análisis Estatal: {cat_top} - Desabasto Promedio: {avg_desabasto:.2f}"
-                bot_personal.registrar_resultado("servicios", info)
-                respuesta_texto = f"Maaa nené, en todo el estado la tendencia es {cat_top} ne’. Ya lo incluí en el análisis general para su reporte."
-            else:
-                muni_real = intel_service.limpiar_municipio(muni_sucio, pilar="servicios")
-                filtro = intel_service.df_servicios[intel_service.df_servicios['NOM_MUN'] == muni_real]
-                if not filtro.empty:
-                    datos = filtro.iloc[0]
-                    info = f"Municipio: {muni_real} - Situación: {datos['CATEGORIA']} - Desabasto: {datos['INDICE_DESABASTO']}"
-                    bot_personal.registrar_resultado("servicios", info)
-                    respuesta_texto = f"Mira nene, en {muni_real} la situación es {datos['CATEGORIA']}. Ya lo anoté."
+async def generar_respuesta(msg, bot_personal):
+    # Regresa (texto, campos extra para el cliente, si se puede cachear,
+    # si otra sesión puede usar el mismo texto)
+    extra = {}
+    cacheable = True
+    compartible = True
+    # Un mismo ChatSession no aguanta dos turnos a la vez: se serializa por sesión
+    async with sesiones_activas.candado(msg.session_id):
+        with metricas.medir("llm"):
+            respuesta = await etapas.ejecutar("llm", bot_personal.handle, msg.text)
+        respuesta_texto = ""
+        # --- Manejo de Inteligencia Especializada ---
+        if isinstance(respuesta, dict) and respuesta.get("type") == "function_call":
+            # La herramienta anota sus datos en esta sesión ("ya lo anoté"): no se comparte
+            compartible = False
+            await arranque.esperar("inteligencia", "prediccion")
+            with metricas.medir("herramienta", herramienta=respuesta["name"]):
+                if respuesta["name"] == "predecir_crecimiento":
+                    respuesta_texto = await herramienta_crecimiento(bot_personal, respuesta["args"])
                 else:
-                    respuesta_texto = f"Mare nene, no encontré datos específicos de {muni_sucio}, pero lo tomaremos como tendencia general ne’."
-
-        # CASO C: SEGURIDAD
-        elif respuesta["name"] == "consultar_seguridad":
-            # --- LÓGICA ESTATAL YUCATÁN ---
-            if muni_sucio.lower() in ["yucatan", "yucatán", "estado", "todo el estado"]:
-                riesgo_top = intel_service.df_seguridad['CATEGORIA_SEGURIDAD'].mode()[0]
-                aislados_tot = intel_service.df_seguridad['NEGOCIOS_AISLADOS'].sum()
-                info = f"Análisis Estatal Seguridad: {riesgo_top} - Negocios Aislados Totales: {aislados_tot}"
-                bot_personal.registrar_resultado("seguridad", info)
-                respuesta_texto = f"A nivel estatal la seguridad pinta como {riesgo_top} ne’. Ya registré los puntos críticos para el análisis estratégico."
-            else:
-                muni_real = intel_service.limpiar_municipio(muni_sucio, pilar="seguridad")
-                filtro = intel_service.df_seguridad[intel_service.df_seguridad['NOM_MUN'] == muni_real]
-                if not filtro.empty:
-                    datos = filtro.iloc[0]
-                    info = f"Municipio: {muni_real} - Riesgo: {datos['CATEGORIA_SEGURIDAD']} - Aislados: {int(datos['NEGOCIOS_AISLADOS'])}"
-                    bot_personal.registrar_resultado("seguridad", info)
-                    respuesta_texto = f"Chequé lo de seguridad en {muni_real} y está {datos['CATEGORIA_SEGURIDAD']}."
+                    respuesta_texto = await etapas.ejecutar("herramientas", ejecutar_herramienta, bot_personal, respuesta)
+        # --- Reportes: se generan en la cola y el cliente consulta /reports/{id} ---
+        elif isinstance(respuesta, dict) and respuesta.get("type") == "reporte":
+            cacheable = False
+            solicitud = respuesta["solicitud"]
+            # Mismo tema y mismos datos que un reporte anterior: se entrega el mismo PDF
+            with metricas.medir("cache_reporte"):
+                respuesta_texto = await etapas.ejecutar("cache", bot_personal.reporte_en_cache, solicitud)
+            if not respuesta_texto:
+                job_id = reportes_service.encolar(bot_personal.generar_reporte, solicitud,
+                                                  clave=bot_personal.huella_reporte(solicitud))
+                if job_id:
+                    extra["report_id"] = job_id
+                    respuesta_texto = "¡Mare! Ya me puse a preparar su reporte, nené. En cuanto esté listo se lo dejo aquí mismo."
                 else:
-                    respuesta_texto = f"Fíjate que no tengo el reporte de seguridad de {muni_sucio} a la mano ne’."
-            
-        # (Aquí puedes añadir después los de Seguridad y Servicios)
-    else:
-        # 3. Si es charla normal, sacamos el contenido del texto
-        if isinstance(respuesta, dict):
-            respuesta_texto = respuesta.get("content", "")
+                    respuesta_texto = "¡Ay fo! Traigo muchos reportes en fila ahorita, ¿me lo pide otra vez en un ratito?"
         else:
-            respuesta_texto = respuesta
+            # 3. Si es charla normal, sacamos el contenido del texto
+            if isinstance(respuesta, dict):
+                respuesta_texto = respuesta.get("content", "")
+            else:
+                respuesta_texto = respuesta
+
+        # Con estado compartido el siguiente turno puede caer en otro worker
+        if sesiones_activas.almacen is not None:
+            with metricas.medir("sesion_guardar"):
+                await etapas.ejecutar("cache", sesiones_activas.guardar, msg.session_id, bot_personal)
+
+    # El resumen del contexto viejo se hace en fondo: este turno no lo espera
+    if bot_personal.contexto_excedido():
+        en_fondo(compactar_contexto(msg.session_id, bot_personal))
+    return respuesta_texto, extra, cacheable, compartible
+
+
+def turno_para_cache():
+    # El primero de los que comparten un texto que llegue a guardarlo, lo guarda
+    # (aunque el que lo generó ya se haya desconectado); los demás no
+    pendiente = [True]
+
+    def reclamar():
+        if not pendiente[0]:
+            return False
+        pendiente[0] = False
+        return True
+    return reclamar
+
+
+async def generar_en_vuelo(msg, bot_personal):
+    return (*await generar_respuesta(msg, bot_personal), turno_para_cache())
+
+
+async def anotar_turno(msg, bot_personal, respuesta_texto):
+    # El pasajero no pasó por su ChatSession: el turno se anota en su historial
+    async with sesiones_activas.candado(msg.session_id):
+        bot_personal.registrar_turno(msg.text, respuesta_texto)
+        if sesiones_activas.almacen is not None:
+            with metricas.medir("sesion_guardar"):
+                await etapas.ejecutar("cache", sesiones_activas.guardar, msg.session_id, bot_personal)
+    if bot_personal.contexto_excedido():
+        en_fondo(compactar_contexto(msg.session_id, bot_personal))
+
+
+async def generar_compartida(msg, bot_personal, texto_input, match_clave, es_dinamico, es_memoria):
+    # Regresa (texto, campos extra, si se puede cachear, si fue de otra
+    # petición, reclamar(): True solo para el primero que vaya a guardarlo)
+    if es_dinamico or es_memoria:
+        respuesta_texto, extra, cacheable, _ = await generar_respuesta(msg, bot_personal)
+        return respuesta_texto, extra, cacheable, False, turno_para_cache()
+    # La llave es con la que se guardaría en el cache
+    llave = " ".join((match_clave or texto_input).split())
+    (respuesta_texto, extra, cacheable, _, reclamar), compartida = await vuelos_respuesta.ejecutar(
+        llave,
+        lambda: generar_en_vuelo(msg, bot_personal),
+        # Reportes y herramientas son de la sesión que los pidió: los demás piden lo suyo
+        servible=lambda resultado: resultado[2] and resultado[3]
+    )
+    if compartida:
+        await anotar_turno(msg, bot_personal, respuesta_texto)
+    return respuesta_texto, extra, cacheable, compartida, reclamar
+
+
+async def sintetizar_compartido(texto):
+    # El mismo texto pedido a la vez (pasajeros de un vuelo, oraciones repetidas) se sintetiza una vez
+    audio_url, _ = await vuelos_tts.ejecutar(
+        tts_service.clave(texto),
+        lambda: etapas.ejecutar("tts", tts_service.synthesize, texto)
+    )
+    return audio_url
+
+
+async def guardar_en_cache(texto_input, match_clave, es_dinamico, es_memoria, nueva_resp):
+    if not es_dinamico and not es_memoria and arranque.disponible("cache"):
+        llave = match_clave if match_clave else texto_input
+        with metricas.medir("cache_guardar"):
+            await etapas.ejecutar("cache", cache_service.set, llave, nueva_resp)
+
+
+async def obtener_sesion(session_id):
+    # Versión y rehidratación desde SQLite, y la construcción del agente, son
+    # bloqueantes: van al executor como guardar
+    with metricas.medir("sesion"):
+        return await etapas.ejecutar("cache", sesiones_activas.obtener, session_id)
+
+
+@router.post("/chat")
+async def chat(msg: Msg, response: Response):
+    # Server-Timing: desglose por etapa visible en las devtools del navegador
+    t0 = time.perf_counter()
+    tiempos = iniciar_peticion()
+
+    texto_input, es_dinamico, es_memoria = clasificar(msg)
+
+    await arranque.esperar("agente")
+    bot_personal = await obtener_sesion(msg.session_id)
+
+    match_clave, cacheada = await consultar_cache(texto_input, es_dinamico)
+    if cacheada:
+        if not cacheada.get("audio_url"):
+            # Variante guardada por /chat/stream (audio por oraciones): /chat entrega un solo MP3
+            await arranque.esperar("tts")
+            with metricas.medir("tts"):
+                audio_url = await sintetizar_compartido(re.sub(r'<[^>]+>', '', cacheada["reply"]))
+            cacheada = {"reply": cacheada["reply"], "audio_url": audio_url}
+        metricas.contar("maleon_chat_respuestas_total", origen="cache")
+        response.headers["Server-Timing"] = server_timing(tiempos, time.perf_counter() - t0)
+        return cacheada
+
+    # --- Generar respuesta nueva (o subirse a la que ya está en curso) ---
+    respuesta_texto, extra, cacheable, compartida, reclamar = await generar_compartida(
+        msg, bot_personal, texto_input, match_clave, es_dinamico, es_memoria
+    )
 
     texto_para_audio = re.sub(r'<[^>]+>', '', respuesta_texto)
-    audio_url = tts_service.synthesize(texto_para_audio)
+    await arranque.esperar("tts")
+    with metricas.medir("tts"):
+        audio_url = await sintetizar_compartido(texto_para_audio)
 
     nueva_resp = {
         "reply": respuesta_texto,
         "audio_url": audio_url
     }
 
-    if not es_dinamico and not es_memoria:
-        llave = match_clave if match_clave else texto_input
-        cache_service.set(llave, nueva_resp)
+    # Solo uno de los que compartieron guarda: si no, cada pasajero añadiría la misma variante
+    if cacheable and reclamar():
+        await guardar_en_cache(texto_input, match_clave, es_dinamico, es_memoria, nueva_resp)
+
+    metricas.contar("maleon_chat_respuestas_total", origen="compartida" if compartida else "generada")
+    response.headers["Server-Timing"] = server_timing(tiempos, time.perf_counter() - t0)
+    return {**nueva_resp, **extra}
+
+
+def evento_sse(evento, datos):
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+# Tareas de fondo del streaming (audio completo para el cache); se guarda la
+# referencia para que el recolector no las mate a medio camino
+tareas_fondo = set()
+
+
+def en_fondo(coro):
+    tarea = asyncio.create_task(coro)
+    tareas_fondo.add(tarea)
+    tarea.add_done_callback(tareas_fondo.discard)
+    return tarea
+
+
+async def compactar_contexto(session_id, bot_personal):
+    # Con el candado de la sesión: el siguiente turno espera a que termine
+    try:
+        async with sesiones_activas.candado(session_id):
+            compactado = await etapas.ejecutar("llm", bot_personal.compactar_contexto)
+            if compactado and sesiones_activas.almacen is not None:
+                await etapas.ejecutar("cache", sesiones_activas.guardar, session_id, bot_personal)
+    except Exception as e:
+        print(f"Error compactando contexto de la sesión {session_id}: {e}")
+
+
+async def cachear_en_fondo(texto_input, match_clave, es_dinamico, es_memoria, nueva_resp):
+    try:
+        await guardar_en_cache(texto_input, match_clave, es_dinamico, es_memoria, nueva_resp)
+    except Exception as e:
+        print(f"Error cacheando respuesta del stream: {e}")
+
+
+@router.post("/chat/stream")
+async def chat_stream(msg: Msg):
+    # Variante SSE de /chat: manda el texto en cuanto existe y luego cada
+    # oración con su audio conforme se sintetiza (en paralelo), para que el
+    # cliente empiece a hablar desde la primera oración.
+    texto_input, es_dinamico, es_memoria = clasificar(msg)
+    await arranque.esperar("agente")
+    bot_personal = await obtener_sesion(msg.session_id)
+
+    async def eventos():
+        match_clave, cacheada = await consultar_cache(texto_input, es_dinamico)
+        if cacheada:
+            metricas.contar("maleon_chat_respuestas_total", origen="cache")
+            yield evento_sse("texto", {"reply": cacheada["reply"]})
+            # Lo que guardó /chat es un solo MP3; lo que guardó el stream, uno por oración
+            segmentos = cacheada.get("oraciones") or [{"texto": cacheada["reply"], "audio_url": cacheada["audio_url"]}]
+            for indice, segmento in enumerate(segmentos):
+                yield evento_sse("audio", {"indice": indice, "total": len(segmentos), **segmento})
+            yield evento_sse("fin", {"cache": True})
+            return
+
+        respuesta_texto, extra, cacheable, compartida, reclamar = await generar_compartida(
+            msg, bot_personal, texto_input, match_clave, es_dinamico, es_memoria
+        )
+        yield evento_sse("texto", {"reply": respuesta_texto, **extra})
+
+        texto_para_audio = re.sub(r'<[^>]+>', '', respuesta_texto)
+        oraciones = dividir_oraciones(texto_para_audio)
+        try:
+            await arranque.esperar("tts")
+        except ComponenteNoDisponible as e:
+            # El texto ya salió: sin TTS la respuesta se queda sin audio
+            print(f"Stream sin audio: {e}")
+            oraciones = []
+
+        async def sintetizar(indice, oracion):
+            with metricas.medir("tts_oracion"):
+                audio_url = await sintetizar_compartido(oracion)
+            return indice, oracion, audio_url
+
+        tareas = [asyncio.create_task(sintetizar(i, o)) for i, o in enumerate(oraciones)]
+        audios = [None] * len(oraciones)
+        try:
+            for siguiente in asyncio.as_completed(tareas):
+                try:
+                    indice, oracion, audio_url = await siguiente
+                except Exception as e:
+                    print(f"Error sintetizando oración: {e}")
+                    continue
+                audios[indice] = audio_url
+                yield evento_sse("audio", {"indice": indice, "total": len(oraciones), "texto": oracion, "audio_url": audio_url})
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+        metricas.contar("maleon_chat_respuestas_total", origen="compartida" if compartida else "generada")
+        yield evento_sse("fin", {"cache": False})
+
+        # Se guardan los MP3 de las oraciones que ya se sintetizaron: un acierto
+        # los vuelve a mandar igual, sin otra llamada a TTS por la respuesta completa
+        if cacheable and oraciones and all(audios) and reclamar():
+            nueva_resp = {
+                "reply": respuesta_texto,
+                "oraciones": [{"texto": o, "audio_url": u} for o, u in zip(oraciones, audios)]
+            }
+            en_fondo(cachear_en_fondo(texto_input, match_clave, es_dinamico, es_memoria, nueva_resp))
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/reports/{report_id}")
+async def report_status(report_id: str):
+    trabajo = reportes_service.estado(report_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+    return trabajo
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    await arranque.esperar("cache")
+    return cache_service.resumen()
+
 
+@router.get("/metrics")
+async def metrics():
+    return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
-    return nueva_resp
 
+@router.get("/sessions/stats")
+async def sessions_stats():
+    return sesiones_activas.resumen()
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+
+from app.services.transcripcion_service import (
+    TranscripcionService, TranscripcionOcupada, TranscripcionNoDisponible
+)
+from app.services.arranque import arranque
+from app.config import WHISPER_PRECARGAR, TRANSCRIPCION_MAX_MB
+
+
+router = APIRouter()
+
+# El modelo se carga con la primera petición y se queda en memoria; con
+# WHISPER_PRECARGAR=1 se carga en el arranque, junto con lo demás
+transcripcion_service = TranscripcionService()
+if WHISPER_PRECARGAR:
+    arranque.registrar("whisper", lambda: transcripcion_service.precalentar() or transcripcion_service.resumen(),
+                       obligatorio=False)
+
+
+@router.post("/transcribe")
+async def transcribe(audio: UploadFile = File(...), idioma: str = Form(None)):
+    # Speech-to-text sin red para el navegador: webm/ogg de MediaRecorder, wav, mp3, m4a...
+    limite = int(TRANSCRIPCION_MAX_MB * 1024 * 1024)
+    demasiado = HTTPException(status_code=413, detail=f"El audio pasa de {TRANSCRIPCION_MAX_MB:g} MB")
+    # El archivo subido ya está en disco (spool de Starlette): a memoria se trae
+    # a lo más el límite y un byte, que basta para saber si se pasa
+    if audio.size is not None and audio.size > limite:
+        raise demasiado
+    datos = await audio.read(limite + 1)
+    if not datos:
+        raise HTTPException(status_code=400, detail="Audio vacío")
+    if len(datos) > limite:
+        raise demasiado
+    try:
+        return await transcripcion_service.transcribir_async(datos, idioma)
+    except TranscripcionOcupada:
+        raise HTTPException(status_code=503, detail="Hay muchas transcripciones en fila, intente en un momento")
+    except TranscripcionNoDisponible as e:
+        print(f"Error en transcripción: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"Error en transcripción: {e}")
+        raise HTTPException(status_code=422, detail="No se pudo leer ese audio")
+
+
+@router.get("/transcribe/stats")
+async def transcribe_stats():
+    return transcripcion_service.resumen()
@@ -0,0 +1,199 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.config import ARRANQUE_REINTENTO_SEGUNDOS, ARRANQUE_ESPERA_MAX_SEGUNDOS
+from app.services.metricas import metricas
+
+# Arranque del proceso: cada servicio pesado (cliente de TTS, cache, CSV y
+# CatBoost, Vertex) es un componente que se construye en su propio hilo, todos
+# a la vez, desde el lifespan de FastAPI. Los módulos guardan un Perezoso en
+# lugar del servicio: el primer uso espera a que termine de cargarse, o lo carga
+# ahí mismo si nadie lo ha empezado (scripts, pruebas sin lifespan). Si un
+# componente falla el worker sigue arriba: /ready lo reporta, sus usos responden
+# 503 y se vuelve a intentar en el siguiente uso pasados unos segundos.
+
+
+class ComponenteNoDisponible(Exception):
+
+    def __init__(self, nombre, motivo):
+        super().__init__(f"{nombre} no disponible: {motivo}")
+        self.nombre = nombre
+        self.motivo = motivo
+
+
+class Componente:
+
+    def __init__(self, nombre, fabrica, obligatorio=True):
+        self.nombre = nombre
+        self.fabrica = fabrica
+        self.obligatorio = obligatorio
+        self.estado = "pendiente"
+        self.valor = None
+        self.error = None
+        self.segundos = None
+        self.intentos = 0
+        self._fallo = 0.0
+        self._lock = threading.Lock()
+        self._listo = threading.Event()
+        self._terminado = threading.Event()
+        self._en_fondo = False
+        self._lock_fondo = threading.Lock()
+
+    def cargar(self):
+        with self._lock:
+            if self.estado == "listo":
+                return self.valor
+            if self.estado == "error" and time.monotonic() - self._fallo < ARRANQUE_REINTENTO_SEGUNDOS:
+                raise ComponenteNoDisponible(self.nombre, self.error)
+            # Un solo hilo construye; los demás esperan el resultado (con el mismo candado)
+            self.estado = "cargando"
+            self._terminado.clear()
+            self.intentos += 1
+            t0 = time.perf_counter()
+            try:
+                with metricas.medir("arranque", componente=self.nombre):
+                    valor = self.fabrica()
+            except Exception as e:
+                self._terminado.set()
+                self.estado = "error"
+                self.error = f"{type(e).__name__}: {e}"
+                self.segundos = time.perf_counter() - t0
+                self._fallo = time.monotonic()
+                print(f"⚠️ Arranque: {self.nombre} falló en {self.segundos:.2f}s ({self.error})")
+                raise ComponenteNoDisponible(self.nombre, self.error) from e
+            self.valor = valor
+            self.estado = "listo"
+            self.error = None
+            self.segundos = time.perf_counter() - t0
+            self._listo.set()
+            self._terminado.set()
+            print(f"✅ Arranque: {self.nombre} listo en {self.segundos:.2f}s")
+            return valor
+
+    def obtener(self):
+        if self._listo.is_set():
+            return self.valor
+        if self.estado == "cargando" and not self._terminado.wait(ARRANQUE_ESPERA_MAX_SEGUNDOS):
+            raise ComponenteNoDisponible(self.nombre, "sigue cargando")
+        return self.cargar()
+
+    def cargar_en_fondo(self):
+        # No toma self._lock: mientras otro hilo carga lo tiene ocupado y esto se llama desde el event loop
+        with self._lock_fondo:
+            if self._en_fondo or self.estado in ("listo", "cargando"):
+                return
+            self._en_fondo = True
+
+        def correr():
+            try:
+                self.obtener()
+            except ComponenteNoDisponible:
+                pass
+            finally:
+                self._en_fondo = False
+        threading.Thread(target=correr, name=f"arranque-{self.nombre}", daemon=True).start()
+
+    def resumen(self):
+        return {
+            "estado": self.estado,
+            "obligatorio": self.obligatorio,
+            "segundos": round(self.segundos, 3) if self.segundos is not None else None,
+            "intentos": self.intentos,
+            "error": self.error
+        }
+
+
+class Perezoso:
+
+    # Se usa igual que el servicio: cada atributo se busca en el componente ya cargado
+    def __init__(self, componente):
+        object.__setattr__(self, "_componente", componente)
+
+    def __getattr__(self, nombre):
+        return getattr(self._componente.obtener(), nombre)
+
+    def __setattr__(self, nombre, valor):
+        setattr(self._componente.obtener(), nombre, valor)
+
+    def __repr__(self):
+        return f"<Perezoso {self._componente.nombre} ({self._componente.estado})>"
+
+
+class Arranque:
+
+    def __init__(self):
+        self.componentes = {}
+        self.inicio = None
+        self.fin = None
+        self._pool = None
+
+    def registrar(self, nombre, fabrica, obligatorio=True):
+        componente = Componente(nombre, fabrica, obligatorio)
+        self.componentes[nombre] = componente
+        return Perezoso(componente)
+
+    def _cargar(self, componente):
+        try:
+            componente.obtener()
+        except ComponenteNoDisponible:
+            pass
+
+    async def iniciar(self, esperar=False):
+        # Lanza todos los componentes a la vez; las dependencias se resuelven
+        # solas porque la fábrica de uno usa el Perezoso del otro y se bloquea
+        # hasta que esté. Con esperar=False el worker atiende mientras calientan.
+        self.inicio = time.monotonic()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.componentes)), thread_name_prefix="arranque")
+        futuros = [
+            asyncio.wrap_future(self._pool.submit(self._cargar, c))
+            for c in self.componentes.values() if c.estado == "pendiente"
+        ]
+
+        async def terminar():
+            await asyncio.gather(*futuros)
+            self.fin = time.monotonic()
+            print(f"🚀 Arranque terminado en {self.fin - self.inicio:.2f}s")
+
+        if esperar:
+            await terminar()
+        else:
+            self._tarea = asyncio.create_task(terminar())
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def listo(self, nombre):
+        return self.componentes[nombre].estado == "listo"
+
+    def disponible(self, nombre):
+        # Para lo opcional (p. ej. el cache): si no está listo no se espera,
+        # pero si nadie lo ha empezado (o falló) se carga en fondo para la siguiente
+        componente = self.componentes[nombre]
+        if componente.estado == "listo":
+            return True
+        componente.cargar_en_fondo()
+        return False
+
+    def obtener(self, nombre):
+        return self.componentes[nombre].obtener()
+
+    async def esperar(self, *nombres):
+        # Desde el event loop: la espera (o la carga perezosa) corre en un hilo
+        for nombre in nombres:
+            componente = self.componentes[nombre]
+            if componente.estado != "listo":
+                await asyncio.to_thread(componente.obtener)
+
+    def estado(self):
+        componentes = {n: c.resumen() for n, c in self.componentes.items()}
+        listo = all(c.estado == "listo" for c in self.componentes.values() if c.obligatorio)
+        return {
+            "listo": listo,
+            "segundos_arranque": round(self.fin - self.inicio, 3) if self.fin and self.inicio else None,
+            "componentes": componentes
+        }
+
+
+arranque = Arranque()
@@ -1,31 +1,411 @@
 import os
 import json
-from app.config import CACHE_FILE
+import time
+import threading
+from collections import Counter, OrderedDict
+from app.config import (
+    CACHE_FILE, CACHE_JOURNAL_FILE, CACHE_COMPACTAR_CADA, CACHE_FSYNC,
+    CACHE_MAX_CLAVES, CACHE_MAX_VARIANTES, CACHE_TTL_SEGUNDOS, AUDIO_DIR, ESTADO_SYNC_SEGUNDOS,
+    CACHE_AUDIO_GRACIA_SEGUNDOS
+)
+from app.services.similarity_index import SimilarityIndex
+from app.services.metricas import metricas
+from app.services.visemas import SUFIJO as SUFIJO_VISEMAS
 
 class CacheService:
 
-    def __init__(self):
-        self.cache = self._load()
+    # Persistencia estilo log: CACHE_FILE es el snapshot compactado y cada set()
+    # solo anexa una línea a la bitácora. Cada línea lleva la lista completa de
+    # variantes de la llave, así que volver a aplicarla es idempotente.
+    #
+    # En memoria el cache es un LRU acotado: máximo de llaves, máximo de
+    # variantes por llave y TTL desde que se creó la llave. Lo que se expulsa
+    # libera también su MP3 (y sus visemas) en temp_audio/ cuando ninguna
+    # variante viva lo referencia; el conserje de TTS queda de respaldo.
+    #
+    # Con almacen (EstadoSQLite) no hay snapshot ni bitácora de archivo: cada
+    # registro va a SQLite y cada worker aplica los cambios de los demás
+    # leyendo la tabla de cambios, máximo cada sincronizar_cada segundos.
+    def __init__(self, snapshot=CACHE_FILE, journal=CACHE_JOURNAL_FILE, compactar_cada=CACHE_COMPACTAR_CADA,
+                 max_claves=CACHE_MAX_CLAVES, max_variantes=CACHE_MAX_VARIANTES, ttl=CACHE_TTL_SEGUNDOS,
+                 almacen=None, sincronizar_cada=ESTADO_SYNC_SEGUNDOS):
+        self.snapshot = snapshot
+        self.journal = journal
+        self.journal_rotado = f"{journal}.1"
+        self.compactar_cada = compactar_cada
+        self.max_claves = max_claves
+        self.max_variantes = max_variantes
+        self.ttl = ttl
+        self.almacen = almacen
+        self.sincronizar_cada = sincronizar_cada
+
+        self._lock = threading.RLock()
+        self._lock_compactacion = threading.Lock()
+        self._compactando = False
+        self._registros = 0
+        # Última secuencia aplicada de la tabla de cambios y las que escribimos nosotros
+        self._seq = 0
+        self._propios = set()
+        self._sincronizado = time.monotonic()
+        self._recortado = 0
+
+        self.stats = Counter()
+        self.creado = {}
+        if almacen is None:
+            self.cache = self._load()
+        else:
+            self.cache = self._cargar_almacen()
+        self._indexar()
+
+        if almacen is None:
+            self._log = open(self.journal, "a", encoding="utf-8")
+            if self._log.tell() and not self._termina_en_salto(self.journal):
+                # Cerramos la línea truncada para que el siguiente registro no se pegue a ella
+                self._log.write("\n")
+
+        # Si los límites bajaron desde la última ejecución, recortamos de una vez
+        with self._lock:
+            self.purgar_expirados()
+            while len(self.cache) > self.max_claves:
+                self._expulsar(next(iter(self.cache)), "evicciones_lru")
+
+        if self._registros >= self.compactar_cada:
+            self._compactar_en_fondo()
 
     def _load(self):
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, "r", encoding="utf-8") as f:
+        cache = OrderedDict()
+        if os.path.exists(self.snapshot):
+            with open(self.snapshot, "r", encoding="utf-8") as f:
+                try:
+                    datos = json.load(f)
+                    if datos.get("version") == 2:
+                        cache.update(datos["cache"])
+                        self.creado.update(datos["creado"])
+                    else:
+                        # Formato viejo: {llave: [variantes]} sin fechas
+                        cache.update(datos)
+                except Exception as e:
+                    print(f"Advertencia: snapshot del cache ilegible ({e}), se reconstruye desde la bitácora")
+
+        # Un .1 solo existe si una compactación se interrumpió: va antes que la bitácora actual
+        for ruta in (self.journal_rotado, self.journal):
+            self._registros += self._replay(ruta, cache)
+
+        ahora = time.time()
+        for clave in cache:
+            self.creado.setdefault(clave, ahora)
+        return cache
+
+    def _indexar(self):
+        self.indice = SimilarityIndex()
+        self._refs = Counter()
+        for clave, variantes in self.cache.items():
+            self.indice.add(clave)
+            self._referenciar(variantes)
+
+    def _cargar_almacen(self):
+        cache, creado, seq = self.almacen.cache_cargar()
+        if not cache and os.path.exists(self.snapshot):
+            # Primera vez con SQLite: se migra lo que había en snapshot + bitácora
+            self.almacen.cache_importar(self._load(), self.creado)
+            cache, creado, seq = self.almacen.cache_cargar()
+        self.creado = creado
+        self._seq = seq
+        return cache
+
+    def _sincronizar(self):
+        # Aplica lo que escribieron los otros workers desde la última vez
+        if self.almacen is None or time.monotonic() - self._sincronizado < self.sincronizar_cada:
+            return
+        self._sincronizado = time.monotonic()
+        try:
+            with self._lock:
+                cambios = self.almacen.cache_cambios_desde(self._seq)
+                if cambios and self._seq and cambios[0][0] > self._seq + 1:
+                    # Nos quedamos atrás de lo que ya se recortó: se recarga completo
+                    print("Cache atrasado respecto a la tabla de cambios, recargando desde SQLite")
+                    self.cache = self._cargar_almacen()
+                    self._indexar()
+                    self._propios.clear()
+                    return
+                for seq, clave, variantes, creado in cambios:
+                    self._seq = seq
+                    if seq in self._propios:
+                        self._propios.discard(seq)
+                        continue
+                    self._aplicar_remoto(clave, variantes, creado)
+            if time.time() - self._recortado > 600:
+                self._recortado = time.time()
+                self.almacen.cache_recortar_cambios(3600)
+        except Exception as e:
+            print(f"Error sincronizando cache con SQLite: {e}")
+
+    def _aplicar_remoto(self, clave, variantes, creado):
+        # El MP3 de lo que otro worker expulsó ya lo borró él: aquí solo se ajustan referencias
+        anteriores = self.cache.pop(clave, None)
+        self._liberar(anteriores or [], borrar=False)
+        if variantes is None:
+            self.creado.pop(clave, None)
+            if anteriores is not None:
+                self.indice.remove(clave)
+            return
+        if anteriores is None:
+            self.indice.add(clave)
+        self.cache[clave] = variantes
+        self.creado[clave] = creado
+        self._referenciar(variantes)
+
+    def _replay(self, ruta, cache):
+        if not os.path.exists(ruta):
+            return 0
+        aplicados = 0
+        with open(ruta, "r", encoding="utf-8") as f:
+            for num, linea in enumerate(f, 1):
+                if not linea.strip():
+                    continue
                 try:
-                    return json.load(f)
-                except:
-                    return {}
-        return {}
+                    registro = json.loads(linea)
+                except ValueError:
+                    # Típicamente la última línea a medio escribir antes de un crash
+                    print(f"Advertencia: registro corrupto en {ruta}:{num}, se ignora")
+                    continue
+                clave = registro["k"]
+                cache.pop(clave, None)
+                if registro.get("d"):
+                    self.creado.pop(clave, None)
+                else:
+                    cache[clave] = registro["v"]
+                    self.creado[clave] = registro.get("t", time.time())
+                aplicados += 1
+        return aplicados
+
+    def _termina_en_salto(self, ruta):
+        with open(ruta, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _anexar(self, registro):
+        if self.almacen is not None:
+            with metricas.medir("disco", destino="cache_sqlite"):
+                self._propios.add(self.almacen.cache_escribir(registro))
+            return
+        linea = json.dumps(registro, ensure_ascii=False)
+        with metricas.medir("disco", destino="cache_bitacora"):
+            self._log.write(linea + "\n")
+            self._log.flush()
+            if CACHE_FSYNC:
+                os.fsync(self._log.fileno())
+        self._registros += 1
+
+    def _escribir_snapshot(self, estado):
+        tmp = f"{self.snapshot}.tmp"
+        with metricas.medir("disco", destino="cache_snapshot"):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(estado, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot)
+
+    def _rotar(self):
+        # Se llama con el lock tomado: congela el estado y abre una bitácora nueva
+        self._log.close()
+        if os.path.exists(self.journal_rotado):
+            with open(self.journal, "r", encoding="utf-8") as src, open(self.journal_rotado, "a", encoding="utf-8") as dst:
+                dst.write(src.read())
+            os.remove(self.journal)
+        elif os.path.exists(self.journal):
+            os.replace(self.journal, self.journal_rotado)
+        self._log = open(self.journal, "a", encoding="utf-8")
+        self._registros = 0
+        return {
+            "version": 2,
+            "cache": {k: list(v) for k, v in self.cache.items()},
+            "creado": dict(self.creado)
+        }
+
+    def _compactar(self):
+        with self._lock_compactacion:
+            try:
+                with self._lock:
+                    self.purgar_expirados()
+                    estado = self._rotar()
+                self._escribir_snapshot(estado)
+                if os.path.exists(self.journal_rotado):
+                    os.remove(self.journal_rotado)
+            except Exception as e:
+                print(f"Error compactando cache: {e}")
+
+    def _compactar_en_segundo_plano(self):
+        try:
+            self._compactar()
+        finally:
+            self._compactando = False
+
+    def _compactar_en_fondo(self):
+        if self._compactando:
+            return
+        self._compactando = True
+        threading.Thread(target=self._compactar_en_segundo_plano, name="cache-compactador", daemon=True).start()
 
     def save(self):
-        with open(CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.cache, f, ensure_ascii=False, indent=4)
+        # Compactación completa y síncrona (snapshot + bitácora vacía)
+        if self.almacen is not None:
+            # En SQLite cada registro ya quedó escrito en su transacción
+            return
+        self._compactar()
+
+    # --- Expulsión ---
+    # Los MP3 se nombran por hash del texto: el mismo archivo puede estar en
+    # varias variantes, así que se cuentan referencias y se borra al llegar
+    # a 0. Como también puede estar sirviendo una respuesta que no pasó por
+    # el cache (TTS le refresca el mtime), uno reciente se deja al conserje.
+    def _audios(self, variante):
+        # Las variantes de /chat/stream traen un audio por oración
+        urls = [variante.get("audio_url")] + [o["audio_url"] for o in variante.get("oraciones", [])]
+        return [os.path.basename(url) for url in urls if url]
+
+    def _referenciar(self, variantes):
+        for v in variantes:
+            self._refs.update(self._audios(v))
+
+    def _liberar(self, variantes, borrar=True):
+        for v in variantes:
+            for nombre in self._audios(v):
+                self._refs[nombre] -= 1
+                if self._refs[nombre] > 0:
+                    continue
+                del self._refs[nombre]
+                if borrar:
+                    self._borrar_audio(nombre)
+
+    def _borrar_audio(self, nombre):
+        ruta = os.path.join(AUDIO_DIR, nombre)
+        try:
+            if time.time() - os.path.getmtime(ruta) < CACHE_AUDIO_GRACIA_SEGUNDOS:
+                self.stats["audios_en_gracia"] += 1
+                return
+            os.remove(ruta)
+        except FileNotFoundError:
+            return
+        self.stats["audios_borrados"] += 1
+        try:
+            os.remove(os.path.join(AUDIO_DIR, os.path.splitext(nombre)[0] + SUFIJO_VISEMAS))
+        except FileNotFoundError:
+            pass
+
+    def _audio_existe(self, variante):
+        return all(os.path.exists(os.path.join(AUDIO_DIR, nombre)) for nombre in self._audios(variante))
+
+    def _descartar_sin_audio(self, key):
+        # El conserje de TTS pudo haber borrado el MP3: esas variantes ya no sirven
+        variantes = self.cache[key]
+        muertas = [v for v in variantes if not self._audio_existe(v)]
+        if not muertas:
+            return
+        vivas = [v for v in variantes if all(v is not m for m in muertas)]
+        self._liberar(muertas)
+        self.stats["variantes_sin_audio"] += len(muertas)
+        if vivas:
+            self.cache[key] = vivas
+            self._anexar({"k": key, "v": vivas, "t": self.creado[key]})
+        else:
+            self._expulsar(key, "evicciones_sin_audio")
+
+    def _expulsar(self, key, motivo):
+        self._liberar(self.cache.pop(key))
+        self.creado.pop(key, None)
+        self.indice.remove(key)
+        self._anexar({"k": key, "d": 1})
+        self.stats[motivo] += 1
+
+    def _expirado(self, key):
+        return self.ttl > 0 and time.time() - self.creado.get(key, 0) > self.ttl
+
+    def purgar_expirados(self):
+        with self._lock:
+            for key in [k for k in self.cache if self._expirado(k)]:
+                self._expulsar(key, "evicciones_ttl")
+
+    # --- API ---
+    def buscar(self, texto, umbral=75):
+        # Top-k por coseno en el índice y re-ranqueo con token_set_ratio
+        self._sincronizar()
+        with self._lock:
+            mejor_match, score = self.indice.buscar(texto)
+        if score > umbral:
+            return mejor_match
+        self.stats["misses"] += 1
+        return None
 
     def get(self, key):
-        return self.cache.get(key)
+        with self._lock:
+            if key not in self.cache:
+                self.stats["misses"] += 1
+                return None
+            if self._expirado(key):
+                self._expulsar(key, "evicciones_ttl")
+                self.stats["misses"] += 1
+                return None
+            self._descartar_sin_audio(key)
+            if key not in self.cache:
+                self.stats["misses"] += 1
+                return None
+            self.cache.move_to_end(key)
+            self.stats["hits"] += 1
+            # Con todas sus variantes ya se sirve directo sin pasar por el LLM
+            if len(self.cache[key]) >= self.max_variantes:
+                self.stats["hits_servibles"] += 1
+            return self.cache[key]
+
+    def buscar_y_leer(self, texto, umbral=75):
+        # Búsqueda y lectura juntas para que ninguna de las dos corra en el event loop:
+        # (llave que hizo match, sus variantes), o None en lo que falte
+        clave = self.buscar(texto, umbral)
+        if clave is None:
+            return None, None
+        variantes = self.get(clave)
+        return clave, list(variantes) if variantes is not None else None
 
     def set(self, key, value):
-        if key in self.cache:
-            self.cache[key].append(value)
-        else:
-            self.cache[key] = [value]
-        self.save()
+        with self._lock:
+            # Se cuenta antes de expulsar: la variante nueva puede compartir MP3 con las que salen
+            self._referenciar([value])
+            if key in self.cache and not self._expirado(key):
+                variantes = self.cache[key]
+                variantes.append(value)
+                # Al pasar del tope se descarta la variante más vieja
+                while len(variantes) > self.max_variantes:
+                    self._liberar([variantes.pop(0)])
+                    self.stats["variantes_descartadas"] += 1
+                self.cache.move_to_end(key)
+            else:
+                if key in self.cache:
+                    self._expulsar(key, "evicciones_ttl")
+                self.cache[key] = [value]
+                self.creado[key] = time.time()
+                self.indice.add(key)
+                while len(self.cache) > self.max_claves:
+                    self._expulsar(next(iter(self.cache)), "evicciones_lru")
+            self._anexar({"k": key, "v": self.cache[key], "t": self.creado[key]})
+            if self._registros >= self.compactar_cada:
+                self._compactar_en_fondo()
+
+    def resumen(self):
+        with self._lock:
+            return {
+                "claves": len(self.cache),
+                "variantes": sum(len(v) for v in self.cache.values()),
+                "max_claves": self.max_claves,
+                "max_variantes": self.max_variantes,
+                "ttl_segundos": self.ttl,
+                "hits": self.stats["hits"],
+                "hits_servibles": self.stats["hits_servibles"],
+                "misses": self.stats["misses"],
+                "evicciones_lru": self.stats["evicciones_lru"],
+                "evicciones_ttl": self.stats["evicciones_ttl"],
+                "variantes_descartadas": self.stats["variantes_descartadas"],
+                "audios_borrados": self.stats["audios_borrados"],
+                "audios_en_gracia": self.stats["audios_en_gracia"],
+                "variantes_sin_audio": self.stats["variantes_sin_audio"],
+                "evicciones_sin_audio": self.stats["evicciones_sin_audio"]
+            }
@@ -0,0 +1,163 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Estado compartido entre workers de uvicorn en un solo archivo SQLite (modo
+# WAL: lectores concurrentes con un escritor a la vez, sin servidor aparte).
+# Guarda el cache de respuestas (más una bitácora de cambios que los demás
+# workers leen por número de secuencia), el historial de cada sesión y el
+# estado de los trabajos de reporte. Cada hilo usa su propia conexión.
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    clave TEXT PRIMARY KEY,
+    variantes TEXT NOT NULL,
+    creado REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache_cambios (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    clave TEXT NOT NULL,
+    variantes TEXT,
+    creado REAL,
+    hecho REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sesiones (
+    sid TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    ultimo_uso REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reportes (
+    id TEXT PRIMARY KEY,
+    trabajo TEXT NOT NULL,
+    actualizado REAL NOT NULL
+);
+"""
+
+
+class EstadoSQLite:
+
+    def __init__(self, ruta, timeout=10.0):
+        self.ruta = ruta
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conexion().executescript(ESQUEMA)
+
+    def _conexion(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=self.timeout, isolation_level=None)
+            con.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            con.execute("PRAGMA journal_mode=WAL")
+            # NORMAL en WAL: un corte de luz puede perder la última transacción, no corromper
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def _transaccion(self, fn):
+        con = self._conexion()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = fn(con)
+            con.execute("COMMIT")
+            return resultado
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    # --- Cache de respuestas ---
+    def cache_cargar(self):
+        # Estado completo más la última secuencia: desde ahí se siguen los cambios
+        # (la secuencia se lee primero: un cambio que se cuele en medio se reaplica, no se pierde)
+        con = self._conexion()
+        seq = con.execute("SELECT COALESCE(MAX(seq), 0) FROM cache_cambios").fetchone()[0]
+        cache = OrderedDict()
+        creado = {}
+        for clave, variantes, t in con.execute("SELECT clave, variantes, creado FROM cache ORDER BY creado"):
+            cache[clave] = json.loads(variantes)
+            creado[clave] = t
+        return cache, creado, seq
+
+    def cache_importar(self, cache, creado):
+        # Migración desde el snapshot JSON; si otro worker ya importó, no pisa nada
+        filas = [(k, json.dumps(v, ensure_ascii=False), creado.get(k, time.time())) for k, v in cache.items()]
+
+        def importar(con):
+            con.executemany("INSERT OR IGNORE INTO cache (clave, variantes, creado) VALUES (?, ?, ?)", filas)
+        self._transaccion(importar)
+
+    def cache_escribir(self, registro):
+        # Mismo formato que la bitácora de archivo: {"k","v","t"} o {"k","d":1}
+        clave = registro["k"]
+        borrado = bool(registro.get("d"))
+        variantes = None if borrado else json.dumps(registro["v"], ensure_ascii=False)
+        creado = None if borrado else registro.get("t", time.time())
+
+        def escribir(con):
+            if borrado:
+                con.execute("DELETE FROM cache WHERE clave = ?", (clave,))
+            else:
+                con.execute("INSERT OR REPLACE INTO cache (clave, variantes, creado) VALUES (?, ?, ?)",
+                            (clave, variantes, creado))
+            cur = con.execute("INSERT INTO cache_cambios (clave, variantes, creado, hecho) VALUES (?, ?, ?, ?)",
+                              (clave, variantes, creado, time.time()))
+            return cur.lastrowid
+        return self._transaccion(escribir)
+
+    def cache_cambios_desde(self, seq):
+        filas = self._conexion().execute(
+            "SELECT seq, clave, variantes, creado FROM cache_cambios WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+        return [(s, k, json.loads(v) if v is not None else None, t) for s, k, v, t in filas]
+
+    def cache_recortar_cambios(self, edad):
+        # Un worker que se quedó más atrás que esto recarga el estado completo
+        self._conexion().execute("DELETE FROM cache_cambios WHERE hecho < ?", (time.time() - edad,))
+
+    def cache_primera_seq(self):
+        return self._conexion().execute("SELECT COALESCE(MIN(seq), 0) FROM cache_cambios").fetchone()[0]
+
+    # --- Sesiones ---
+    def sesion_version(self, sid):
+        fila = self._conexion().execute("SELECT version FROM sesiones WHERE sid = ?", (sid,)).fetchone()
+        return fila[0] if fila else None
+
+    def sesion_cargar(self, sid):
+        fila = self._conexion().execute("SELECT estado, version FROM sesiones WHERE sid = ?", (sid,)).fetchone()
+        if fila is None:
+            return None, None
+        return json.loads(fila[0]), fila[1]
+
+    def sesion_guardar(self, sid, estado):
+        # Regresa la versión nueva; el último turno que termina es el que queda
+        datos = json.dumps(estado, ensure_ascii=False)
+
+        def guardar(con):
+            con.execute(
+                "INSERT INTO sesiones (sid, estado, version, ultimo_uso) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(sid) DO UPDATE SET estado = excluded.estado, version = version + 1, "
+                "ultimo_uso = excluded.ultimo_uso",
+                (sid, datos, time.time())
+            )
+            return con.execute("SELECT version FROM sesiones WHERE sid = ?", (sid,)).fetchone()[0]
+        return self._transaccion(guardar)
+
+    def sesiones_purgar(self, ttl):
+        cur = self._conexion().execute("DELETE FROM sesiones WHERE ultimo_uso < ?", (time.time() - ttl,))
+        return cur.rowcount
+
+    # --- Trabajos de reporte ---
+    def reporte_guardar(self, trabajo):
+        self._conexion().execute(
+            "INSERT OR REPLACE INTO reportes (id, trabajo, actualizado) VALUES (?, ?, ?)",
+            (trabajo["id"], json.dumps(trabajo, ensure_ascii=False), time.time())
+        )
+
+    def reporte_cargar(self, job_id):
+        fila = self._conexion().execute("SELECT trabajo FROM reportes WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def reportes_purgar(self, edad):
+        self._conexion().execute("DELETE FROM reportes WHERE actualizado < ?", (time.time() - edad,))
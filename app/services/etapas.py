@@ -0,0 +1,42 @@
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from app.config import LIMITE_LLM, LIMITE_TTS, LIMITE_HERRAMIENTAS, LIMITE_CACHE
+from app.services.metricas import metricas
+
+class Etapas:
+
+    # Un executor acotado por etapa bloqueante de /chat. Así una ráfaga de
+    # llamadas lentas a Vertex no se come los hilos de TTS ni los de CatBoost,
+    # y el event loop de uvicorn queda libre para atender a los demás.
+    def __init__(self, limites):
+        self.limites = dict(limites)
+        self._pools = {
+            nombre: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"etapa-{nombre}")
+            for nombre, n in self.limites.items()
+        }
+
+    async def ejecutar(self, etapa, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        encolado = time.perf_counter()
+        # Se copia el contexto para que lo medido en el hilo cuente en el Server-Timing
+        contexto = contextvars.copy_context()
+
+        def correr():
+            metricas.observar("maleon_cola_segundos", time.perf_counter() - encolado, pool=etapa)
+            return fn(*args, **kwargs)
+
+        return await loop.run_in_executor(self._pools[etapa], contexto.run, correr)
+
+    def cerrar(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+etapas = Etapas({
+    "llm": LIMITE_LLM,
+    "tts": LIMITE_TTS,
+    "herramientas": LIMITE_HERRAMIENTAS,
+    "cache": LIMITE_CACHE,
+})
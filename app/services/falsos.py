@@ -0,0 +1,203 @@
+import re
+import time
+import random
+import threading
+import unicodedata
+from app.config import (
+    FALSO_LATENCIA_LLM_MS, FALSO_LATENCIA_TTS_MS, FALSO_LATENCIA_REPORTE_MS, FALSO_TASA_FALLOS
+)
+
+# Dobles de Vertex (GenerativeModel / ChatSession) y de TextToSpeechClient para
+# medir /chat sin red. Imitan solo lo que usa el código: candidates[0].content.parts
+# con function_call, .text, chat.history y synthesize_speech() con audio_content
+# y los timepoints de las marcas SSML.
+# Cada llamada duerme una latencia ~normal y falla con la probabilidad dada.
+
+MUNICIPIOS = ["Mérida", "Progreso", "Valladolid", "Tizimín", "Motul", "Umán", "Kanasín", "Ticul", "Izamal", "Tekax"]
+CODIGOS = ["461110", "461121", "461130", "461150", "461160", "461170"]
+
+FRASES = [
+    "¡Mare nené! Qué gusto platicar con usted.",
+    "En el IMET trabajamos para que Yucatán crezca con tecnología ne’.",
+    "Cuénteme cómo le gustaría ser recordado, waay.",
+    "Maaa, eso que me dice tiene mucho potencial para la región.",
+    "TechMaleón le puede ayudar a ordenar esos datos en un ratito.",
+    "Fíjese que los retos de seguridad se atienden mejor con información a tiempo."
+]
+
+
+class FalloSimulado(Exception):
+    pass
+
+
+class Latencia:
+
+    def __init__(self, media_ms, tasa_fallos=0.0, semilla=None):
+        self.media_ms = media_ms
+        self.tasa_fallos = tasa_fallos
+        self._rng = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        with self._lock:
+            ms = max(0.0, self._rng.gauss(self.media_ms, self.media_ms * 0.3))
+            falla = self._rng.random() < self.tasa_fallos
+        time.sleep(ms / 1000)
+        if falla:
+            raise FalloSimulado("Fallo simulado del servicio remoto")
+
+
+class _FunctionCall:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+
+class _Parte:
+    def __init__(self, text=None, function_call=None):
+        self.text = text
+        self.function_call = function_call
+
+    def to_dict(self):
+        if self.function_call:
+            return {"function_call": {"name": self.function_call.name, "args": dict(self.function_call.args)}}
+        return {"text": self.text}
+
+
+class _Contenido:
+    def __init__(self, role, parts):
+        self.role = role
+        self.parts = parts
+
+    def to_dict(self):
+        # Mismo formato que Content.to_dict() de Vertex, para guardar sesiones
+        return {"role": self.role, "parts": [p.to_dict() for p in self.parts]}
+
+
+class _Candidato:
+    def __init__(self, content):
+        self.content = content
+
+
+class _Respuesta:
+    def __init__(self, parts):
+        self.candidates = [_Candidato(_Contenido("model", parts))]
+
+    @property
+    def text(self):
+        return " ".join(p.text for p in self.candidates[0].content.parts if p.text)
+
+
+def _plegar(texto):
+    return "".join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c)).lower()
+
+
+class ChatFalso:
+
+    def __init__(self, modelo, history=None):
+        self.modelo = modelo
+        self.history = list(history or [])
+
+    def send_message(self, mensaje):
+        # Como Vertex: acepta texto o lista de Parts; decide con la primera
+        partes = mensaje if isinstance(mensaje, list) else [mensaje]
+        textos = [p if isinstance(p, str) else p.text for p in partes]
+        self.modelo.latencia.esperar()
+        parts = self.modelo.responder(textos[0])
+        self.history.append(_Contenido("user", [_Parte(text=t) for t in textos]))
+        self.history.append(_Contenido("model", parts))
+        return _Respuesta(parts)
+
+
+class ModeloFalso:
+
+    # Misma firma que GenerativeModel(nombre, system_instruction=..., tools=...).
+    # Decide la herramienta por palabras clave del mensaje, como lo haría el LLM.
+    def __init__(self, model_name, system_instruction=None, tools=None, latencia=None,
+                 latencia_reporte=None, semilla=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.con_herramientas = bool(tools)
+        self.latencia = latencia or Latencia(FALSO_LATENCIA_LLM_MS, FALSO_TASA_FALLOS)
+        self.latencia_reporte = latencia_reporte or Latencia(FALSO_LATENCIA_REPORTE_MS, FALSO_TASA_FALLOS)
+        self._rng = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fabrica(cls, latencia_ms=None, latencia_reporte_ms=None, tasa_fallos=None):
+        # Todas las instancias comparten la latencia (y su generador) configurada
+        tasa = FALSO_TASA_FALLOS if tasa_fallos is None else tasa_fallos
+        latencia = Latencia(FALSO_LATENCIA_LLM_MS if latencia_ms is None else latencia_ms, tasa)
+        reporte = Latencia(FALSO_LATENCIA_REPORTE_MS if latencia_reporte_ms is None else latencia_reporte_ms, tasa)
+        return lambda nombre, **kwargs: cls(nombre, latencia=latencia, latencia_reporte=reporte, **kwargs)
+
+    def start_chat(self, history=None):
+        return ChatFalso(self, history)
+
+    def _municipio(self, plegado):
+        for muni in MUNICIPIOS:
+            if _plegar(muni) in plegado:
+                return muni
+        return "YUCATAN"
+
+    def responder(self, mensaje):
+        plegado = _plegar(mensaje)
+        if self.con_herramientas:
+            muni = self._municipio(plegado)
+            with self._lock:
+                if "negocio" in plegado or "crecimiento" in plegado:
+                    args = {"codigo": self._rng.choice(CODIGOS), "muni": muni,
+                            "v1": float(self._rng.choice([10, 50, 100])), "v2": float(self._rng.choice([5, 20])), "v3": 30.0}
+                    return [_Parte(function_call=_FunctionCall("predecir_crecimiento", args))]
+            if "seguridad" in plegado:
+                return [_Parte(function_call=_FunctionCall("consultar_seguridad", {"muni": muni}))]
+            if "servicio" in plegado or "desabasto" in plegado:
+                return [_Parte(function_call=_FunctionCall("buscar_servicios", {"muni": muni}))]
+        with self._lock:
+            texto = " ".join(self._rng.sample(FRASES, 2))
+        return [_Parte(text=texto)]
+
+    def generate_content(self, prompt):
+        # Solo lo usa el reporte: texto largo, sin herramientas
+        self.latencia_reporte.esperar()
+        tema = re.sub(r"\s+", " ", prompt[-200:])
+        parrafos = [f"Diagnóstico: {FRASES[i % len(FRASES)]} {tema}" for i in range(12)]
+        return _Respuesta([_Parte(text="\n\n".join(parrafos))])
+
+
+class _Timepoint:
+    def __init__(self, mark_name, time_seconds):
+        self.mark_name = mark_name
+        self.time_seconds = time_seconds
+
+
+class _AudioFalso:
+    def __init__(self, audio_content, timepoints=()):
+        self.audio_content = audio_content
+        self.timepoints = list(timepoints)
+
+
+class ClienteTTSFalso:
+
+    # ~1 KB de "MP3" por cada 10 caracteres, para que el disco y el conserje
+    # vean tamaños parecidos a los reales
+    def __init__(self, latencia=None):
+        self.latencia = latencia or Latencia(FALSO_LATENCIA_TTS_MS, FALSO_TASA_FALLOS)
+
+    def synthesize_speech(self, input=None, voice=None, audio_config=None, request=None):
+        self.latencia.esperar()
+        if request is not None:
+            input = request.input
+        texto = input.text or re.sub(r"<[^>]+>", "", input.ssml)
+        tam = max(1024, len(texto) * 100)
+        # Una marca cada ~80 ms por letra, como si la voz leyera parejo
+        timepoints = []
+        if input.ssml:
+            t = 0.1
+            for pedazo in re.split(r'(<mark name="[^"]+"/>)', input.ssml):
+                marca = re.fullmatch(r'<mark name="([^"]+)"/>', pedazo)
+                if marca:
+                    timepoints.append(_Timepoint(marca.group(1), round(t, 3)))
+                else:
+                    t += len(re.sub(r"<[^>]+>", "", pedazo)) * 0.08
+        return _AudioFalso(b"\xff\xfb\x90\x00" + bytes(tam - 4), timepoints)
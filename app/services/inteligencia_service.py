@@ -1,26 +1,187 @@
+import os
+import re
+import glob
+import time
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
 import pandas as pd
 import catboost as cb
 from thefuzz import fuzz, process
+from app.config import RUTA_SERVICIOS, RUTA_SEGURIDAD, MODELO_CRECIMIENTO, SNAPSHOTS_DIR
+
+MEMO_MUNICIPIOS = 4096
+# Nombres que pasan del filtro de bigramas al puntaje difuso
+CANDIDATOS_DIFUSOS = 10
+REVISAR_CSV_SEGUNDOS = 5
 
 class InteligenciaService:
-    def __init__(self):
+    def __init__(self,
+                 ruta_servicios=RUTA_SERVICIOS,
+                 ruta_seguridad=RUTA_SEGURIDAD,
+                 ruta_modelo=MODELO_CRECIMIENTO,
+                 snapshots_dir=SNAPSHOTS_DIR):
+        self.snapshots_dir = snapshots_dir
         # Cargamos el motor de Crecimiento
         self.model_growth = cb.CatBoostClassifier()
-        self.model_growth.load_model("models/maleon_predictor.cbm") 
+        self.model_growth.load_model(ruta_modelo)
+
+        self.ruta_servicios = ruta_servicios
+        self.ruta_seguridad = ruta_seguridad
+        self._lock = threading.Lock()
+        self._revisado = 0
+        self._cargar_datos()
+
+    def _firma(self):
+        firma = []
+        for ruta in (self.ruta_servicios, self.ruta_seguridad):
+            st = os.stat(ruta)
+            firma.append((st.st_mtime_ns, st.st_size))
+        return tuple(firma)
 
+    def _cargar_datos(self):
+        firma = self._firma()
         # Cargamos las bases de datos de servicios y seguridad
-        self.df_servicios = pd.read_csv("data/prioridades_yucatan_maleon.csv", encoding='latin-1')
-        self.df_seguridad = pd.read_csv("data/seguridad_municipios_maleon.csv")
+        df_servicios = self._leer_csv(self.ruta_servicios, encoding='latin-1')
+        df_seguridad = self._leer_csv(self.ruta_seguridad)
+
+        self.df_servicios = df_servicios
+        self.df_seguridad = df_seguridad
+        self._construir_indices()
+        self.firma = firma
+
+    def _leer_csv(self, ruta, **opciones):
+        # Snapshot binario (pickle) nombrado con la firma del CSV: en los
+        # reinicios se carga eso en lugar de volver a parsear el texto
+        st = os.stat(ruta)
+        base = os.path.join(self.snapshots_dir, os.path.basename(ruta))
+        snapshot = f"{base}.{st.st_mtime_ns}-{st.st_size}.pkl"
+        if os.path.exists(snapshot):
+            try:
+                return pd.read_pickle(snapshot)
+            except Exception as e:
+                print(f"Snapshot {snapshot} ilegible, se vuelve a leer el CSV: {e}")
+
+        df = pd.read_csv(ruta, **opciones)
+        try:
+            os.makedirs(self.snapshots_dir, exist_ok=True)
+            # Con varios workers arrancando a la vez cada uno escribe su temporal
+            tmp = f"{snapshot}.{os.getpid()}.tmp"
+            df.to_pickle(tmp)
+            os.replace(tmp, snapshot)
+            for viejo in glob.glob(f"{glob.escape(base)}.*.pkl"):
+                if viejo != snapshot:
+                    os.remove(viejo)
+        except OSError as e:
+            print(f"No se pudo guardar el snapshot de {ruta}: {e}")
+        return df
+
+    def _revisar_cambios(self):
+        # Si alguien reemplaza los CSV en caliente, reconstruimos todo (máx. cada 5 s)
+        ahora = time.monotonic()
+        if ahora - self._revisado < REVISAR_CSV_SEGUNDOS:
+            return
+        self._revisado = ahora
+        try:
+            if self._firma() != self.firma:
+                print("CSV de inteligencia modificados, reconstruyendo índices")
+                self._cargar_datos()
+        except Exception as e:
+            print(f"Error recargando CSV de inteligencia: {e}")
+
+    def _plegar(self, texto):
+        texto = "".join(c for c in unicodedata.normalize('NFKD', str(texto)) if not unicodedata.combining(c))
+        return re.sub(r"\s+", " ", texto.lower()).strip()
+
+    def _bigramas(self, plegado):
+        # Bigramas y no trigramas: con dos o tres errores en un nombre corto
+        # ('mria' -> 'merida') casi no queda ningún trigrama en común
+        bigramas = set()
+        for palabra in plegado.split():
+            palabra = f" {palabra} "
+            bigramas.update(palabra[i:i + 2] for i in range(len(palabra) - 1))
+        return bigramas
+
+    def _construir_indices(self):
+        # Por pilar: nombre plegado (sin acentos ni mayúsculas) -> nombre real,
+        # bigrama -> nombres plegados que lo tienen (candidatos para lo difuso),
+        # nombre real -> primer registro del CSV, y el resumen estatal ya calculado
+        indices = {}
+        candidatos = {}
+        registros = {}
+        for pilar, df in (("servicios", self.df_servicios), ("seguridad", self.df_seguridad)):
+            exactos = {}
+            for nombre in df['NOM_MUN'].dropna().unique().tolist():
+                exactos.setdefault(self._plegar(nombre), nombre)
+            indices[pilar] = exactos
+            por_bigrama = {}
+            for plegado in exactos:
+                for bigrama in self._bigramas(plegado):
+                    por_bigrama.setdefault(bigrama, []).append(plegado)
+            candidatos[pilar] = por_bigrama
+            unicos = df.dropna(subset=['NOM_MUN']).drop_duplicates('NOM_MUN', keep='first')
+            registros[pilar] = unicos.set_index('NOM_MUN').to_dict('index')
+
+        resumen = {
+            "servicios": {
+                "desabasto_promedio": self.df_servicios['INDICE_DESABASTO'].mean(),
+                "categoria_top": self.df_servicios['CATEGORIA'].mode()[0]
+            },
+            "seguridad": {
+                "riesgo_top": self.df_seguridad['CATEGORIA_SEGURIDAD'].mode()[0],
+                "aislados_total": self.df_seguridad['NEGOCIOS_AISLADOS'].sum()
+            }
+        }
+        with self._lock:
+            self._indices = indices
+            self._candidatos = candidatos
+            self._registros = registros
+            self._resumen = resumen
+            self._memo = OrderedDict()
+
+    def registro(self, muni_real, pilar="servicios"):
+        self._revisar_cambios()
+        pilar = "seguridad" if pilar == "seguridad" else "servicios"
+        return self._registros[pilar].get(muni_real)
+
+    def resumen_estatal(self, pilar="servicios"):
+        self._revisar_cambios()
+        pilar = "seguridad" if pilar == "seguridad" else "servicios"
+        return self._resumen[pilar]
 
     def limpiar_municipio(self, muni_usuario, pilar="servicios"):
         if not muni_usuario:
             return ""
-        
-        # Elegimos el dataframe correcto según lo que estemos buscando
-        df = self.df_seguridad if pilar == "seguridad" else self.df_servicios
-        nombres_reales = df['NOM_MUN'].unique().tolist()
-        
-        # Buscamos el parecido (ej: 'hoocaba' -> 'Hocabá')
-        match, score = process.extractOne(muni_usuario, nombres_reales, scorer=fuzz.token_set_ratio)
-        
-        return match if score > 70 else muni_usuario
\ No newline at end of file
+
+        self._revisar_cambios()
+        pilar = "seguridad" if pilar == "seguridad" else "servicios"
+        llave = (pilar, muni_usuario)
+        with self._lock:
+            if llave in self._memo:
+                self._memo.move_to_end(llave)
+                return self._memo[llave]
+            exactos = self._indices[pilar]
+            por_bigrama = self._candidatos[pilar]
+
+        # 1. Coincidencia exacta ignorando acentos y mayúsculas: O(1)
+        plegado = self._plegar(muni_usuario)
+        resultado = exactos.get(plegado)
+
+        # 2. Errores de dedo (ej: 'hoocaba' -> 'Hocabá'): los bigramas en común
+        # escogen unos cuantos nombres y solo esos pasan por token_set_ratio
+        if resultado is None:
+            comunes = Counter()
+            for bigrama in self._bigramas(plegado):
+                comunes.update(por_bigrama.get(bigrama, ()))
+            candidatos = {n: exactos[n] for n, _ in comunes.most_common(CANDIDATOS_DIFUSOS)}
+            encontrado = process.extractOne(plegado, candidatos, scorer=fuzz.token_set_ratio) if candidatos else None
+            if encontrado and encontrado[1] > 70:
+                resultado = encontrado[0]
+            else:
+                resultado = muni_usuario
+
+        with self._lock:
+            self._memo[llave] = resultado
+            if len(self._memo) > MEMO_MUNICIPIOS:
+                self._memo.popitem(last=False)
+        return resultado
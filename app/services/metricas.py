@@ -0,0 +1,135 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Histogramas y contadores por etapa, expuestos en formato de texto de
+# Prometheus por /metrics. Además, cada medición se anota en los tiempos de la
+# petición en curso (ContextVar) para armar el header Server-Timing de /chat;
+# Etapas copia el contexto a sus hilos, así que lo medido allá también cuenta.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+AYUDA = {
+    "maleon_etapa_segundos": "Duración de cada etapa de una petición",
+    "maleon_etapa_errores_total": "Etapas que terminaron en excepción",
+    "maleon_cola_segundos": "Espera en la cola del executor antes de correr",
+    "maleon_chat_respuestas_total": "Respuestas de /chat por origen",
+}
+
+_tiempos_peticion = ContextVar("tiempos_peticion", default=None)
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in etiquetas) + "}"
+
+
+class Metricas:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # (nombre, etiquetas) -> [conteos por bucket, suma, total]
+        self._histogramas = {}
+        self._contadores = {}
+        self._medidores = {}
+
+    def observar(self, nombre, segundos, **etiquetas):
+        llave = (nombre, tuple(sorted(etiquetas.items())))
+        i = bisect.bisect_left(self.buckets, segundos)
+        with self._lock:
+            h = self._histogramas.get(llave)
+            if h is None:
+                h = self._histogramas[llave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            h[0][i] += 1
+            h[1] += segundos
+            h[2] += 1
+
+    def contar(self, nombre, n=1, **etiquetas):
+        llave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._contadores[llave] = self._contadores.get(llave, 0) + n
+
+    def registrar_medidor(self, nombre, fn, ayuda=""):
+        # Valor que se lee al exponer (sesiones vivas, claves del cache...)
+        self._medidores[nombre] = fn
+        if ayuda:
+            AYUDA.setdefault(nombre, ayuda)
+
+    @contextmanager
+    def medir(self, etapa, **etiquetas):
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.contar("maleon_etapa_errores_total", etapa=etapa, **etiquetas)
+            raise
+        finally:
+            dt = time.perf_counter() - t0
+            self.observar("maleon_etapa_segundos", dt, etapa=etapa, **etiquetas)
+            tiempos = _tiempos_peticion.get()
+            if tiempos is not None:
+                # list.append es atómico: varios hilos de la misma petición pueden anotar
+                tiempos.append((etapa, dt))
+
+    def exponer(self):
+        with self._lock:
+            histogramas = {k: (list(v[0]), v[1], v[2]) for k, v in self._histogramas.items()}
+            contadores = dict(self._contadores)
+
+        lineas = []
+        vistos = set()
+
+        def encabezado(nombre, tipo):
+            if nombre not in vistos:
+                vistos.add(nombre)
+                lineas.append(f"# HELP {nombre} {AYUDA.get(nombre, nombre)}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+
+        for (nombre, etiquetas), (conteos, suma, total) in sorted(histogramas.items()):
+            encabezado(nombre, "histogram")
+            acumulado = 0
+            for le, c in zip(self.buckets + ("+Inf",), conteos):
+                acumulado += c
+                lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', le),))} {acumulado}")
+            lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {suma:.6f}")
+            lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {total}")
+
+        for (nombre, etiquetas), valor in sorted(contadores.items()):
+            encabezado(nombre, "counter")
+            lineas.append(f"{nombre}{_etiquetas(etiquetas)} {valor}")
+
+        for nombre, fn in sorted(self._medidores.items()):
+            try:
+                valor = fn()
+            except Exception as e:
+                print(f"Error leyendo medidor {nombre}: {e}")
+                continue
+            encabezado(nombre, "gauge")
+            lineas.append(f"{nombre} {valor}")
+
+        return "\n".join(lineas) + "\n"
+
+
+def iniciar_peticion():
+    # Lista donde medir() anota (etapa, segundos) durante esta petición
+    tiempos = []
+    _tiempos_peticion.set(tiempos)
+    return tiempos
+
+
+def server_timing(tiempos, total=None):
+    # Misma etapa varias veces (p. ej. dos escrituras a disco) se suma
+    sumas = {}
+    for etapa, dt in list(tiempos):
+        sumas[etapa] = sumas.get(etapa, 0.0) + dt
+    partes = [f"{etapa};dur={dt * 1000:.1f}" for etapa, dt in sumas.items()]
+    if total is not None:
+        partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+
+metricas = Metricas()
@@ -0,0 +1,85 @@
+import asyncio
+from collections import Counter, OrderedDict
+import numpy as np
+from app.config import PREDICCION_VENTANA_MS, PREDICCION_MAX_LOTE, PREDICCION_MEMO
+
+class PrediccionService:
+
+    # Envuelve model_growth: las peticiones que llegan dentro de la misma
+    # ventana se juntan en un solo predict() por lote, y los resultados se
+    # memorizan por (codigo, muni, v1, v2, v3) porque el LLM repite valores.
+    def __init__(self, modelo, ejecutar=None, ventana_ms=PREDICCION_VENTANA_MS,
+                 max_lote=PREDICCION_MAX_LOTE, max_memo=PREDICCION_MEMO):
+        self.modelo = modelo
+        # ejecutar(fn, *args) -> awaitable; por defecto el threadpool del loop
+        self.ejecutar = ejecutar or (lambda fn, *args: asyncio.get_running_loop().run_in_executor(None, fn, *args))
+        self.ventana = ventana_ms / 1000
+        self.max_lote = max_lote
+        self.max_memo = max_memo
+
+        self._memo = OrderedDict()
+        self._pendientes = OrderedDict()
+        self._temporizador = None
+        # El loop solo guarda referencias débiles a las tareas: sin esto un lote
+        # en curso podría recolectarse y dejar esperando a todos sus futuros
+        self._tareas = set()
+        self.stats = Counter()
+
+    def _llave(self, codigo, muni, v1, v2, v3):
+        return (str(codigo), str(muni), float(v1), float(v2), float(v3))
+
+    async def predecir(self, codigo, muni, v1, v2, v3):
+        llave = self._llave(codigo, muni, v1, v2, v3)
+        if llave in self._memo:
+            self._memo.move_to_end(llave)
+            self.stats["memo"] += 1
+            return self._memo[llave]
+
+        # Si la misma fila ya va en el lote en curso, esperamos ese resultado
+        futuro = self._pendientes.get(llave)
+        if futuro is None:
+            futuro = asyncio.get_running_loop().create_future()
+            self._pendientes[llave] = futuro
+            if len(self._pendientes) >= self.max_lote:
+                self._despachar()
+            elif self._temporizador is None:
+                self._temporizador = asyncio.get_running_loop().call_later(self.ventana, self._despachar)
+        return await asyncio.shield(futuro)
+
+    def _despachar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        if not self._pendientes:
+            return
+        lote = self._pendientes
+        self._pendientes = OrderedDict()
+        tarea = asyncio.ensure_future(self._correr_lote(lote))
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+    def _predecir_lote(self, filas):
+        preds = np.asarray(self.modelo.predict(filas))
+        # Multiclase regresa (n, 1); binario/regresión (n,)
+        return preds.reshape(len(filas), -1)[:, 0].tolist()
+
+    async def _correr_lote(self, lote):
+        llaves = list(lote)
+        filas = [list(llave) for llave in llaves]
+        self.stats["lotes"] += 1
+        self.stats["filas"] += len(filas)
+        try:
+            preds = await self.ejecutar(self._predecir_lote, filas)
+        except Exception as e:
+            for futuro in lote.values():
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+
+        for llave, pred in zip(llaves, preds):
+            self._memo[llave] = pred
+            futuro = lote[llave]
+            if not futuro.done():
+                futuro.set_result(pred)
+        while len(self._memo) > self.max_memo:
+            self._memo.popitem(last=False)
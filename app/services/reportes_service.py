@@ -0,0 +1,157 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.config import (
+    REPORTES_WORKERS, REPORTES_MAX_PENDIENTES, REPORTES_RETENER_TRABAJOS,
+    REPORTES_DIR, REPORTES_MAX_DIAS, REPORTES_MAX_ARCHIVOS, REPORTES_JANITOR_SEGUNDOS
+)
+
+class ReportesService:
+
+    # Cola de trabajos para los reportes PDF. Tienen su propio pool chico para
+    # que una ráfaga de reportes no le quite hilos al chat normal, y un tope de
+    # pendientes para no acumular trabajo que nadie va a esperar. Dos pedidos
+    # con la misma clave mientras el primero sigue en curso comparten trabajo.
+    # Un hilo conserje aplica la retención de static/reportes/.
+    # Con almacen (EstadoSQLite) el estado de cada trabajo se copia ahí, para
+    # que /reports/{id} responda aunque la consulta caiga en otro worker.
+    def __init__(self, workers=REPORTES_WORKERS, max_pendientes=REPORTES_MAX_PENDIENTES,
+                 retener=REPORTES_RETENER_TRABAJOS, directorio=REPORTES_DIR,
+                 max_dias=REPORTES_MAX_DIAS, max_archivos=REPORTES_MAX_ARCHIVOS,
+                 intervalo=REPORTES_JANITOR_SEGUNDOS, almacen=None):
+        self.almacen = almacen
+        self.max_pendientes = max_pendientes
+        self.retener = retener
+        self.directorio = directorio
+        self.max_edad = max_dias * 24 * 3600
+        self.max_archivos = max_archivos
+        self.intervalo = intervalo
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reportes")
+        self._lock = threading.Lock()
+        self._trabajos = OrderedDict()
+        self._en_curso = {}
+
+        self._detener = threading.Event()
+        self._conserje = threading.Thread(target=self._limpiar_periodicamente, name="reportes-conserje", daemon=True)
+        self._conserje.start()
+
+    def _pendientes(self):
+        return sum(1 for t in self._trabajos.values() if t["estado"] in ("pendiente", "procesando"))
+
+    def encolar(self, fn, *args, clave=None):
+        # Regresa el id del trabajo, o None si la cola está llena
+        with self._lock:
+            if clave is not None and clave in self._en_curso:
+                return self._en_curso[clave]
+            if self._pendientes() >= self.max_pendientes:
+                return None
+            job_id = uuid.uuid4().hex
+            if clave is not None:
+                self._en_curso[clave] = job_id
+            self._trabajos[job_id] = {
+                "id": job_id,
+                "estado": "pendiente",
+                "creado": time.time(),
+                "terminado": None,
+                "reply": None,
+                "error": None
+            }
+            self._recortar()
+            self._publicar(self._trabajos[job_id])
+        self._pool.submit(self._correr, job_id, clave, fn, *args)
+        return job_id
+
+    def _recortar(self):
+        # Solo se olvidan trabajos terminados, empezando por los más viejos
+        sobran = len(self._trabajos) - self.retener
+        for job_id in list(self._trabajos):
+            if sobran <= 0:
+                break
+            if self._trabajos[job_id]["estado"] in ("listo", "error"):
+                del self._trabajos[job_id]
+                sobran -= 1
+
+    def _actualizar(self, job_id, **cambios):
+        with self._lock:
+            trabajo = self._trabajos.get(job_id)
+            if trabajo is not None:
+                trabajo.update(cambios)
+                self._publicar(trabajo)
+
+    def _publicar(self, trabajo):
+        if self.almacen is None:
+            return
+        try:
+            self.almacen.reporte_guardar(trabajo)
+        except Exception as e:
+            print(f"Error guardando estado del reporte {trabajo['id']}: {e}")
+
+    def _correr(self, job_id, clave, fn, *args):
+        self._actualizar(job_id, estado="procesando")
+        try:
+            reply = fn(*args)
+            self._actualizar(job_id, estado="listo", reply=reply, terminado=time.time())
+        except Exception as e:
+            print(f"Error en trabajo de reporte {job_id}: {e}")
+            self._actualizar(job_id, estado="error", error=str(e), terminado=time.time(),
+                             reply="¡Ay mare! Se me trabó el sistema al generar ese documento.")
+        finally:
+            if clave is not None:
+                with self._lock:
+                    self._en_curso.pop(clave, None)
+
+    def estado(self, job_id):
+        with self._lock:
+            trabajo = self._trabajos.get(job_id)
+            if trabajo:
+                return dict(trabajo)
+        if self.almacen is not None:
+            # Lo encoló otro worker
+            return self.almacen.reporte_cargar(job_id)
+        return None
+
+    # --- Retención de static/reportes/ ---
+    def limpiar(self):
+        if not os.path.isdir(self.directorio):
+            return
+        ahora = time.time()
+        archivos = []
+        for entrada in os.scandir(self.directorio):
+            if entrada.is_file():
+                try:
+                    archivos.append((entrada.stat().st_mtime, entrada.path))
+                except FileNotFoundError:
+                    pass
+        archivos.sort(reverse=True)
+        for i, (mtime, ruta) in enumerate(archivos):
+            # Un .tmp reciente es un PDF que se está escribiendo
+            if ruta.endswith(".tmp") and ahora - mtime < 3600:
+                continue
+            if i >= self.max_archivos or ahora - mtime > self.max_edad:
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+
+    def _limpiar_periodicamente(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.limpiar()
+                if self.almacen is not None:
+                    self.almacen.reportes_purgar(self.max_edad)
+            except Exception as e:
+                print(f"Error limpiando {self.directorio}: {e}")
+
+    def detener(self):
+        self._detener.set()
+
+    def resumen(self):
+        with self._lock:
+            return {
+                "trabajos": len(self._trabajos),
+                "pendientes": self._pendientes(),
+                "max_pendientes": self.max_pendientes
+            }
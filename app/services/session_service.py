@@ -0,0 +1,148 @@
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from collections import Counter, OrderedDict
+from app.config import SESION_TTL_SEGUNDOS, SESION_MAX, SESION_REAPER_SEGUNDOS
+
+class SessionService:
+
+    # Reemplaza al dict sesiones_activas: LRU por session_id con expiración por
+    # inactividad y un hilo que barre las sesiones ociosas cada cierto tiempo.
+    #
+    # Con almacen (EstadoSQLite) cada turno guarda el historial de la sesión;
+    # cualquier worker puede rehidratar al agente desde ahí, y si otro worker
+    # avanzó la conversación (versión distinta) el agente local se reemplaza.
+    def __init__(self, fabrica, ttl=SESION_TTL_SEGUNDOS, max_sesiones=SESION_MAX, intervalo=SESION_REAPER_SEGUNDOS,
+                 almacen=None):
+        self.fabrica = fabrica
+        self.almacen = almacen
+        self.ttl = ttl
+        self.max_sesiones = max_sesiones
+        self.intervalo = intervalo
+
+        self._lock = threading.Lock()
+        self._sesiones = OrderedDict()
+        self._ultimo_uso = {}
+        self._versiones = {}
+        # sid -> [asyncio.Lock, turnos que lo tienen o lo esperan]
+        self._candados = {}
+        self._lock_candados = threading.Lock()
+        self.stats = Counter()
+
+        self._detener = threading.Event()
+        self._reaper = threading.Thread(target=self._barrer_periodicamente, name="sesiones-reaper", daemon=True)
+        self._reaper.start()
+
+    def __len__(self):
+        return len(self._sesiones)
+
+    def __contains__(self, sid):
+        return sid in self._sesiones
+
+    def obtener(self, sid):
+        with self._lock:
+            agente = self._sesiones.get(sid)
+            if agente is not None and self.almacen is not None:
+                version = self.almacen.sesion_version(sid)
+                if version is not None and version != self._versiones.get(sid):
+                    agente = None
+            if agente is not None:
+                self._sesiones.move_to_end(sid)
+                self._ultimo_uso[sid] = time.time()
+                return agente
+
+            agente = self.fabrica()
+            estado = None
+            if self.almacen is not None:
+                estado, version = self.almacen.sesion_cargar(sid)
+            if estado is not None:
+                agente.restaurar_estado(estado)
+                self._versiones[sid] = version
+                self.stats["rehidratadas"] += 1
+            else:
+                self.stats["creadas"] += 1
+            self._sesiones[sid] = agente
+            self._sesiones.move_to_end(sid)
+            self._ultimo_uso[sid] = time.time()
+            while len(self._sesiones) > self.max_sesiones:
+                self._cerrar(next(iter(self._sesiones)), "expulsadas_lru")
+            return agente
+
+    def guardar(self, sid, agente):
+        # Se llama al final de cada turno, con el candado de la sesión tomado
+        if self.almacen is None:
+            return
+        version = self.almacen.sesion_guardar(sid, agente.exportar_estado())
+        with self._lock:
+            if self._sesiones.get(sid) is agente:
+                self._versiones[sid] = version
+
+    @asynccontextmanager
+    async def candado(self, sid):
+        # asyncio.Lock por sesión para que sus turnos no se encimen. Se cuenta
+        # quién lo usa: si la sesión expira o sale por LRU a medio turno, el
+        # candado se queda hasta que lo suelte el último (si no, el siguiente
+        # turno crearía otro y correría a la vez que el anterior)
+        with self._lock_candados:
+            entrada = self._candados.get(sid)
+            if entrada is None:
+                entrada = self._candados[sid] = [asyncio.Lock(), 0]
+            entrada[1] += 1
+        try:
+            async with entrada[0]:
+                yield
+        finally:
+            with self._lock_candados:
+                entrada[1] -= 1
+                if entrada[1] == 0 and sid not in self._sesiones and self._candados.get(sid) is entrada:
+                    del self._candados[sid]
+
+    def _cerrar(self, sid, motivo):
+        self._sesiones.pop(sid, None)
+        self._ultimo_uso.pop(sid, None)
+        self._versiones.pop(sid, None)
+        with self._lock_candados:
+            entrada = self._candados.get(sid)
+            if entrada is not None and entrada[1] == 0:
+                del self._candados[sid]
+        self.stats[motivo] += 1
+
+    def barrer(self):
+        limite = time.time() - self.ttl
+        with self._lock:
+            # El OrderedDict va de la menos a la más reciente: cortamos al primer activo
+            for sid in list(self._sesiones):
+                if self._ultimo_uso[sid] > limite:
+                    break
+                self._cerrar(sid, "expiradas")
+        if self.almacen is not None:
+            # ultimo_uso en SQLite lo renueva cualquier worker que atienda la sesión
+            self.almacen.sesiones_purgar(self.ttl)
+
+    def _barrer_periodicamente(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.barrer()
+            except Exception as e:
+                print(f"Error barriendo sesiones: {e}")
+
+    def detener(self):
+        self._detener.set()
+
+    def resumen(self):
+        with self._lock:
+            agentes = list(self._sesiones.values())
+        # Los paquetes de conocimiento se comparten: se cuentan una sola vez
+        paquetes = {id(a.paquete): a.paquete for a in agentes if hasattr(a, "paquete")}
+        return {
+            "sesiones": len(agentes),
+            "max_sesiones": self.max_sesiones,
+            "ttl_segundos": self.ttl,
+            "memoria_aprox_bytes": sum(a.memoria_aproximada() for a in agentes),
+            "memoria_compartida_aprox_bytes": sum(p.memoria_aproximada() for p in paquetes.values()),
+            "creadas": self.stats["creadas"],
+            "rehidratadas": self.stats["rehidratadas"],
+            "expiradas": self.stats["expiradas"],
+            "expulsadas_lru": self.stats["expulsadas_lru"]
+        }
@@ -0,0 +1,191 @@
+import math
+import re
+import unicodedata
+import numpy as np
+from scipy import sparse
+from thefuzz import fuzz
+
+
+# Índice TF-IDF de n-gramas de caracteres para encontrar preguntas parecidas.
+# Las filas nuevas entran a un buffer chico; cada `lote` inserciones el buffer
+# se congela como bloque CSC y los bloques de tamaño parecido se fusionan
+# (estilo LSM), así `add()` queda en O(1) amortizado y la consulta solo toca
+# las columnas de los n-gramas de la pregunta.
+class SimilarityIndex:
+
+    def __init__(self, n=3, lote=256, candidatos=10):
+        self.n = n
+        self.lote = lote
+        self.candidatos = candidatos
+
+        self.vocab = {}
+        self.df = np.zeros(1024, dtype=np.float64)
+        self.claves = []
+        self.filas = {}
+        # Filas borradas: se filtran al consultar y se limpian al reconstruir
+        self._muertas = set()
+
+        # Cada bloque: [matriz CSC, fila inicial, filas, normas]
+        self._bloques = []
+        self._pendientes = []
+
+    def __len__(self):
+        return len(self.filas)
+
+    def __contains__(self, clave):
+        return clave in self.filas
+
+    # --- Vectorización ---
+    def _normalizar(self, texto):
+        texto = "".join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c)).lower()
+        return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", texto)).strip()
+
+    def _ngramas(self, texto):
+        conteo = {}
+        for palabra in self._normalizar(texto).split():
+            palabra = f" {palabra} "
+            if len(palabra) <= self.n:
+                conteo[palabra] = conteo.get(palabra, 0) + 1
+                continue
+            for i in range(len(palabra) - self.n + 1):
+                g = palabra[i:i + self.n]
+                conteo[g] = conteo.get(g, 0) + 1
+        return conteo
+
+    def _idf(self):
+        total = len(self.claves) + 1
+        return np.log(total / (self.df[:len(self.vocab)] + 1.0)) + 1.0
+
+    def _columna(self, ngrama):
+        col = self.vocab.get(ngrama)
+        if col is None:
+            col = len(self.vocab)
+            self.vocab[ngrama] = col
+            if col >= len(self.df):
+                self.df = np.concatenate([self.df, np.zeros(len(self.df), dtype=np.float64)])
+        return col
+
+    # --- Actualización incremental ---
+    def add(self, clave):
+        if clave in self.filas:
+            return
+        conteo = self._ngramas(clave)
+        cols = [self._columna(g) for g in conteo]
+        if cols:
+            self.df[cols] += 1
+        # TF sublineal; el IDF se aplica al momento de consultar
+        tf = [1.0 + math.log(c) for c in conteo.values()]
+        self.filas[clave] = len(self.claves)
+        self.claves.append(clave)
+        self._pendientes.append((cols, tf))
+        if len(self._pendientes) >= self.lote:
+            self._congelar()
+
+    def remove(self, clave):
+        fila = self.filas.pop(clave, None)
+        if fila is None:
+            return
+        cols = [self.vocab[g] for g in self._ngramas(clave)]
+        if cols:
+            self.df[cols] -= 1
+        self._muertas.add(fila)
+        if len(self._muertas) > max(self.lote, len(self.claves) // 2):
+            self._reconstruir()
+
+    def _reconstruir(self):
+        vivas = list(self.filas)
+        self.__init__(self.n, self.lote, self.candidatos)
+        for clave in vivas:
+            self.add(clave)
+
+    def _matriz_de(self, filas, ancho):
+        indptr = [0]
+        indices = []
+        datos = []
+        for cols, tf in filas:
+            indices.extend(cols)
+            datos.extend(tf)
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.asarray(datos, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(filas), ancho)
+        )
+
+    def _congelar(self):
+        self._bloques.append(self._bloque_pendiente())
+        self._pendientes = []
+
+        # Fusionamos mientras el último bloque sea del tamaño del anterior
+        while len(self._bloques) > 1 and self._bloques[-1][2] >= self._bloques[-2][2]:
+            b2 = self._bloques.pop()
+            b1 = self._bloques.pop()
+            m1, m2 = b1[0], b2[0]
+            ancho = max(m1.shape[1], m2.shape[1])
+            m1.resize((m1.shape[0], ancho))
+            m2.resize((m2.shape[0], ancho))
+            matriz = sparse.vstack([m1, m2], format="csc")
+            self._bloques.append([matriz, b1[1], b1[2] + b2[2], self._normas(matriz)])
+
+    def _bloque_pendiente(self):
+        matriz = self._matriz_de(self._pendientes, len(self.vocab)).tocsc()
+        inicio = len(self.claves) - len(self._pendientes)
+        return [matriz, inicio, len(self._pendientes), self._normas(matriz)]
+
+    def _normas(self, matriz):
+        # Se calculan con el IDF del momento; al fusionar bloques se refrescan
+        idf2 = self._idf()[:matriz.shape[1]] ** 2
+        return np.sqrt(matriz.multiply(matriz) @ idf2)
+
+    # --- Consulta ---
+    def top_k(self, texto, k=None):
+        k = k or self.candidatos
+        if not self.claves:
+            return []
+
+        conteo = self._ngramas(texto)
+        cols = np.asarray([self.vocab[g] for g in conteo if g in self.vocab], dtype=np.int64)
+        if len(cols) == 0:
+            return []
+        tf = np.asarray([1.0 + math.log(c) for g, c in conteo.items() if g in self.vocab])
+
+        idf = self._idf()
+        pesos = tf * idf[cols] ** 2
+        q_norma = np.sqrt(np.sum((tf * idf[cols]) ** 2))
+
+        ids = []
+        puntajes = []
+        bloques = list(self._bloques)
+        if self._pendientes:
+            bloques.append(self._bloque_pendiente())
+        for matriz, inicio, _, normas in bloques:
+            # Solo las columnas que el bloque ya conoce; las demás aportan cero
+            validas = cols < matriz.shape[1]
+            producto = matriz[:, cols[validas]] @ pesos[validas]
+            filas = np.flatnonzero(producto)
+            ids.append(filas + inicio)
+            puntajes.append(producto[filas] / normas[filas])
+
+        ids = np.concatenate(ids)
+        cos = np.concatenate(puntajes) / q_norma
+        if self._muertas:
+            vivas = ~np.isin(ids, np.fromiter(self._muertas, dtype=np.int64))
+            ids, cos = ids[vivas], cos[vivas]
+        if len(ids) == 0:
+            return []
+
+        k = min(k, len(cos))
+        top = np.argpartition(-cos, k - 1)[:k]
+        top = top[np.argsort(-cos[top])]
+        return [(self.claves[ids[i]], float(cos[i])) for i in top]
+
+    def buscar(self, texto):
+        # Re-ranqueo final con token_set_ratio solo sobre los mejores candidatos
+        candidatos = self.top_k(texto)
+        if not candidatos:
+            return None, 0
+        mejor, score = None, -1
+        for clave, _ in candidatos:
+            s = fuzz.token_set_ratio(texto, clave)
+            if s > score:
+                mejor, score = clave, s
+        return mejor, score
@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.config import (
+    WHISPER_MODELO, WHISPER_TRABAJADORES, WHISPER_IDIOMA, WHISPER_MAX_PENDIENTES
+)
+from app.services.metricas import metricas
+
+MUESTREO = 16000
+EXTENSIONES = (".wav", ".mp3", ".m4a", ".ogg", ".oga", ".webm", ".flac", ".mp4", ".opus")
+
+
+class TranscripcionOcupada(Exception):
+    pass
+
+
+class TranscripcionNoDisponible(Exception):
+    # Falta openai-whisper o ffmpeg en este servidor
+    pass
+
+
+def _whisper():
+    try:
+        import whisper
+    except ImportError:
+        raise TranscripcionNoDisponible("openai-whisper no está instalado (pip install openai-whisper)")
+    return whisper
+
+
+class TranscripcionService:
+
+    # Whisper local en CPU. Cada trabajador del pool tiene su propia instancia
+    # del modelo, cargada una sola vez y residente mientras viva el proceso
+    # (decode() le engancha el kv-cache al modelo: dos hilos sobre la misma
+    # instancia se pisan). Los hilos de torch se reparten entre trabajadores
+    # para que no compitan por los mismos núcleos.
+    def __init__(self, modelo=WHISPER_MODELO, trabajadores=WHISPER_TRABAJADORES, idioma=WHISPER_IDIOMA,
+                 max_pendientes=WHISPER_MAX_PENDIENTES, dispositivo="cpu", cargar_modelo=None):
+        self.modelo = modelo
+        self.trabajadores = trabajadores
+        self.idioma = idioma
+        self.max_pendientes = max_pendientes
+        self.dispositivo = dispositivo
+        self._cargar_modelo = cargar_modelo or self._cargar_whisper
+        self._pool = ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix="whisper")
+        self._modelos = queue.Queue()
+        self._lock = threading.Lock()
+        self._cargados = 0
+        self._pendientes = 0
+        self.stats = {
+            "transcripciones": 0,
+            "errores": 0,
+            "rechazadas": 0,
+            "segundos_audio": 0.0,
+            "segundos_proceso": 0.0,
+            "segundos_carga": 0.0
+        }
+
+    def _cargar_whisper(self):
+        whisper = _whisper()
+        if self.dispositivo == "cpu":
+            import torch
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.trabajadores))
+        return whisper.load_model(self.modelo, device=self.dispositivo)
+
+    def _tomar_modelo(self):
+        # Hasta `trabajadores` instancias; se cargan conforme hacen falta
+        try:
+            return self._modelos.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            cargar = self._cargados < self.trabajadores
+            if cargar:
+                self._cargados += 1
+        if not cargar:
+            return self._modelos.get()
+        t0 = time.perf_counter()
+        try:
+            with metricas.medir("whisper_carga"):
+                modelo = self._cargar_modelo()
+        except Exception:
+            with self._lock:
+                self._cargados -= 1
+            raise
+        dt = time.perf_counter() - t0
+        with self._lock:
+            self.stats["segundos_carga"] += dt
+        print(f"🎧 Whisper '{self.modelo}' cargado en {dt:.1f}s ({self._cargados}/{self.trabajadores})")
+        return modelo
+
+    def precalentar(self):
+        # Carga todas las instancias de una vez, en paralelo (bloquea hasta terminar)
+        def cargar():
+            self._modelos.put(self._tomar_modelo())
+        futuros = [self._pool.submit(cargar) for _ in range(self.trabajadores - self._cargados)]
+        for f in futuros:
+            f.result()
+
+    def _audio(self, audio):
+        # Ruta, bytes de un archivo (lo que sube el navegador) o PCM float32 a 16 kHz
+        if isinstance(audio, (bytes, bytearray)):
+            # ffmpeg necesita poder hacer seek en mp4/m4a: se pasa por un archivo temporal
+            with tempfile.NamedTemporaryFile(suffix=".audio", delete=False) as tmp:
+                tmp.write(audio)
+            try:
+                return self._audio(tmp.name)
+            finally:
+                os.remove(tmp.name)
+        if isinstance(audio, str):
+            whisper = _whisper()
+            try:
+                return whisper.load_audio(audio)
+            except FileNotFoundError:
+                raise TranscripcionNoDisponible("ffmpeg no está instalado")
+        return audio
+
+    def _transcribir(self, audio, idioma):
+        # ffmpeg decodifica antes de apartar un modelo: no lo tiene ocupado de balde
+        try:
+            with metricas.medir("whisper_decodificar"):
+                pcm = self._audio(audio)
+        except Exception:
+            with self._lock:
+                self.stats["errores"] += 1
+            raise
+        modelo = self._tomar_modelo()
+        try:
+            duracion = len(pcm) / MUESTREO
+            t0 = time.perf_counter()
+            with metricas.medir("whisper"):
+                resultado = modelo.transcribe(pcm, language=idioma or self.idioma, fp16=False)
+            segundos = time.perf_counter() - t0
+        except Exception:
+            with self._lock:
+                self.stats["errores"] += 1
+            raise
+        finally:
+            self._modelos.put(modelo)
+
+        with self._lock:
+            self.stats["transcripciones"] += 1
+            self.stats["segundos_audio"] += duracion
+            self.stats["segundos_proceso"] += segundos
+        return {
+            "text": resultado["text"].strip(),
+            "language": resultado.get("language", idioma or self.idioma),
+            "duracion_audio": round(duracion, 2),
+            "segundos": round(segundos, 3)
+        }
+
+    def transcribir(self, audio, idioma=None):
+        # Síncrono: para scripts y para el asistente de voz local
+        return self._transcribir(audio, idioma)
+
+    async def transcribir_async(self, audio, idioma=None):
+        # Para el endpoint: con el pool lleno se rechaza en lugar de formar una cola eterna
+        with self._lock:
+            if self._pendientes >= self.max_pendientes:
+                self.stats["rechazadas"] += 1
+                raise TranscripcionOcupada()
+            self._pendientes += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, self._transcribir, audio, idioma)
+        finally:
+            with self._lock:
+                self._pendientes -= 1
+
+    def transcribir_lote(self, rutas, idioma=None):
+        # Va entregando (ruta, resultado o None, error o None) conforme terminan
+        futuros = {self._pool.submit(self._transcribir, ruta, idioma): ruta for ruta in rutas}
+        for futuro in as_completed(futuros):
+            ruta = futuros[futuro]
+            try:
+                yield ruta, futuro.result(), None
+            except Exception as e:
+                yield ruta, None, str(e)
+
+    def resumen(self):
+        with self._lock:
+            s = dict(self.stats)
+            s["modelo"] = self.modelo
+            s["trabajadores"] = self.trabajadores
+            s["cargados"] = self._cargados
+            s["pendientes"] = self._pendientes
+        # Segundos de audio por segundo de cómputo de un trabajador
+        s["tiempo_real_x"] = round(s["segundos_audio"] / s["segundos_proceso"], 2) if s["segundos_proceso"] else None
+        return s
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def buscar_audios(carpeta):
+    rutas = []
+    for raiz, _, archivos in os.walk(carpeta):
+        rutas.extend(os.path.join(raiz, a) for a in sorted(archivos) if a.lower().endswith(EXTENSIONES))
+    return sorted(rutas)
+
+
+if __name__ == "__main__":
+    # Modo lote: transcribe una carpeta a JSONL y reporta el throughput
+    #   python -m app.services.transcripcion_service grabaciones/ --salida transcripciones.jsonl --trabajadores 4
+    parser = argparse.ArgumentParser()
+    parser.add_argument("carpeta")
+    parser.add_argument("--salida", default=None, help="Archivo JSONL (por omisión, a la salida estándar)")
+    parser.add_argument("--modelo", default=WHISPER_MODELO)
+    parser.add_argument("--trabajadores", type=int, default=WHISPER_TRABAJADORES)
+    parser.add_argument("--idioma", default=WHISPER_IDIOMA)
+    args = parser.parse_args()
+
+    rutas = buscar_audios(args.carpeta)
+    if not rutas:
+        sys.exit(f"No hay audios en {args.carpeta}")
+
+    servicio = TranscripcionService(modelo=args.modelo, trabajadores=args.trabajadores, idioma=args.idioma)
+    t0 = time.perf_counter()
+    servicio.precalentar()
+    carga = time.perf_counter() - t0
+
+    salida = open(args.salida, "w", encoding="utf-8") if args.salida else sys.stdout
+    t0 = time.perf_counter()
+    try:
+        for i, (ruta, resultado, error) in enumerate(servicio.transcribir_lote(rutas), 1):
+            fila = {"archivo": ruta, **(resultado or {}), **({"error": error} if error else {})}
+            salida.write(json.dumps(fila, ensure_ascii=False) + "\n")
+            salida.flush()
+            print(f"[{i}/{len(rutas)}] {ruta} {'ERROR ' + error if error else ''}", file=sys.stderr)
+    finally:
+        if salida is not sys.stdout:
+            salida.close()
+    pared = time.perf_counter() - t0
+
+    r = servicio.resumen()
+    print(
+        f"\n{r['transcripciones']} audios ({r['segundos_audio']:.0f} s de audio) en {pared:.1f} s "
+        f"con {args.trabajadores} trabajadores de '{args.modelo}' | carga {carga:.1f} s | "
+        f"{r['segundos_audio'] / pared:.1f} s de audio por segundo | errores {r['errores']}",
+        file=sys.stderr
+    )
+    servicio.cerrar()
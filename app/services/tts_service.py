@@ -1,40 +1,205 @@
-import uuid
 import os
-from google.cloud import texttospeech
-from app.config import PROJECT_ID
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import Counter
+# v1beta1: la misma API de v1, más los timepoints de las marcas SSML (visemas)
+from google.cloud import texttospeech_v1beta1 as texttospeech
+from app.services import visemas
+from app.services.metricas import metricas
+from app.config import PROJECT_ID, AUDIO_DIR, TTS_AUDIO_MAX_MB, TTS_AUDIO_MAX_DIAS, TTS_JANITOR_SEGUNDOS
+
+# Google acepta hasta 5000 bytes de entrada; las marcas de los visemas ocupan
+# ~20 por palabra, así que un texto largo se manda sin ellas (visemas estimados)
+LIMITE_ENTRADA_TTS = 5000
+FIN_ORACION = re.compile(r"(?<=[.!?…])\s+")
+
+
+def dividir_oraciones(texto, minimo=25):
+    # Corta en fin de oración y junta los pedazos muy cortos ("¡Mare!") con el
+    # siguiente, para no pagar una llamada de TTS por cada interjección
+    oraciones = []
+    actual = ""
+    for pedazo in FIN_ORACION.split(texto.strip()):
+        actual = f"{actual} {pedazo}".strip()
+        if len(actual) >= minimo:
+            oraciones.append(actual)
+            actual = ""
+    if actual:
+        if oraciones:
+            oraciones[-1] = f"{oraciones[-1]} {actual}"
+        else:
+            oraciones.append(actual)
+    return oraciones
+
 
 class TTSService:
 
-    def __init__(self):
-        self.client = texttospeech.TextToSpeechClient(
+    # El MP3 se nombra con el hash de (texto normalizado, voz, tono, velocidad,
+    # codificación): si ya existe en disco se sirve sin llamar a Google.
+    # Junto a cada MP3 va {hash}.visemas.json con la línea de tiempo de la boca.
+    # Un hilo conserje mantiene temp_audio/ dentro de la cuota de edad y tamaño.
+    def __init__(self, audio_dir=AUDIO_DIR, max_mb=TTS_AUDIO_MAX_MB, max_dias=TTS_AUDIO_MAX_DIAS,
+                 intervalo=TTS_JANITOR_SEGUNDOS, client=None):
+        # client se puede inyectar (p. ej. el falso de app.services.falsos)
+        self.client = client or texttospeech.TextToSpeechClient(
             client_options={"quota_project_id": PROJECT_ID}
         )
+        self.audio_dir = audio_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_edad = max_dias * 24 * 3600
+        self.intervalo = intervalo
+
+        self.language_code = "es-US"
+        self.voice_name = "es-US-Neural2-B"
+        self.pitch = -4.0
+        self.speaking_rate = 0.85
+        self.audio_encoding = texttospeech.AudioEncoding.MP3
+
+        self.stats = Counter()
+        os.makedirs(self.audio_dir, exist_ok=True)
+        self._detener = threading.Event()
+        self._conserje = threading.Thread(target=self._limpiar_periodicamente, name="tts-conserje", daemon=True)
+        self._conserje.start()
+
+    def _normalizar(self, text):
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+    def clave(self, text: str):
+        partes = [
+            self._normalizar(text), self.language_code, self.voice_name,
+            str(self.pitch), str(self.speaking_rate), str(int(self.audio_encoding))
+        ]
+        return hashlib.sha256("\x1f".join(partes).encode("utf-8")).hexdigest()[:32]
+
+    def _escribir(self, filepath, contenido):
+        # Escritura atómica: nunca se sirve un archivo a medias
+        tmp = f"{filepath}.{threading.get_ident()}.tmp"
+        with metricas.medir("disco", destino="tts"):
+            with open(tmp, "wb") as out:
+                out.write(contenido)
+            os.replace(tmp, filepath)
+
+    def _guardar_visemas(self, ruta, texto, inicios=None):
+        linea = visemas.linea_de_tiempo(texto, inicios, velocidad=self.speaking_rate)
+        self.stats[f"visemas_{linea['fuente']}"] += 1
+        self._escribir(ruta, visemas.serializar(linea).encode("utf-8"))
 
     def synthesize(self, text: str):
-        synthesis_input = texttospeech.SynthesisInput(text=text)
+        clave = self.clave(text)
+        filename = f"{clave}.mp3"
+        filepath = os.path.join(self.audio_dir, filename)
+        ruta_visemas = os.path.join(self.audio_dir, f"{clave}{visemas.SUFIJO}")
+        texto = self._normalizar(text)
+
+        if os.path.exists(filepath):
+            # Refrescamos el mtime para que el conserje lo trate como reciente
+            try:
+                os.utime(filepath)
+                self.stats["hits"] += 1
+            except FileNotFoundError:
+                pass
+            else:
+                try:
+                    os.utime(ruta_visemas)
+                except FileNotFoundError:
+                    # MP3 de antes de los visemas: sin marcas, se estiman
+                    self._guardar_visemas(ruta_visemas, texto)
+                return f"/temp_audio/{filename}"
+
+        ssml = visemas.ssml_con_marcas(texto)
+        if len(ssml.encode("utf-8")) <= LIMITE_ENTRADA_TTS:
+            synthesis_input = texttospeech.SynthesisInput(ssml=ssml)
+        else:
+            synthesis_input = texttospeech.SynthesisInput(text=texto)
 
         voice = texttospeech.VoiceSelectionParams(
-            language_code="es-US",
-            name="es-US-Neural2-B"
+            language_code=self.language_code,
+            name=self.voice_name
         )
 
         audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-            pitch=-4.0,
-            speaking_rate=0.85
+            audio_encoding=self.audio_encoding,
+            pitch=self.pitch,
+            speaking_rate=self.speaking_rate
         )
 
-        response = self.client.synthesize_speech(
+        request = texttospeech.SynthesizeSpeechRequest(
             input=synthesis_input,
             voice=voice,
-            audio_config=audio_config
+            audio_config=audio_config,
+            enable_time_pointing=[texttospeech.SynthesizeSpeechRequest.TimepointType.SSML_MARK]
         )
 
-        filename = f"{uuid.uuid4()}.mp3"
-        os.makedirs("temp_audio", exist_ok=True)
-        filepath = os.path.join("temp_audio", filename)
+        with metricas.medir("tts_remoto"):
+            response = self.client.synthesize_speech(request=request)
+        self.stats["sintetizados"] += 1
 
-        with open(filepath, "wb") as out:
-            out.write(response.audio_content)
+        os.makedirs(self.audio_dir, exist_ok=True)
+        # Primero los visemas: si el MP3 existe, su línea de tiempo también
+        self._guardar_visemas(ruta_visemas, texto, visemas.inicios_de_marcas(response.timepoints))
+        self._escribir(filepath, response.audio_content)
 
         return f"/temp_audio/{filename}"
+
+    # --- Conserje de temp_audio/ ---
+    def limpiar(self):
+        ahora = time.time()
+        archivos = []
+        lineas = {}
+        for entrada in os.scandir(self.audio_dir):
+            if not entrada.is_file():
+                continue
+            try:
+                st = entrada.stat()
+            except FileNotFoundError:
+                continue
+            if entrada.name.endswith(visemas.SUFIJO):
+                lineas[entrada.name[:-len(visemas.SUFIJO)]] = (st.st_mtime, st.st_size, entrada.path)
+            else:
+                archivos.append([st.st_mtime, st.st_size, entrada.path, []])
+
+        # Los visemas viven y mueren con su MP3 (y cuentan en su tamaño)
+        for archivo in archivos:
+            linea = lineas.pop(os.path.splitext(os.path.basename(archivo[2]))[0], None)
+            if linea:
+                archivo[1] += linea[1]
+                archivo[3].append(linea[2])
+        # Sin MP3: el de una síntesis en curso, o uno que se quedó huérfano
+        archivos.extend([mtime, tam, ruta, []] for mtime, tam, ruta in lineas.values())
+
+        archivos.sort()
+        total = sum(tam for _, tam, _, _ in archivos)
+        for mtime, tam, ruta, acompanantes in archivos:
+            viejo = ahora - mtime > self.max_edad
+            # Un .tmp reciente se está escribiendo; de más de una hora, nunca terminó
+            if ruta.endswith((".tmp", visemas.SUFIJO)):
+                if ahora - mtime < 3600:
+                    continue
+                viejo = True
+            if not (viejo or total > self.max_bytes):
+                continue
+            try:
+                os.remove(ruta)
+                total -= tam
+                self.stats["borrados"] += 1
+            except FileNotFoundError:
+                pass
+            for acompanante in acompanantes:
+                try:
+                    os.remove(acompanante)
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def _limpiar_periodicamente(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.limpiar()
+            except Exception as e:
+                print(f"Error limpiando {self.audio_dir}: {e}")
+
+    def detener(self):
+        self._detener.set()
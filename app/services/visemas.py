@@ -0,0 +1,137 @@
+import re
+import json
+from xml.sax.saxutils import escape
+
+# Línea de tiempo de bocas (visemas) para cada audio de TTS. Las bocas son las
+# mismas imágenes de /avatar: A, E, I, O, F_V, M_P_B, N_D y neutral.
+#
+# El texto se parte en palabras y a cada una se le pone un <mark> de SSML;
+# Google devuelve en qué segundo del MP3 empieza cada palabra y dentro de ella
+# las bocas se reparten por letra (el español se lee casi como se escribe).
+# Sin marcas (voz sin SSML, audios viejos) los tiempos se estiman.
+
+SUFIJO = ".visemas.json"
+PALABRA = re.compile(r"\w+")
+# Segundos por letra a speaking_rate 1.0 (~13 letras por segundo en español)
+SEGUNDOS_LETRA = 1 / 13
+SEGUNDOS_ENTRE_PALABRAS = 0.04
+PAUSAS = {",": 0.25, ";": 0.3, ":": 0.3, ".": 0.45, "!": 0.45, "?": 0.45, "…": 0.5}
+
+VOCALES = {"a": "A", "á": "A", "e": "E", "é": "E", "i": "I", "í": "I",
+           "o": "O", "ó": "O", "u": "O", "ú": "O", "ü": "O"}
+LABIALES = {"b": "M_P_B", "v": "M_P_B", "m": "M_P_B", "p": "M_P_B", "f": "F_V"}
+# Peso de cada boca dentro de la palabra: las vocales duran más que las consonantes
+PESO_VOCAL = 1.4
+PESO_CONSONANTE = 0.8
+
+
+def bocas(palabra):
+    palabra = palabra.lower()
+    resultado = []
+    i = 0
+    while i < len(palabra):
+        letra = palabra[i]
+        siguiente = palabra[i + 1] if i + 1 < len(palabra) else ""
+        if letra == "h":
+            # Muda, salvo en "ch" (que ya se contó con la c)
+            i += 1
+            continue
+        if letra in "qg" and siguiente == "u" and palabra[i + 2:i + 3] in ("e", "i", "é", "í"):
+            # "que", "gui": la u no suena
+            resultado.append("N_D")
+            i += 2
+            continue
+        if letra + siguiente in ("ch", "ll", "rr"):
+            resultado.append("N_D")
+            i += 2
+            continue
+        if letra == "y" and not siguiente:
+            resultado.append("I")
+        elif letra in VOCALES:
+            resultado.append(VOCALES[letra])
+        elif letra in LABIALES:
+            resultado.append(LABIALES[letra])
+        elif letra.isdigit():
+            # Un número se dice con varias sílabas; basta con que la boca se abra
+            resultado.extend(["A", "N_D"])
+        else:
+            resultado.append("N_D")
+        i += 1
+    return resultado
+
+
+def palabras(texto):
+    # [(palabra, pausa en segundos que sigue por la puntuación)]
+    encontradas = list(PALABRA.finditer(texto))
+    resultado = []
+    for n, m in enumerate(encontradas):
+        hasta = encontradas[n + 1].start() if n + 1 < len(encontradas) else len(texto)
+        entre = texto[m.end():hasta]
+        pausa = max((PAUSAS.get(c, 0.0) for c in entre), default=0.0)
+        resultado.append((m.group(), pausa))
+    return resultado
+
+
+def ssml_con_marcas(texto):
+    # Una marca "p{n}" antes de cada palabra; lo de en medio va tal cual (escapado)
+    partes = ["<speak>"]
+    ultimo = 0
+    for n, m in enumerate(PALABRA.finditer(texto)):
+        partes.append(escape(texto[ultimo:m.start()]))
+        partes.append(f'<mark name="p{n}"/>{escape(m.group())}')
+        ultimo = m.end()
+    partes.append(escape(texto[ultimo:]))
+    partes.append("</speak>")
+    return "".join(partes)
+
+
+def inicios_de_marcas(timepoints):
+    inicios = {}
+    for tp in timepoints:
+        if tp.mark_name.startswith("p") and tp.mark_name[1:].isdigit():
+            inicios[int(tp.mark_name[1:])] = tp.time_seconds
+    return inicios
+
+
+def linea_de_tiempo(texto, inicios=None, velocidad=1.0):
+    # Cuadros [segundo, boca] ordenados; cada uno vale hasta que empieza el
+    # siguiente. inicios: {número de palabra: segundo} de las marcas SSML.
+    lista = palabras(texto)
+    con_marcas = bool(lista) and bool(inicios) and all(n in inicios for n in range(len(lista)))
+    segundos_letra = SEGUNDOS_LETRA / (velocidad or 1.0)
+
+    cuadros = []
+    t = 0.0
+    fin = 0.0
+    for n, (palabra, pausa) in enumerate(lista):
+        unidades = bocas(palabra) or ["N_D"]
+        pesos = [PESO_VOCAL if b in ("A", "E", "I", "O") else PESO_CONSONANTE for b in unidades]
+        duracion = sum(pesos) * segundos_letra
+        if con_marcas:
+            t = inicios[n]
+            if n + 1 < len(lista):
+                # La palabra no puede durar más que el hueco hasta la siguiente marca
+                duracion = min(duracion, max(0.0, inicios[n + 1] - t) * 0.95)
+        if cuadros and t - fin > 0.08:
+            cuadros.append([round(fin, 3), "neutral"])
+
+        paso = duracion / sum(pesos)
+        momento = t
+        for boca, peso in zip(unidades, pesos):
+            if not cuadros or cuadros[-1][1] != boca:
+                cuadros.append([round(momento, 3), boca])
+            momento += peso * paso
+        fin = t + duracion
+        t = fin + pausa + SEGUNDOS_ENTRE_PALABRAS
+
+    if cuadros:
+        cuadros.append([round(fin, 3), "neutral"])
+    return {
+        "fuente": "marcas" if con_marcas else "estimado",
+        "duracion": round(fin, 3),
+        "cuadros": cuadros
+    }
+
+
+def serializar(linea):
+    return json.dumps(linea, ensure_ascii=False, separators=(",", ":"))
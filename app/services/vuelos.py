@@ -0,0 +1,53 @@
+import asyncio
+from collections import Counter
+from app.services.metricas import metricas
+
+
+class Vuelos:
+
+    # Single-flight: mientras una generación con cierta llave está en curso,
+    # las peticiones idénticas que llegan se suben a ese mismo "vuelo" en vez
+    # de pagar otra llamada a Vertex o a TTS. El vuelo corre en su propia
+    # tarea: si el que lo empezó se desconecta, los demás igual reciben el
+    # resultado. Si falla, o el resultado no sirve para todos (servible),
+    # cada pasajero genera lo suyo como antes. Es por proceso: entre workers
+    # no se comparte.
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self._vuelos = {}
+        self.stats = Counter()
+
+    def __len__(self):
+        return len(self._vuelos)
+
+    def _aterrizar(self, clave, tarea):
+        if self._vuelos.get(clave) is tarea:
+            del self._vuelos[clave]
+        # Se lee la excepción aunque nadie espere ya el resultado
+        if not tarea.cancelled():
+            tarea.exception()
+
+    async def ejecutar(self, clave, fabrica, servible=None):
+        # Regresa (resultado, compartido). fabrica() crea la corrutina.
+        tarea = self._vuelos.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(fabrica())
+            self._vuelos[clave] = tarea
+            tarea.add_done_callback(lambda t: self._aterrizar(clave, t))
+            self.stats["vuelos"] += 1
+            return await asyncio.shield(tarea), False
+
+        try:
+            resultado = await asyncio.shield(tarea)
+        except Exception as e:
+            print(f"Vuelo {self.nombre} '{clave}' falló, se genera aparte: {e}")
+        else:
+            if servible is None or servible(resultado):
+                self.stats["compartidos"] += 1
+                metricas.contar("maleon_vuelos_compartidos_total", vuelo=self.nombre)
+                return resultado, True
+        self.stats["aparte"] += 1
+        return await fabrica(), False
+
+    def resumen(self):
+        return {"en_curso": len(self._vuelos), **self.stats}
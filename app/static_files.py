@@ -0,0 +1,136 @@
+import os
+import gzip
+import mimetypes
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se sirve gzip
+    brotli = None
+
+COMPRIMIDOS_DIR = ".cache/estaticos"
+EXTENSIONES = (".html", ".js", ".css", ".json", ".svg", ".txt")
+TAMANO_MINIMO = 1024
+
+
+def ruta_comprimida(comprimidos_dir, relativa, sufijo):
+    return os.path.join(comprimidos_dir, f"{relativa}{sufijo}")
+
+
+def codificaciones_aceptadas(accept_encoding):
+    # {codificación: q} de Accept-Encoding; "gzip;q=0" es un rechazo explícito
+    aceptadas = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.partition(";")
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        q = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, valor = parametro.partition("=")
+            if clave.strip().lower() == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        aceptadas[nombre] = q
+    return aceptadas
+
+
+def acepta(aceptadas, codificacion):
+    # Sin mencionarla, vale lo que diga el comodín (y sin comodín, no se acepta)
+    return aceptadas.get(codificacion, aceptadas.get("*", 0.0)) > 0
+
+
+def precomprimir(directorio, comprimidos_dir, calidad_brotli=11):
+    # Genera .gz y .br de los archivos de texto grandes. Solo recomprime si el
+    # original es más nuevo que su variante, así que correrlo de nuevo es barato.
+    generados = 0
+    for raiz, _, archivos in os.walk(directorio):
+        for nombre in archivos:
+            if not nombre.endswith(EXTENSIONES):
+                continue
+            origen = os.path.join(raiz, nombre)
+            st = os.stat(origen)
+            if st.st_size < TAMANO_MINIMO:
+                continue
+            relativa = os.path.relpath(origen, directorio)
+            codificadores = [(".gz", lambda d: gzip.compress(d, 9, mtime=0))]
+            if brotli is not None:
+                codificadores.append((".br", lambda d: brotli.compress(d, quality=calidad_brotli)))
+
+            datos = None
+            for sufijo, comprimir in codificadores:
+                destino = ruta_comprimida(comprimidos_dir, relativa, sufijo)
+                if os.path.exists(destino) and os.stat(destino).st_mtime >= st.st_mtime:
+                    continue
+                if datos is None:
+                    with open(origen, "rb") as f:
+                        datos = f.read()
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                # Con varios workers todos precomprimen al arrancar: tmp por proceso
+                tmp = f"{destino}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(comprimir(datos))
+                os.replace(tmp, destino)
+                generados += 1
+    return generados
+
+
+class StaticFilesCacheados(StaticFiles):
+
+    # StaticFiles con Cache-Control fijo por montaje y, si el cliente lo
+    # acepta, la variante .br/.gz precomprimida del archivo. FileResponse ya
+    # pone ETag y Last-Modified; la variante tiene su propio ETag.
+    def __init__(self, *args, cache_control="public, max-age=3600", comprimidos_dir=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+        self.comprimidos_dir = comprimidos_dir
+
+    def _variante(self, full_path, stat_result, request_headers):
+        if not self.comprimidos_dir or stat_result.st_size < TAMANO_MINIMO:
+            return None
+        aceptadas = codificaciones_aceptadas(request_headers.get("accept-encoding", ""))
+        relativa = os.path.relpath(full_path, self.directory)
+        for codificacion, sufijo in (("br", ".br"), ("gzip", ".gz")):
+            if not acepta(aceptadas, codificacion):
+                continue
+            ruta = ruta_comprimida(self.comprimidos_dir, relativa, sufijo)
+            try:
+                st = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            # Una variante más vieja que el original ya no corresponde
+            if st.st_mtime >= stat_result.st_mtime:
+                return ruta, st, codificacion
+        return None
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        headers = {"Cache-Control": self.cache_control}
+
+        variante = self._variante(full_path, stat_result, request_headers)
+        if variante:
+            ruta, st, codificacion = variante
+            media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+            headers["Content-Encoding"] = codificacion
+            headers["Vary"] = "Accept-Encoding"
+            response = FileResponse(ruta, status_code=status_code, stat_result=st,
+                                    media_type=media_type, headers=headers)
+        else:
+            if self.comprimidos_dir:
+                headers["Vary"] = "Accept-Encoding"
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result,
+                                    headers=headers)
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    # Paso de build: python -m app.static_files
+    n = precomprimir("static", os.path.join(COMPRIMIDOS_DIR, "static"))
+    print(f"static: {n} variantes generadas")
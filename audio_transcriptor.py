@@ -1,13 +1,26 @@
 import speech_recognition as sr
 import json
+import time
+import math
+import threading
+import collections
+import numpy as np
 from typing import Literal
 
+# audioop ya no existe en Python 3.13: la energía de cada bloque se calcula con numpy
+TIPOS_MUESTRA = {1: np.int8, 2: np.int16, 4: np.int32}
+
+
+def energia_rms(buffer, ancho):
+    muestras = np.frombuffer(buffer, TIPOS_MUESTRA[ancho]).astype(np.float64)
+    return math.sqrt(np.mean(muestras * muestras)) if muestras.size else 0.0
+
 class modulo_transcriptor:
 
-    def __init__(self, method: Literal["whisper", "google", "sphinx"] = "google"):
+    def __init__(self, method: Literal["whisper", "google", "sphinx"] = "google", recalibrar_cada: float = 60.0):
         self.recognizer = sr.Recognizer()
         self.method = method
-        
+
         try:
             self.microfono = sr.Microphone()
         except Exception as e:
@@ -18,34 +31,139 @@ class modulo_transcriptor:
         self.recognizer.phrase_threshold = 0.3
         self.recognizer.non_speaking_duration = 0.5
 
+        # Calibrar cuesta un segundo de silencio: se hace una vez y luego solo cada tanto
+        self.recalibrar_cada = recalibrar_cada
+        self.ultima_calibracion = None
+        # Mientras Maleón habla el micrófono oye la bocina: hace falta más energía para contar como voz
+        self.factor_eco = 2.0
+        self.max_frase = 20.0
+
+        # Whisper queda cargado en memoria desde el arranque, no en la primera frase
+        self.motor_whisper = None
+        if method == "whisper":
+            from app.services.transcripcion_service import TranscripcionService
+            self.motor_whisper = TranscripcionService(modelo="small", trabajadores=1)
+            threading.Thread(target=self.motor_whisper.precalentar, daemon=True).start()
+
     def listar_microfonos(self) -> list:
         try:
             return sr.Microphone.list_microphone_names()
         except:
             return []
 
+    def calibrar(self, source, duracion: float = 1.0):
+        self.recognizer.adjust_for_ambient_noise(source, duration=duracion)
+        self.ultima_calibracion = time.monotonic()
+
+    def calibracion_vencida(self) -> bool:
+        return self.ultima_calibracion is None or time.monotonic() - self.ultima_calibracion > self.recalibrar_cada
+
     def transcribir_desde_micrófono(self, lenguaje: str = "es-ES"):
         if self.microfono is None:
             return {"success": False, "error": "Micrófono no disponible. PyAudio no instalado correctamente."}
-        
+
         try:
             with self.microfono as source:
-                self.recognizer.adjust_for_ambient_noise(source, duration=1)
+                if self.calibracion_vencida():
+                    self.calibrar(source)
                 grabacion = self.recognizer.listen(source)
-                text = self._recognize_audio(grabacion, lenguaje)
+            return self.reconocer(grabacion, lenguaje)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
 
-                return {
-                    "success": True,
-                    "text": text,
-                    "method": self.method
-                }
+    def reconocer(self, grabacion, lenguaje: str = "es-ES"):
+        try:
+            text = self._recognize_audio(grabacion, lenguaje)
+            return {
+                "success": True,
+                "text": text,
+                "method": self.method
+            }
+        except sr.UnknownValueError:
+            return {"success": False, "error": "No se entendió el audio"}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def escuchar_continuo(self, al_detectar_voz=None, hablando=None, detener=None):
+        # Deja el micrófono abierto y va entregando cada frase (AudioData) en
+        # cuanto termina. al_detectar_voz se llama apenas empieza una frase, antes
+        # de que acabe: sirve para cortar a Maleón si el usuario le habla encima.
+        # Es el mismo detector por energía de Recognizer.listen (mismo
+        # energy_threshold y mismos tiempos), pero listen no avisa cuando empieza
+        # la frase, no sube el umbral mientras suena la bocina y suelta el
+        # micrófono entre frases.
+        if self.microfono is None:
+            raise RuntimeError("Micrófono no disponible. PyAudio no instalado correctamente.")
+
+        with self.microfono as source:
+            self.calibrar(source)
+            segundos_chunk = source.CHUNK / source.SAMPLE_RATE
+            pausa = math.ceil(self.recognizer.pause_threshold / segundos_chunk)
+            minimo_voz = math.ceil(self.recognizer.phrase_threshold / segundos_chunk)
+            maximo = math.ceil(self.max_frase / segundos_chunk)
+            # Lo que sonó justo antes del inicio, para no comerse la primera sílaba
+            previos = collections.deque(maxlen=math.ceil(self.recognizer.non_speaking_duration / segundos_chunk))
+            # Energía del silencio reciente: con ella se recalibra sin volver a escuchar un segundo
+            ruido = collections.deque(maxlen=math.ceil(2.0 / segundos_chunk))
+
+            frase = []
+            voz = silencio = 0
+            avisado = False
+            while not (detener and detener.is_set()):
+                buffer = source.stream.read(source.CHUNK)
+                if not buffer:
+                    break
+                energia = energia_rms(buffer, source.SAMPLE_WIDTH)
+                con_eco = bool(hablando and hablando())
+                umbral = self.recognizer.energy_threshold * (self.factor_eco if con_eco else 1.0)
+                hay_voz = energia > umbral
+
+                if not frase:
+                    if not hay_voz:
+                        previos.append(buffer)
+                        if not con_eco:
+                            ruido.append(energia)
+                            if self.calibracion_vencida() and len(ruido) == ruido.maxlen:
+                                self._recalibrar(ruido)
+                        continue
+                    frase = list(previos)
+                    previos.clear()
+                    voz = silencio = 0
+                    avisado = False
+
+                frase.append(buffer)
+                if hay_voz:
+                    voz += 1
+                    silencio = 0
+                else:
+                    silencio += 1
+
+                if not avisado and voz >= minimo_voz:
+                    avisado = True
+                    if al_detectar_voz:
+                        al_detectar_voz()
+
+                if silencio >= pausa or len(frase) >= maximo:
+                    # Un golpe o un clic no llega a minimo_voz y se tira
+                    if voz >= minimo_voz:
+                        # Como listen: del silencio final solo se deja un poco
+                        sobra = silencio - previos.maxlen
+                        if sobra > 0:
+                            del frase[-sobra:]
+                        yield sr.AudioData(b"".join(frase), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+                    frase = []
+
+    def _recalibrar(self, ruido):
+        # Mismo criterio que adjust_for_ambient_noise, con la energía ya leída
+        objetivo = sum(ruido) / len(ruido) * self.recognizer.dynamic_energy_ratio
+        self.recognizer.energy_threshold = max(objetivo, 50)
+        self.ultima_calibracion = time.monotonic()
+
     def _recognize_audio(self, grabacion_data, language: str) -> str:
         if self.method == "google":
             return self.recognizer.recognize_google(grabacion_data, language=language)
         elif self.method == "whisper":
-            return self.recognizer.recognize_whisper(grabacion_data, language=language[:2], model="small")
+            pcm = np.frombuffer(grabacion_data.get_raw_data(convert_rate=16000, convert_width=2), np.int16)
+            return self.motor_whisper.transcribir(pcm.astype(np.float32) / 32768.0, language[:2])["text"]
         elif self.method == "sphinx":
             return self.recognizer.recognize_sphinx(grabacion_data, language=language)
@@ -0,0 +1,95 @@
+# Costo de arrancar un worker:
+#  - CSV de servicios leído con pandas vs el snapshot pickle que deja
+#    InteligenciaService (segundo arranque en adelante)
+#  - componentes construidos en serie (como antes, al importar los routers)
+#    vs en paralelo desde el lifespan, con tiempos de carga simulados
+#
+#   python -m benchmarks.bench_arranque
+#   python -m benchmarks.bench_arranque --filas 500000 --carga tts=0.8 inteligencia=2.5 agente=1.2 cache=0.1
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def csv_vs_snapshot(filas, repetir):
+    import pandas as pd
+    from app.services.inteligencia_service import InteligenciaService
+
+    rng = random.Random(1)
+    d = tempfile.mkdtemp()
+    ruta = os.path.join(d, "servicios.csv")
+    pd.DataFrame({
+        "NOM_MUN": [f"Municipio {rng.randrange(106)}" for _ in range(filas)],
+        "CATEGORIA": [rng.choice(["Alta prioridad", "Media", "Baja"]) for _ in range(filas)],
+        "NOMBRE": [f"Establecimiento {i} S.A. de C.V." for i in range(filas)],
+        "LATITUD": [rng.uniform(19.5, 21.6) for _ in range(filas)],
+        "LONGITUD": [rng.uniform(-90.4, -87.5) for _ in range(filas)]
+    }).to_csv(ruta, index=False, encoding="latin-1")
+
+    # Sin pasar por __init__: solo interesa _leer_csv
+    servicio = InteligenciaService.__new__(InteligenciaService)
+    servicio.snapshots_dir = os.path.join(d, "snapshots")
+
+    t0 = time.perf_counter()
+    servicio._leer_csv(ruta, encoding="latin-1")
+    primera = time.perf_counter() - t0
+
+    csv, snapshot = [], []
+    for _ in range(repetir):
+        t0 = time.perf_counter()
+        pd.read_csv(ruta, encoding="latin-1")
+        csv.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        servicio._leer_csv(ruta, encoding="latin-1")
+        snapshot.append(time.perf_counter() - t0)
+    return os.path.getsize(ruta), primera, statistics.median(csv), statistics.median(snapshot)
+
+
+def serie_vs_paralelo(cargas):
+    from app.services.arranque import Arranque
+
+    def fabrica(segundos):
+        return lambda: time.sleep(segundos) or segundos
+
+    t0 = time.perf_counter()
+    for segundos in cargas.values():
+        fabrica(segundos)()
+    serie = time.perf_counter() - t0
+
+    arranque = Arranque()
+    for nombre, segundos in cargas.items():
+        arranque.registrar(nombre, fabrica(segundos))
+    t0 = time.perf_counter()
+    asyncio.run(arranque.iniciar(esperar=True))
+    paralelo = time.perf_counter() - t0
+    arranque.cerrar()
+    return serie, paralelo
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filas", type=int, default=200000)
+    parser.add_argument("--repetir", type=int, default=5)
+    parser.add_argument("--carga", nargs="+", default=["tts=0.6", "inteligencia=1.8", "agente=0.9", "cache=0.05"],
+                        help="componente=segundos de carga simulados")
+    args = parser.parse_args()
+
+    tamano, primera, csv, snapshot = csv_vs_snapshot(args.filas, args.repetir)
+    print(f"CSV de {args.filas} filas ({tamano / 1e6:.1f} MB)")
+    print(f"  read_csv            {csv:6.3f} s")
+    print(f"  snapshot pickle     {snapshot:6.3f} s  ({csv / snapshot:.1f}x)")
+    print(f"  primer arranque     {primera:6.3f} s  (CSV + escribir snapshot)\n")
+
+    cargas = {n: float(s) for n, s in (c.split("=") for c in args.carga)}
+    serie, paralelo = serie_vs_paralelo(cargas)
+    print(f"componentes {', '.join(f'{n} {s:g}s' for n, s in cargas.items())}")
+    print(f"  en serie            {serie:6.2f} s")
+    print(f"  en paralelo         {paralelo:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
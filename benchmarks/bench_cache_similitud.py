@@ -0,0 +1,78 @@
+# Benchmark de la búsqueda difusa del cache de /chat.
+# Compara el escaneo lineal original (process.extractOne) contra el índice
+# TF-IDF de n-gramas de CacheService con 1k, 10k y 100k llaves sintéticas.
+#
+#   python -m benchmarks.bench_cache_similitud
+import random
+import statistics
+import time
+from thefuzz import fuzz, process
+
+from app.services.similarity_index import SimilarityIndex
+
+PALABRAS = (
+    "que como cuando donde quien mare nene maleon imet techmaleon merida yucatan progreso valladolid "
+    "tizimin hocaba seguridad servicios negocio crecimiento reporte mapa renacimiento maya tren gobierno "
+    "alcaldesa gobernador escuela carrera beca inscripcion costo horario clima comida cochinita panucho "
+    "salbut marquesita hamaca cenote playa turismo empresa empleo inversion agua luz drenaje calle parque"
+).split()
+
+TAMANOS = [1_000, 10_000, 100_000]
+CONSULTAS = 50
+
+
+def generar_claves(n, rng):
+    claves = set()
+    while len(claves) < n:
+        claves.add(" ".join(rng.choice(PALABRAS) for _ in range(rng.randint(3, 9))))
+    return list(claves)
+
+
+def perturbar(texto, rng):
+    # Simula lo que dice un usuario real: palabras de más y algún error de dedo
+    palabras = texto.split()
+    if rng.random() < 0.5:
+        palabras.insert(rng.randrange(len(palabras) + 1), rng.choice(PALABRAS))
+    i = rng.randrange(len(palabras))
+    if len(palabras[i]) > 3:
+        p = palabras[i]
+        j = rng.randrange(len(p) - 1)
+        palabras[i] = p[:j] + p[j + 1] + p[j] + p[j + 2:]
+    return " ".join(palabras)
+
+
+def medir(fn, consultas):
+    tiempos = []
+    for q in consultas:
+        t0 = time.perf_counter()
+        fn(q)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    tiempos.sort()
+    return statistics.median(tiempos), tiempos[int(len(tiempos) * 0.95) - 1]
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'llaves':>8} | {'lineal p50':>11} | {'lineal p95':>11} | {'indice p50':>11} | {'indice p95':>11} | {'build s':>8} | {'acuerdo':>7}")
+    for n in TAMANOS:
+        claves = generar_claves(n, rng)
+        consultas = [perturbar(rng.choice(claves), rng) for _ in range(CONSULTAS)]
+
+        t0 = time.perf_counter()
+        indice = SimilarityIndex()
+        for c in claves:
+            indice.add(c)
+        build = time.perf_counter() - t0
+
+        lineal = lambda q: process.extractOne(q, claves, scorer=fuzz.token_set_ratio)
+        lin_p50, lin_p95 = medir(lineal, consultas)
+        idx_p50, idx_p95 = medir(indice.buscar, consultas)
+
+        # Qué tan seguido el índice llega al mismo puntaje que el escaneo completo
+        acuerdo = sum(lineal(q)[1] == indice.buscar(q)[1] for q in consultas) / len(consultas)
+
+        print(f"{n:>8} | {lin_p50:>9.2f}ms | {lin_p95:>9.2f}ms | {idx_p50:>9.2f}ms | {idx_p95:>9.2f}ms | {build:>8.2f} | {acuerdo:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
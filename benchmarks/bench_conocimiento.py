@@ -0,0 +1,67 @@
+# Tamaño del prompt por turno: todo el conocimiento + la lista VIP completos en
+# el system instruction (como estaba) contra system instruction fijo + los
+# top-k fragmentos BM25 + solo el VIP detectado. También cómo escala cuando la
+# carpeta de conocimiento crece (copias sintéticas de los .txt).
+#
+#   python -m benchmarks.bench_conocimiento
+import json
+import time
+import statistics
+
+from app.agent.conocimiento import cargar_vip, cargar_conocimiento, cargar_fragmentos, construir_system_instruction
+from app.agent.recuperacion import IndiceBM25
+from app.agent.alias_index import IndiceAlias
+from app.config import CONOCIMIENTO_TOP_K
+
+VIP_FILE = "data/contexto/invitados_vip.json"
+KNOWLEDGE = "data/conocimiento/*.txt"
+PREGUNTAS = [
+    "qué licenciaturas ofrece el imet",
+    "qué es el renacimiento maya",
+    "soy el gober, qué hace techmaleon por el estado",
+    "cómo ayudan a las empresas a encontrar talento",
+    "hola, cómo estás",
+    "qué alianzas tiene el instituto con el gobierno",
+]
+
+
+def tokens(texto):
+    return len(texto) // 4 + 1
+
+
+def medir(copias):
+    vip = cargar_vip(VIP_FILE)
+    base_texto = cargar_conocimiento(KNOWLEDGE)
+    base_fragmentos = cargar_fragmentos(KNOWLEDGE)
+    texto = "".join(base_texto.replace("--- INFO ", f"--- INFO copia{i}_") for i in range(copias))
+    fragmentos = [(f"copia{i}_{fuente}", t) for i in range(copias) for fuente, t in base_fragmentos]
+
+    fijo = construir_system_instruction()
+    # Antes: el system instruction llevaba todo el conocimiento y todos los VIP
+    antes = tokens(fijo) + tokens(texto) + tokens(json.dumps(vip))
+
+    t0 = time.perf_counter()
+    indice = IndiceBM25(fragmentos)
+    construir = time.perf_counter() - t0
+
+    alias = IndiceAlias(vip)
+    despues = []
+    consultas = []
+    for p in PREGUNTAS:
+        t0 = time.perf_counter()
+        bloque = indice.bloque(p, CONOCIMIENTO_TOP_K)
+        consultas.append(time.perf_counter() - t0)
+        v = alias.buscar(p)
+        despues.append(tokens(fijo) + tokens(bloque) + (tokens(json.dumps(v)) if v else 0))
+    return antes, statistics.mean(despues), len(fragmentos), construir, statistics.mean(consultas)
+
+
+def main():
+    print(f"{'copias':>7}{'fragmentos':>12}{'antes tok':>12}{'después tok':>14}{'índice ms':>12}{'consulta ms':>13}")
+    for copias in (1, 10, 50, 200):
+        antes, despues, n, construir, consulta = medir(copias)
+        print(f"{copias:>7}{n:>12}{antes:>12,}{despues:>14,.0f}{construir * 1000:>12.1f}{consulta * 1000:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
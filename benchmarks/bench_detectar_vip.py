@@ -0,0 +1,79 @@
+# Microbenchmark de detectar_vip: recorrido original (normalizar cada alias de
+# cada VIP en cada mensaje) contra el trie de alias pre-normalizados.
+# Usa data/contexto/invitados_vip.json replicado N veces con alias únicos.
+#
+#   python -m benchmarks.bench_detectar_vip
+import copy
+import json
+import random
+import time
+
+from app.agent.alias_index import IndiceAlias, normalizar
+
+VIP_FILE = "data/contexto/invitados_vip.json"
+ESCALAS = [1, 10, 100]
+MENSAJES = 2000
+
+
+def detectar_vip_original(vip_data, mensaje):
+    msg_norm = normalizar(mensaje)
+    for key, data in vip_data.items():
+        for alias in data.get("alias", []):
+            if f" {normalizar(alias)} " in f" {msg_norm} ": return data
+    return None
+
+
+def escalar(vip_data, factor):
+    escalado = {}
+    for i in range(factor):
+        for key, data in vip_data.items():
+            copia = copy.deepcopy(data)
+            if i:
+                copia["alias"] = [f"{a} {i}" for a in data.get("alias", [])]
+            escalado[f"{key}_{i}"] = copia
+    return escalado
+
+
+def generar_mensajes(vip_data, rng):
+    relleno = ("hola buenas tardes soy el que vino a ver lo del imet y quería saber "
+               "qué opina usted de la seguridad en mérida y del tren maya ne").split()
+    alias = [a for d in vip_data.values() for a in d.get("alias", [])]
+    mensajes = []
+    for _ in range(MENSAJES):
+        palabras = rng.sample(relleno, rng.randint(6, 16))
+        if rng.random() < 0.3:
+            palabras.insert(rng.randrange(len(palabras) + 1), rng.choice(alias))
+        mensajes.append(" ".join(palabras))
+    return mensajes
+
+
+def medir(fn, mensajes):
+    t0 = time.perf_counter()
+    for m in mensajes:
+        fn(m)
+    return (time.perf_counter() - t0) / len(mensajes) * 1e6
+
+
+def main():
+    with open(VIP_FILE, "r", encoding="utf-8") as f:
+        vip_data = json.load(f)
+    rng = random.Random(7)
+
+    print(f"{'VIPs':>6} | {'alias':>6} | {'original µs/msg':>16} | {'trie µs/msg':>12} | {'build ms':>9} | {'iguales':>7}")
+    for factor in ESCALAS:
+        datos = escalar(vip_data, factor)
+        mensajes = generar_mensajes(datos, rng)
+
+        t0 = time.perf_counter()
+        indice = IndiceAlias(datos)
+        build = (time.perf_counter() - t0) * 1000
+
+        original = medir(lambda m: detectar_vip_original(datos, m), mensajes)
+        trie = medir(indice.buscar, mensajes)
+        iguales = sum(detectar_vip_original(datos, m) is indice.buscar(m) for m in mensajes) / len(mensajes)
+        n_alias = sum(len(d.get("alias", [])) for d in datos.values())
+        print(f"{len(datos):>6} | {n_alias:>6} | {original:>16.1f} | {trie:>12.1f} | {build:>9.2f} | {iguales:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
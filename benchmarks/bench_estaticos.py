@@ -0,0 +1,64 @@
+# Bytes transferidos por los archivos grandes de /static: StaticFiles tal cual
+# (como estaba) contra StaticFilesCacheados con variantes gzip/brotli, más la
+# revalidación con If-None-Match que ahora responde 304 sin cuerpo.
+#
+#   python -m benchmarks.bench_estaticos
+import os
+import tempfile
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.staticfiles import StaticFiles
+
+from app.static_files import StaticFilesCacheados, precomprimir, TAMANO_MINIMO
+
+DIRECTORIO = "static"
+
+
+def cliente(montaje):
+    app = FastAPI()
+    app.mount("/static", montaje, name="static")
+    return TestClient(app)
+
+
+def main():
+    archivos = sorted(
+        (n for n in os.listdir(DIRECTORIO)
+         if os.path.isfile(os.path.join(DIRECTORIO, n)) and os.path.getsize(os.path.join(DIRECTORIO, n)) >= TAMANO_MINIMO),
+        key=lambda n: -os.path.getsize(os.path.join(DIRECTORIO, n))
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        precomprimir(DIRECTORIO, tmp)
+        print(f"precompresión: {time.perf_counter() - t0:.1f} s")
+
+        antes = cliente(StaticFiles(directory=DIRECTORIO))
+        despues = cliente(StaticFilesCacheados(directory=DIRECTORIO, comprimidos_dir=tmp))
+
+        totales = {"antes": 0, "gzip": 0, "br": 0}
+        print(f"{'archivo':<40}{'antes':>12}{'gzip':>12}{'br':>12}")
+        for nombre in archivos:
+            url = f"/static/{nombre}"
+            # El cliente de prueba descomprime: medimos el cuerpo crudo de la respuesta
+            crudo = len(antes.get(url, headers={"Accept-Encoding": "identity"}).content)
+            gz = despues.get(url, headers={"Accept-Encoding": "gzip"})
+            br = despues.get(url, headers={"Accept-Encoding": "br, gzip"})
+            tam_gz = int(gz.headers["content-length"])
+            tam_br = int(br.headers["content-length"])
+            totales["antes"] += crudo
+            totales["gzip"] += tam_gz
+            totales["br"] += tam_br
+            print(f"{nombre:<40}{crudo:>12,}{tam_gz:>12,}{tam_br:>12,}")
+
+            etag = br.headers["etag"]
+            revalida = despues.get(url, headers={"Accept-Encoding": "br, gzip", "If-None-Match": etag})
+            assert revalida.status_code == 304, revalida.status_code
+
+        print(f"{'TOTAL':<40}{totales['antes']:>12,}{totales['gzip']:>12,}{totales['br']:>12,}")
+        print(f"ahorro br: {100 * (1 - totales['br'] / totales['antes']):.1f}%  "
+              f"(revalidación con ETag: 304 sin cuerpo)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Throughput de predecir_crecimiento: predict() fila por fila (como estaba en
+# el handler) contra PrediccionService con peticiones concurrentes agrupadas
+# en lotes, con y sin repeticiones que pega el memo.
+# Usa models/maleon_predictor.cbm si existe; si no, entrena un modelo sintético
+# con la misma forma de entrada [codigo, muni, v1, v2, v3].
+#
+#   python -m benchmarks.bench_prediccion
+import asyncio
+import os
+import random
+import time
+import catboost as cb
+
+from app.services.prediccion_service import PrediccionService
+
+MODELO = "models/maleon_predictor.cbm"
+PETICIONES = 2000
+CONCURRENCIA = 64
+MUNICIPIOS = ["Mérida", "Progreso", "Valladolid", "Tizimín", "Hocabá", "Motul", "Umán", "Kanasín"]
+CODIGOS = [str(c) for c in range(461110, 461190, 5)]
+
+
+def cargar_modelo(rng):
+    if os.path.exists(MODELO):
+        modelo = cb.CatBoostClassifier()
+        modelo.load_model(MODELO)
+        return modelo, "real"
+    filas = [fila_aleatoria(rng) for _ in range(2000)]
+    etiquetas = ["Alto" if f[2] * f[3] > 2500 else ("Medio" if f[4] > 50 else "Bajo") for f in filas]
+    modelo = cb.CatBoostClassifier(iterations=200, depth=6, verbose=False, cat_features=[0, 1], allow_writing_files=False)
+    modelo.fit(filas, etiquetas)
+    return modelo, "sintético"
+
+
+def fila_aleatoria(rng):
+    return [rng.choice(CODIGOS), rng.choice(MUNICIPIOS), rng.uniform(1, 100), rng.uniform(1, 100), rng.uniform(1, 100)]
+
+
+def fila_repetida(rng):
+    # El LLM tiende a inventar los mismos valores redondos
+    return [rng.choice(CODIGOS[:4]), rng.choice(MUNICIPIOS[:3]), rng.choice([10, 50, 100]), rng.choice([5, 20]), 30]
+
+
+def por_fila(modelo, filas):
+    t0 = time.perf_counter()
+    for f in filas:
+        modelo.predict(f)[0]
+    return len(filas) / (time.perf_counter() - t0)
+
+
+async def por_lotes(modelo, filas):
+    servicio = PrediccionService(modelo)
+    semaforo = asyncio.Semaphore(CONCURRENCIA)
+
+    async def una(f):
+        async with semaforo:
+            return await servicio.predecir(*f)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(una(f) for f in filas))
+    total = time.perf_counter() - t0
+    return len(filas) / total, servicio.stats
+
+
+def main():
+    rng = random.Random(3)
+    modelo, origen = cargar_modelo(rng)
+    print(f"modelo: {origen}  peticiones: {PETICIONES}  concurrencia: {CONCURRENCIA}")
+
+    unicas = [fila_aleatoria(rng) for _ in range(PETICIONES)]
+    repetidas = [fila_repetida(rng) for _ in range(PETICIONES)]
+
+    print(f"fila por fila:              {por_fila(modelo, unicas):>9.0f} pred/s")
+    rps, stats = asyncio.run(por_lotes(modelo, unicas))
+    print(f"por lotes (filas únicas):   {rps:>9.0f} pred/s  lotes={stats['lotes']} filas/lote={stats['filas'] / max(stats['lotes'], 1):.1f}")
+    rps, stats = asyncio.run(por_lotes(modelo, repetidas))
+    print(f"por lotes + memo (repetidas): {rps:>7.0f} pred/s  lotes={stats['lotes']} memo={stats['memo']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Throughput de Whisper en CPU para planear capacidad de /transcribe:
+#  - "por llamada": load_model + transcribe en cada audio (sin motor residente)
+#  - TranscripcionService con 1, 2, 4... trabajadores residentes, todos los
+#    audios a la vez: segundos de audio por segundo de pared y latencia p50/p95
+# Sin carpeta usa prueba_maleon.mp3 repetido. Necesita openai-whisper y ffmpeg.
+#
+#   python -m benchmarks.bench_transcripcion
+#   python -m benchmarks.bench_transcripcion grabaciones/ --modelo base --trabajadores 1 2 4 8
+import argparse
+import os
+import statistics
+import time
+
+from app.services.transcripcion_service import TranscripcionService, buscar_audios
+
+MUESTRA = "prueba_maleon.mp3"
+
+
+def por_llamada(rutas, modelo, idioma):
+    import whisper
+    tiempos = []
+    for ruta in rutas:
+        t0 = time.perf_counter()
+        m = whisper.load_model(modelo, device="cpu")
+        m.transcribe(ruta, language=idioma, fp16=False)
+        tiempos.append(time.perf_counter() - t0)
+    return tiempos
+
+
+def residente(rutas, modelo, trabajadores, idioma):
+    servicio = TranscripcionService(modelo=modelo, trabajadores=trabajadores, idioma=idioma)
+    t0 = time.perf_counter()
+    servicio.precalentar()
+    carga = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    latencias = []
+    for _, resultado, error in servicio.transcribir_lote(rutas):
+        if error:
+            print(f"  error: {error}")
+        else:
+            latencias.append(resultado["segundos"])
+    pared = time.perf_counter() - t0
+    r = servicio.resumen()
+    servicio.cerrar()
+    return carga, pared, r["segundos_audio"], latencias
+
+
+def p95(valores):
+    return sorted(valores)[max(0, int(len(valores) * 0.95) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("carpeta", nargs="?", default=None)
+    parser.add_argument("--modelo", default="small")
+    parser.add_argument("--idioma", default="es")
+    parser.add_argument("--trabajadores", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repetir", type=int, default=16, help="Copias de la muestra si no hay carpeta")
+    args = parser.parse_args()
+
+    rutas = buscar_audios(args.carpeta) if args.carpeta else [MUESTRA] * args.repetir
+    print(f"{len(rutas)} audios, modelo '{args.modelo}', {os.cpu_count()} núcleos\n")
+
+    tiempos = por_llamada(rutas[:3], args.modelo, args.idioma)
+    print(f"{'por llamada':<16} {statistics.median(tiempos):6.2f} s por audio (carga + transcripción)")
+
+    for n in args.trabajadores:
+        carga, pared, audio, latencias = residente(rutas, args.modelo, n, args.idioma)
+        print(f"{str(n) + ' residentes':<16} {statistics.median(latencias):6.2f} s p50  {p95(latencias):6.2f} s p95 | "
+              f"{audio / pared:5.1f} s de audio por segundo | {len(latencias) / pared * 60:6.1f} audios/min | "
+              f"carga inicial {carga:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
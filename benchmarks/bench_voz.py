@@ -0,0 +1,225 @@
+# Latencia por turno del asistente de voz local: el bucle serial de antes
+# (calibrar 1 s -> escuchar -> reconocer -> pensar -> runAndWait -> sleep 0.3)
+# contra el pipeline de voice_assistant.py (captura, reconocimiento y voz en
+# hilos, barge-in). Micrófono, speech-to-text, agente y pyttsx3 son falsos con
+# tiempos fijos; un "usuario" simulado contesta al terminar Maleón y cada
+# tercer turno le habla encima. Todo corre en tiempo real multiplicado por
+# --escala; los números se reportan en segundos reales de conversación.
+#
+#   python -m benchmarks.bench_voz
+#   python -m benchmarks.bench_voz --turnos 12 --llm 2.0 --escala 0.1
+import argparse
+import statistics
+import threading
+import time
+
+from voice_assistant import AsistenteVoz, Hablante, texto_de_respuesta, texto_para_hablar
+
+RESPUESTA = ("¡Mare nené! En el IMET trabajamos para que Yucatán crezca con tecnología, "
+             "y con gusto le cuento cómo le podemos ayudar en su municipio ne’.")
+
+
+class Escena:
+
+    # Reloj compartido entre el usuario simulado y el motor de voz falso
+    def __init__(self, args):
+        self.args = args
+        self.e = args.escala
+        self.cambio = threading.Condition()
+        self.habla_inicios = []
+        self.habla_fines = []
+        self.usuario_quiere = []     # cuándo el usuario quiso empezar a hablar
+        self.usuario_empieza = []    # cuándo pudo (micrófono listo)
+        self.usuario_termina = []    # fin de su voz, antes de la pausa que cierra la frase
+        self.cortes = []             # inicio de voz encima de Maleón -> Maleón se calla
+
+    def dormir(self, segundos):
+        time.sleep(segundos * self.e)
+
+    def ahora(self):
+        return time.perf_counter() / self.e
+
+    def anotar(self, lista, valor=None):
+        with self.cambio:
+            lista.append(self.ahora() if valor is None else valor)
+            self.cambio.notify_all()
+
+    def esperar(self, condicion):
+        with self.cambio:
+            self.cambio.wait_for(condicion)
+
+    def interrumpe(self, turno):
+        return turno > 0 and turno % 3 == 2
+
+    def cuando_quiere_hablar(self, turno):
+        # Turno normal: contesta al terminar Maleón; si interrumpe, a 1.5 s de que empezó
+        if turno == 0:
+            return self.ahora()
+        if self.interrumpe(turno):
+            self.esperar(lambda: len(self.habla_inicios) >= turno)
+            return self.habla_inicios[turno - 1] + 1.5
+        self.esperar(lambda: len(self.habla_fines) >= turno)
+        return self.habla_fines[turno - 1] + self.args.reaccion
+
+
+class MotorFalso:
+
+    # Lo que usa Hablante de pyttsx3 (loop externo) más runAndWait para el bucle serial
+    def __init__(self, escena):
+        self.escena = escena
+        self.callbacks = []
+        self.fin_previsto = None
+
+    def duracion(self, texto):
+        return len(texto.split()) / 2.5  # 150 palabras por minuto
+
+    def connect(self, evento, cb):
+        self.callbacks.append(cb)
+
+    def startLoop(self, usar_driver=True):
+        pass
+
+    def endLoop(self):
+        pass
+
+    def say(self, texto):
+        self.escena.anotar(self.escena.habla_inicios)
+        self.fin_previsto = self.escena.ahora() + self.duracion(texto)
+
+    def _terminar(self, completo):
+        self.fin_previsto = None
+        self.escena.anotar(self.escena.habla_fines)
+        for cb in self.callbacks:
+            cb("frase", completo)
+
+    def iterate(self):
+        if self.fin_previsto is not None and self.escena.ahora() >= self.fin_previsto:
+            self._terminar(True)
+
+    def stop(self):
+        if self.fin_previsto is not None:
+            self._terminar(False)
+
+    def runAndWait(self):
+        if self.fin_previsto is not None:
+            time.sleep(max(0.0, self.fin_previsto - self.escena.ahora()) * self.escena.e)
+            self._terminar(True)
+
+
+class BotFalso:
+
+    def __init__(self, escena):
+        self.escena = escena
+        self.turno = 0
+
+    def handle(self, texto):
+        self.escena.dormir(self.escena.args.llm)
+        self.turno += 1
+        if self.turno % 4 == 0:
+            return {"type": "function_call", "name": "consultar_seguridad", "args": {"muni": "Progreso"}}
+        return RESPUESTA
+
+
+class TranscriptorFalso:
+
+    def __init__(self, escena, turnos):
+        self.escena = escena
+        self.turnos = turnos
+        self.turno = 0
+
+    def _frase(self, quiere, al_detectar_voz=None):
+        # El usuario habla "frase" segundos; la frase se da por terminada tras "pausa" de silencio
+        e, args = self.escena, self.escena.args
+        espera = quiere - e.ahora()
+        if espera > 0:
+            e.dormir(espera)
+        e.anotar(e.usuario_quiere, quiere)
+        e.anotar(e.usuario_empieza)
+        e.dormir(0.3)  # phrase_threshold: hasta aquí se sabe que es voz
+        if al_detectar_voz:
+            antes = len(e.habla_fines)
+            inicio = e.ahora()
+            al_detectar_voz()
+            if e.interrumpe(self.turno):
+                e.esperar(lambda: len(e.habla_fines) > antes)
+                e.cortes.append(e.habla_fines[-1] - inicio + 0.3)
+        e.dormir(args.frase - 0.3)
+        e.anotar(e.usuario_termina)
+        e.dormir(args.pausa)
+        self.turno += 1
+        return f"pregunta {self.turno}"
+
+    def reconocer(self, audio, lenguaje="es-ES"):
+        self.escena.dormir(self.escena.args.stt)
+        return {"success": True, "text": audio, "method": "falso"}
+
+    # Bucle serial: calibra cada vez y solo escucha cuando le toca
+    def transcribir_desde_micrófono(self, lenguaje="es-ES"):
+        self.escena.dormir(1.0)  # adjust_for_ambient_noise(duration=1)
+        quiere = self.escena.cuando_quiere_hablar(self.turno)
+        audio = self._frase(max(quiere, self.escena.ahora()))
+        self.escena.usuario_quiere[-1] = quiere
+        return self.reconocer(audio, lenguaje)
+
+    # Pipeline: micrófono siempre abierto
+    def escuchar_continuo(self, al_detectar_voz=None, hablando=None, detener=None):
+        self.escena.dormir(1.0)  # calibración inicial, una sola vez
+        while self.turno < self.turnos and not (detener and detener.is_set()):
+            quiere = self.escena.cuando_quiere_hablar(self.turno)
+            yield self._frase(quiere, al_detectar_voz)
+        # Se despide cuando Maleón acabó de contestar la última
+        self.escena.esperar(lambda: len(self.escena.habla_fines) >= self.turnos)
+        yield "salir"
+
+
+def serial(escena, turnos):
+    # Mismo orden que el voice_assistant.py original
+    transcriptor = TranscriptorFalso(escena, turnos)
+    bot = BotFalso(escena)
+    engine = MotorFalso(escena)
+    for _ in range(turnos):
+        r = transcriptor.transcribir_desde_micrófono("es-ES")
+        respuesta = texto_de_respuesta(bot.handle(r["text"]))
+        engine.say(texto_para_hablar(respuesta))
+        engine.runAndWait()
+        escena.dormir(0.3)
+
+
+def pipeline(escena, turnos):
+    transcriptor = TranscriptorFalso(escena, turnos)
+    hablante = Hablante(lambda: MotorFalso(escena))
+    asistente = AsistenteVoz(transcriptor, BotFalso(escena), hablante)
+    asistente.correr()
+
+
+def resumen(nombre, escena, duracion):
+    n = min(len(escena.usuario_termina), len(escena.habla_inicios))
+    latencias = [escena.habla_inicios[i] - escena.usuario_termina[i] for i in range(n)]
+    esperas = [max(0.0, b - a) for a, b in zip(escena.usuario_quiere, escena.usuario_empieza)]
+    cortes = f"{statistics.median(escena.cortes):.2f} s" if escena.cortes else "no se puede"
+    print(f"{nombre:<10} respuesta p50 {statistics.median(latencias):5.2f} s  máx {max(latencias):5.2f} s | "
+          f"espera para hablar p50 {statistics.median(esperas):5.2f} s  máx {max(esperas):5.2f} s | "
+          f"cortar a Maleón {cortes} | conversación {duracion:6.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turnos", type=int, default=9)
+    parser.add_argument("--escala", type=float, default=0.2)
+    parser.add_argument("--frase", type=float, default=2.0, help="Duración de cada frase del usuario (s)")
+    parser.add_argument("--pausa", type=float, default=1.0, help="Silencio que cierra una frase (pause_threshold)")
+    parser.add_argument("--stt", type=float, default=0.6, help="Latencia del speech-to-text (s)")
+    parser.add_argument("--llm", type=float, default=1.2, help="Latencia del agente (s)")
+    parser.add_argument("--reaccion", type=float, default=0.4, help="Cuánto tarda el usuario en contestar (s)")
+    args = parser.parse_args()
+
+    print(f"{args.turnos} turnos, frase {args.frase} s, stt {args.stt} s, agente {args.llm} s, escala {args.escala}\n")
+    for nombre, fn in [("serial", serial), ("pipeline", pipeline)]:
+        escena = Escena(args)
+        t0 = escena.ahora()
+        fn(escena, args.turnos)
+        resumen(nombre, escena, escena.ahora() - t0)
+
+
+if __name__ == "__main__":
+    main()
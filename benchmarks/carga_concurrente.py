@@ -0,0 +1,57 @@
+# Prueba de carga de /chat: N sesiones concurrentes mandando preguntas que el
+# cache no contesta ("hoy" está en BLACKLIST; un folio distinto no basta, la
+# búsqueda difusa las junta). Si el handler bloquea el event loop, el tiempo
+# total se acerca a la suma de latencias; si no, se acerca a la más lenta.
+#
+#   python -m benchmarks.carga_concurrente --url http://localhost:9000 --sesiones 20 --turnos 3
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+import httpx
+
+
+async def sesion(cliente, url, turnos, latencias):
+    sid = str(uuid.uuid4())
+    for i in range(turnos):
+        texto = f"oye maleón, ¿qué me cuentas hoy? folio {uuid.uuid4().hex[:8]} número {i}"
+        t0 = time.perf_counter()
+        r = await cliente.post(f"{url}/chat", json={"text": texto, "session_id": sid})
+        r.raise_for_status()
+        latencias.append(time.perf_counter() - t0)
+
+
+async def correr(url, sesiones, turnos, timeout):
+    latencias = []
+    async with httpx.AsyncClient(timeout=timeout) as cliente:
+        # Una petición sola: lo que tarda sin nadie más (y de paso calienta)
+        sola = []
+        await sesion(cliente, url, 1, sola)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(sesion(cliente, url, turnos, latencias) for _ in range(sesiones)))
+        total = time.perf_counter() - t0
+
+    latencias.sort()
+    print(f"peticiones: {len(latencias)}  sesiones concurrentes: {sesiones}")
+    print(f"tiempo total: {total:.2f}s  throughput: {len(latencias) / total:.2f} req/s")
+    print(f"latencia p50: {statistics.median(latencias):.2f}s  p95: {latencias[int(len(latencias) * 0.95) - 1]:.2f}s")
+    # La suma de latencias no sirve: en serie cada una incluye la cola. Se
+    # compara contra lo que tardarían todas una tras otra.
+    # ~1.0 = todo en serie; ~sesiones = las sesiones avanzan en paralelo
+    print(f"petición sola: {sola[0]:.2f}s")
+    print(f"paralelismo efectivo (peticiones x petición sola / total): {len(latencias) * sola[0] / total:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:9000")
+    parser.add_argument("--sesiones", type=int, default=20)
+    parser.add_argument("--turnos", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+    asyncio.run(correr(args.url, args.sesiones, args.turnos, args.timeout))
+
+
+if __name__ == "__main__":
+    main()
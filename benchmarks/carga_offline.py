@@ -0,0 +1,237 @@
+# Prueba de carga de /chat sin red: levanta la app en proceso con Vertex y TTS
+# falsos (app/services/falsos.py), datos y modelo de crecimiento sintéticos, y
+# la maneja con httpx.ASGITransport. Muchas sesiones concurrentes mezclan
+# preguntas frecuentes (cache), herramientas (CatBoost / CSV), reportes PDF y
+# charla única. Reporta p50/p95/p99 por tipo, throughput y razón de aciertos
+# del cache; con --max-p95 sale con código 1 si hay regresión.
+#
+#   python -m benchmarks.carga_offline --sesiones 50 --turnos 6
+#   python -m benchmarks.carga_offline --latencia-llm 800 --latencia-tts 300 --fallos 0.02 --max-p95 3
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+MUNICIPIOS = ["Mérida", "Progreso", "Valladolid", "Tizimín", "Motul", "Umán", "Kanasín", "Ticul", "Izamal", "Tekax"]
+
+FRECUENTES = [
+    "qué es el imet y a qué se dedica",
+    "quién eres tú maleón",
+    "qué servicios ofrece techmaleon a los municipios",
+    "cómo puedo colaborar con ustedes en un proyecto",
+    "dónde están sus oficinas en yucatán",
+    "qué es el renacimiento maya del que hablan",
+    "cuáles son los programas de capacitación disponibles",
+    "quiénes forman parte del equipo del instituto"
+]
+
+
+def pregunta(tipo, rng):
+    muni = rng.choice(MUNICIPIOS)
+    unico = uuid.uuid4().hex[:6]
+    if tipo == "frecuente":
+        return rng.choice(FRECUENTES)
+    if tipo == "herramienta":
+        return rng.choice([
+            f"quiero poner un negocio de abarrotes en {muni} folio {unico}",
+            f"cómo anda la seguridad en {muni} folio {unico}",
+            f"qué tal están los servicios en {muni} folio {unico}"
+        ])
+    if tipo == "reporte":
+        return f"hazme un reporte de seguridad para {muni} folio {unico}"
+    return f"platícame algo bonito de {muni}, código {unico}"
+
+
+def datos_sinteticos(directorio, rng):
+    # CSV con las columnas que lee InteligenciaService y un CatBoost chico
+    import pandas as pd
+    import catboost as cb
+
+    servicios = pd.DataFrame({
+        "NOM_MUN": MUNICIPIOS,
+        "CATEGORIA": [rng.choice(["Alta prioridad", "Media", "Baja"]) for _ in MUNICIPIOS],
+        "INDICE_DESABASTO": [round(rng.uniform(0, 10), 2) for _ in MUNICIPIOS]
+    })
+    seguridad = pd.DataFrame({
+        "NOM_MUN": MUNICIPIOS,
+        "CATEGORIA_SEGURIDAD": [rng.choice(["Riesgo alto", "Riesgo medio", "Riesgo bajo"]) for _ in MUNICIPIOS],
+        "NEGOCIOS_AISLADOS": [rng.randint(0, 300) for _ in MUNICIPIOS]
+    })
+    rutas = {
+        "RUTA_SERVICIOS": os.path.join(directorio, "servicios.csv"),
+        "RUTA_SEGURIDAD": os.path.join(directorio, "seguridad.csv"),
+        "MODELO_CRECIMIENTO": os.path.join(directorio, "crecimiento.cbm")
+    }
+    servicios.to_csv(rutas["RUTA_SERVICIOS"], index=False, encoding="latin-1")
+    seguridad.to_csv(rutas["RUTA_SEGURIDAD"], index=False)
+
+    filas = [[rng.choice(["461110", "461121", "461130"]), rng.choice(MUNICIPIOS),
+              rng.uniform(1, 100), rng.uniform(1, 100), rng.uniform(1, 100)] for _ in range(500)]
+    etiquetas = ["Alto" if f[2] * f[3] > 2500 else ("Medio" if f[4] > 50 else "Bajo") for f in filas]
+    modelo = cb.CatBoostClassifier(iterations=50, depth=4, verbose=False, cat_features=[0, 1], allow_writing_files=False)
+    modelo.fit(filas, etiquetas)
+    modelo.save_model(rutas["MODELO_CRECIMIENTO"])
+    return rutas
+
+
+def configurar_entorno(args, directorio):
+    # Antes de importar la app: config.py lee todo del entorno al importarse
+    rng = random.Random(args.semilla)
+    os.environ.update(datos_sinteticos(directorio, rng))
+    os.environ.update({
+        "MALEON_OFFLINE": "1",
+        "GCP_PROJECT_ID": os.environ.get("GCP_PROJECT_ID", "maleon-offline"),
+        "FALSO_LATENCIA_LLM_MS": str(args.latencia_llm),
+        "FALSO_LATENCIA_TTS_MS": str(args.latencia_tts),
+        "FALSO_LATENCIA_REPORTE_MS": str(args.latencia_reporte),
+        "FALSO_TASA_FALLOS": str(args.fallos),
+        "CACHE_FILE": os.path.join(directorio, "cache.json"),
+        "CACHE_JOURNAL_FILE": os.path.join(directorio, "cache.journal"),
+        "AUDIO_DIR": os.path.join(directorio, "audio")
+    })
+
+
+async def esperar_reporte(cliente, job_id, latencias):
+    t0 = time.perf_counter()
+    while True:
+        r = await cliente.get(f"/reports/{job_id}")
+        if r.status_code != 200 or r.json()["estado"] in ("listo", "error"):
+            latencias["reporte_pdf"].append(time.perf_counter() - t0)
+            return
+        await asyncio.sleep(0.2)
+
+
+async def sesion(cliente, args, mezcla, rng, latencias, errores, reportes):
+    sid = str(uuid.uuid4())
+    tipos, pesos = zip(*mezcla.items())
+    for _ in range(args.turnos):
+        tipo = rng.choices(tipos, pesos)[0]
+        t0 = time.perf_counter()
+        try:
+            r = await cliente.post("/chat", json={"text": pregunta(tipo, rng), "session_id": sid})
+        except Exception as e:
+            errores[type(e).__name__] += 1
+            continue
+        dt = time.perf_counter() - t0
+        if r.status_code != 200:
+            errores[f"http_{r.status_code}"] += 1
+            continue
+        latencias[tipo].append(dt)
+        job_id = r.json().get("report_id")
+        if job_id:
+            reportes.append(asyncio.create_task(esperar_reporte(cliente, job_id, latencias)))
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+async def correr(args, mezcla):
+    import httpx
+    from app.main import app
+    from app.routers.chat import cache_service
+    from app.services.arranque import arranque
+
+    rng = random.Random(args.semilla)
+    latencias = defaultdict(list)
+    errores = defaultdict(int)
+    reportes = []
+    # ASGITransport no corre el lifespan: se calienta aquí, igual que uvicorn antes de medir
+    await arranque.iniciar(esperar=True)
+    transporte = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://maleon", timeout=args.timeout) as cliente:
+        antes = cache_service.resumen()
+        t0 = time.perf_counter()
+        semaforo = asyncio.Semaphore(args.concurrencia)
+
+        async def limitada(i):
+            async with semaforo:
+                await sesion(cliente, args, mezcla, random.Random(rng.random()), latencias, errores, reportes)
+
+        await asyncio.gather(*(limitada(i) for i in range(args.sesiones)))
+        total = time.perf_counter() - t0
+        await asyncio.gather(*reportes)
+        despues = cache_service.resumen()
+
+    chat = [x for tipo, v in latencias.items() if tipo != "reporte_pdf" for x in v]
+    resultado = {
+        "peticiones": len(chat),
+        "errores": dict(errores),
+        "tiempo_total_s": round(total, 2),
+        "throughput_rps": round(len(chat) / total, 2),
+        "cache_hits": despues["hits_servibles"] - antes["hits_servibles"],
+        "por_tipo": {}
+    }
+    resultado["cache_hit_ratio"] = round(resultado["cache_hits"] / max(1, len(chat)), 3)
+    for tipo, valores in sorted(latencias.items()):
+        resultado["por_tipo"][tipo] = {
+            "n": len(valores),
+            "p50": round(statistics.median(valores), 3),
+            "p95": round(percentil(valores, 95), 3),
+            "p99": round(percentil(valores, 99), 3)
+        }
+    if chat:
+        resultado["p50"] = round(statistics.median(chat), 3)
+        resultado["p95"] = round(percentil(chat, 95), 3)
+        resultado["p99"] = round(percentil(chat, 99), 3)
+    return resultado
+
+
+def imprimir(r):
+    print(f"peticiones: {r['peticiones']}  errores: {r['errores'] or 0}")
+    print(f"tiempo total: {r['tiempo_total_s']}s  throughput: {r['throughput_rps']} req/s")
+    print(f"cache: {r['cache_hits']} respuestas servidas del cache ({100 * r['cache_hit_ratio']:.1f}%)")
+    if "p50" in r:
+        print(f"/chat global  p50 {r['p50']:.3f}s  p95 {r['p95']:.3f}s  p99 {r['p99']:.3f}s")
+    for tipo, d in r["por_tipo"].items():
+        print(f"  {tipo:<12} n={d['n']:<5} p50 {d['p50']:.3f}s  p95 {d['p95']:.3f}s  p99 {d['p99']:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sesiones", type=int, default=50)
+    parser.add_argument("--turnos", type=int, default=6)
+    parser.add_argument("--concurrencia", type=int, default=50, help="sesiones activas a la vez")
+    parser.add_argument("--mezcla", default="frecuente=0.4,herramienta=0.3,reporte=0.05,charla=0.25")
+    parser.add_argument("--latencia-llm", type=float, default=800, help="ms")
+    parser.add_argument("--latencia-tts", type=float, default=300, help="ms")
+    parser.add_argument("--latencia-reporte", type=float, default=3000, help="ms")
+    parser.add_argument("--fallos", type=float, default=0.0, help="probabilidad de fallo por llamada remota")
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", action="store_true", help="imprime el resultado como JSON")
+    parser.add_argument("--max-p95", type=float, default=None, help="falla (código 1) si el p95 global lo supera, en s")
+    args = parser.parse_args()
+    mezcla = {k: float(v) for k, v in (p.split("=") for p in args.mezcla.split(","))}
+
+    with tempfile.TemporaryDirectory(prefix="maleon-carga-") as directorio:
+        configurar_entorno(args, directorio)
+        inicio = time.time()
+        try:
+            resultado = asyncio.run(correr(args, mezcla))
+        finally:
+            # Los PDFs falsos caen en static/reportes/: se borran los de esta corrida
+            for ruta in glob.glob("static/reportes/reporte_*.pdf"):
+                if os.path.getmtime(ruta) >= inicio:
+                    os.remove(ruta)
+
+    if args.json:
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    else:
+        imprimir(resultado)
+    if args.max_p95 is not None and resultado.get("p95", 0) > args.max_p95:
+        print(f"REGRESIÓN: p95 {resultado['p95']}s > {args.max_p95}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
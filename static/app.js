@@ -57,10 +57,17 @@ function removeTypingIndicator() {
 }
 
 // --- RECONOCIMIENTO DE VOZ (STT) ---
-const recognition = new (window.SpeechRecognition || window.webkitSpeechRecognition)();
-recognition.lang = 'es-MX';
-recognition.continuous = true;
-recognition.interimResults = true;
+// Sin Web Speech API (Firefox) o con ?stt=whisper se graba el micrófono y se
+// transcribe en el servidor con Whisper local (POST /transcribe)
+const SpeechRec = window.SpeechRecognition || window.webkitSpeechRecognition;
+const sttServidor = !SpeechRec || new URLSearchParams(location.search).get('stt') === 'whisper';
+const recognition = sttServidor ? null : new SpeechRec();
+if (recognition) {
+    recognition.lang = 'es-MX';
+    recognition.continuous = true;
+    recognition.interimResults = true;
+}
+let grabadora = null;
 
 let isListening = false;
 let finalTranscript = '';
@@ -84,22 +91,50 @@ const mouthMap = {
     'n': 'N_D', 'd': 'N_D', 'l': 'N_D', 't': 'N_D', 's': 'N_D', 'r': 'N_D'
 };
 
+let bocaActual = 'neutral';
+
+function ponerBoca(boca) {
+    // Solo se toca el <img> cuando cambia la boca
+    if (boca === bocaActual) return;
+    bocaActual = boca;
+    mouth.src = `/avatar/mouth_${boca}.png`;
+}
+
 // --- ANIMACIÓN SINCRONIZADA CON AUDIO REAL ---
-function animarBocaSincronizada(texto, audio) {
-    let currentLetter = 0;
-    const interval = setInterval(() => {
+// El servidor deja junto a cada MP3 un {hash}.visemas.json con cuadros
+// [segundo, boca]; en cada cuadro de pantalla se pone la que toca según
+// audio.currentTime, así la boca no se adelanta ni se atrasa a la voz.
+async function cargarVisemas(audioUrl) {
+    try {
+        const response = await fetch(audioUrl.replace(/\.mp3$/, '.visemas.json'));
+        if (!response.ok) return null;
+        return (await response.json()).cuadros;
+    } catch (e) {
+        return null;
+    }
+}
+
+function visemasEstimados(texto, duracion) {
+    // Sin línea de tiempo: las letras repartidas parejo a lo largo del audio
+    const letras = [...texto.toLowerCase()];
+    const paso = (duracion || letras.length * 0.075) / Math.max(1, letras.length);
+    return letras.map((letra, i) => [i * paso, mouthMap[letra] || 'neutral']);
+}
+
+function animarBocaSincronizada(cuadros, audio) {
+    let i = 0;
+    const cuadro = () => {
         if (!audio || audio.paused || audio.ended) {
-            mouth.src = "/avatar/mouth_neutral.png";
-            clearInterval(interval);
+            ponerBoca('neutral');
             return;
         }
-
-        const char = texto[currentLetter]?.toLowerCase();
-        const mouthSuffix = mouthMap[char] || 'neutral';
-        mouth.src = `/avatar/mouth_${mouthSuffix}.png`;
-
-        currentLetter = (currentLetter + 1) % texto.length;
-    }, 75);
+        const t = audio.currentTime;
+        if (i > 0 && cuadros[i][0] > t) i = 0; // Se regresó el audio
+        while (i + 1 < cuadros.length && cuadros[i + 1][0] <= t) i++;
+        ponerBoca(cuadros.length && cuadros[i][0] <= t ? cuadros[i][1] : 'neutral');
+        requestAnimationFrame(cuadro);
+    };
+    requestAnimationFrame(cuadro);
 }
 
 // --- MANEJO DEL BOTÓN ---
@@ -108,8 +143,9 @@ btn.onclick = () => {
     if (currentAudio) {
         currentAudio.pause();
         currentAudio = null;
-        mouth.src = "/avatar/mouth_neutral.png";
+        ponerBoca('neutral');
     }
+    reiniciarColaAudio();
 
     // Si hay una petición al backend pendiente, la cancelamos
     if (abortController) {
@@ -120,7 +156,8 @@ btn.onclick = () => {
     if (!isListening) {
         finalTranscript = '';
         try {
-            recognition.start();
+            if (sttServidor) iniciarGrabacion().catch(e => console.error("Error al abrir el micrófono:", e));
+            else recognition.start();
             isListening = true;
             avatarContainer.classList.add('listening'); // Efecto visual
             btn.innerText = 'PULSAR PARA DETENER 🟥';
@@ -128,14 +165,65 @@ btn.onclick = () => {
             console.error("Error al iniciar reconocimiento:", e);
         }
     } else {
-        recognition.stop();
+        if (sttServidor) detenerGrabacion();
+        else recognition.stop();
         isListening = false;
         avatarContainer.classList.remove('listening'); // Quitar efecto visual
         btn.innerText = 'PULSAR PARA HABLAR';
     }
 };
 
-recognition.onresult = (event) => {
+function enviarTranscripcion(texto) {
+    // Agregar al historial visual (ya fijo)
+    addMessageToHistory(texto, 'user');
+
+    // Obtenemos la hora actual del usuario
+    const ahora = new Date();
+    const horaStr = ahora.toLocaleTimeString('es-MX', { hour: '2-digit', minute: '2-digit' });
+
+    enviarAlBackend(texto, horaStr);
+}
+
+// --- STT EN EL SERVIDOR (Whisper) ---
+async function iniciarGrabacion() {
+    const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+    if (!isListening) {
+        // Se detuvo antes de que el navegador diera permiso del micrófono
+        stream.getTracks().forEach(t => t.stop());
+        return;
+    }
+    const partes = [];
+    const rec = new MediaRecorder(stream);
+    grabadora = rec;
+    rec.ondataavailable = (e) => { if (e.data.size) partes.push(e.data); };
+    rec.onstop = async () => {
+        stream.getTracks().forEach(t => t.stop());
+        avatarContainer.classList.remove('listening');
+        if (!partes.length) return;
+        const tipo = rec.mimeType || 'audio/webm';
+        const formulario = new FormData();
+        formulario.append('audio', new Blob(partes, { type: tipo }), 'voz.' + (tipo.includes('mp4') ? 'm4a' : tipo.includes('ogg') ? 'ogg' : 'webm'));
+        showInterimUserMessage('…');
+        try {
+            const response = await fetch('/transcribe', { method: 'POST', body: formulario });
+            if (!response.ok) throw new Error(`Error del servidor: ${response.status}`);
+            const resultado = await response.json();
+            removeInterimUserMessage();
+            if (resultado.text && resultado.text.trim() !== '') enviarTranscripcion(resultado.text.trim());
+        } catch (e) {
+            removeInterimUserMessage();
+            console.error("Error transcribiendo:", e);
+        }
+    };
+    rec.start();
+}
+
+function detenerGrabacion() {
+    if (grabadora && grabadora.state !== 'inactive') grabadora.stop();
+    grabadora = null;
+}
+
+if (recognition) recognition.onresult = (event) => {
     let interimTranscript = '';
     for (let i = event.resultIndex; i < event.results.length; ++i) {
         if (event.results[i].isFinal) {
@@ -150,7 +238,7 @@ recognition.onresult = (event) => {
     }
 };
 
-recognition.onend = () => {
+if (recognition) recognition.onend = () => {
     avatarContainer.classList.remove('listening'); // Por seguridad
     
     // Quitamos la burbuja temporal
@@ -159,18 +247,99 @@ recognition.onend = () => {
     if (!isListening && finalTranscript.trim() !== '') {
         const textoAEnviar = finalTranscript;
         finalTranscript = ''; // Limpiamos inmediatamente para evitar reenvíos
-        
-        // Agregar al historial visual (ya fijo)
-        addMessageToHistory(textoAEnviar, 'user');
-
-        // Obtenemos la hora actual del usuario
-        const ahora = new Date();
-        const horaStr = ahora.toLocaleTimeString('es-MX', { hour: '2-digit', minute: '2-digit' });
-        
-        enviarAlBackend(textoAEnviar, horaStr);
+        enviarTranscripcion(textoAEnviar);
     }
 };
 
+// --- COLA DE AUDIO POR ORACIONES ---
+// El backend manda cada oración en cuanto se sintetiza (puede llegar en
+// desorden); aquí se reproducen en orden, una tras otra.
+let colaAudio = { segmentos: [], siguiente: 0, total: null };
+
+function reiniciarColaAudio() {
+    colaAudio = { segmentos: [], siguiente: 0, total: null };
+}
+
+function reproducirSiguienteSegmento() {
+    if (currentAudio) return; // Ya hay uno sonando; onended nos vuelve a llamar
+
+    const segmento = colaAudio.segmentos[colaAudio.siguiente];
+    if (!segmento) return; // Aún no llega el que sigue
+
+    colaAudio.siguiente += 1;
+    const textoLimpio = segmento.texto.replace(/[^\wáéíóúñ\s]/gi, '');
+    const audio = new Audio();
+    currentAudio = audio;
+    // Se pide mientras carga el MP3
+    const visemas = cargarVisemas(segmento.audio_url);
+
+    audio.oncanplaythrough = () => {
+        audio.play().catch(e => console.error("Error al reproducir:", e));
+    };
+
+    audio.onplay = () => {
+        visemas.then(cuadros => animarBocaSincronizada(cuadros || visemasEstimados(textoLimpio, audio.duration), audio));
+    };
+
+    audio.onerror = (e) => {
+        console.error("Error cargando audio:", e);
+        if (currentAudio === audio) currentAudio = null;
+        reproducirSiguienteSegmento();
+    };
+
+    audio.onended = () => {
+        ponerBoca('neutral');
+        if (currentAudio === audio) currentAudio = null;
+        reproducirSiguienteSegmento();
+    };
+
+    audio.src = segmento.audio_url; // Dispara la carga
+}
+
+// --- REPORTES EN SEGUNDO PLANO ---
+// El backend responde al instante con un id; aquí preguntamos cada rato
+// hasta que el PDF esté listo y entonces mostramos el enlace.
+function esperarReporte(reportId, intento = 0) {
+    const MAX_INTENTOS = 150; // ~5 minutos
+    setTimeout(async () => {
+        try {
+            const response = await fetch(`/reports/${reportId}`);
+            if (response.status === 404) return;
+            const trabajo = await response.json();
+            if (trabajo.estado === 'listo' || trabajo.estado === 'error') {
+                addMessageToHistory(trabajo.reply, 'bot');
+                return;
+            }
+        } catch (e) {
+            console.error("Error consultando reporte:", e);
+        }
+        if (intento < MAX_INTENTOS) esperarReporte(reportId, intento + 1);
+    }, 2000);
+}
+
+function procesarEventoSSE(bloque) {
+    let evento = 'message';
+    let datos = '';
+    for (const linea of bloque.split('\n')) {
+        if (linea.startsWith('event:')) evento = linea.slice(6).trim();
+        else if (linea.startsWith('data:')) datos += linea.slice(5).trim();
+    }
+    if (!datos) return;
+    const data = JSON.parse(datos);
+
+    if (evento === 'texto') {
+        // Quitamos el indicador de escritura y mostramos el texto de inmediato
+        removeTypingIndicator();
+        if (!data.reply) throw new Error("Respuesta del servidor incompleta");
+        addMessageToHistory(data.reply, 'bot');
+        if (data.report_id) esperarReporte(data.report_id);
+    } else if (evento === 'audio') {
+        colaAudio.total = data.total;
+        colaAudio.segmentos[data.indice] = data;
+        reproducirSiguienteSegmento();
+    }
+}
+
 // --- ENVÍO AL BACKEND Y REPRODUCCIÓN DE AUDIO ---
 async function enviarAlBackend(texto, hora = null) {
     
@@ -180,6 +349,13 @@ async function enviarAlBackend(texto, hora = null) {
     // Creamos un nuevo controlador para esta petición
     abortController = new AbortController();
 
+    // Detenemos cualquier audio previo por si acaso
+    if (currentAudio) {
+        currentAudio.pause();
+        currentAudio = null;
+    }
+    reiniciarColaAudio();
+
     try {
         const bodyData = {
             text: texto,
@@ -188,53 +364,32 @@ async function enviarAlBackend(texto, hora = null) {
 
         if (hora) bodyData.time = hora;
 
-        const response = await fetch('/chat', {
+        const response = await fetch('/chat/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(bodyData),
             signal: abortController.signal
         });
 
-        const data = await response.json();
-        abortController = null; // Petición terminada con éxito
-
-        // Quitamos el indicador de escritura
-        removeTypingIndicator();
-
-        if (!data || !data.reply) {
-            throw new Error("Respuesta del servidor incompleta");
+        if (!response.ok || !response.body) {
+            throw new Error(`Error del servidor: ${response.status}`);
         }
 
-        // Agregar al historial visual
-        addMessageToHistory(data.reply, 'bot');
-
-        const textoLimpio = data.reply.replace(/[^\wáéíóúñ\s]/gi, '');
-
-        // Detenemos cualquier audio previo por si acaso
-        if (currentAudio) currentAudio.pause();
-        
-        if (data.audio_url) {
-            currentAudio = new Audio();
-            
-            currentAudio.oncanplaythrough = () => {
-                currentAudio.play().catch(e => console.error("Error al reproducir:", e));
-            };
-
-            currentAudio.onplay = () => {
-                animarBocaSincronizada(textoLimpio, currentAudio);
-            };
-
-            currentAudio.onerror = (e) => {
-                console.error("Error cargando audio:", e);
-            };
-
-            currentAudio.onended = () => {
-                mouth.src = "/avatar/mouth_neutral.png";
-                currentAudio = null;
-            };
-
-            currentAudio.src = data.audio_url; // Dispara la carga
+        // Leemos el SSE conforme llega: cada evento termina con una línea en blanco
+        const lector = response.body.getReader();
+        const decodificador = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await lector.read();
+            if (done) break;
+            buffer += decodificador.decode(value, { stream: true });
+            let corte;
+            while ((corte = buffer.indexOf('\n\n')) !== -1) {
+                procesarEventoSSE(buffer.slice(0, corte));
+                buffer = buffer.slice(corte + 2);
+            }
         }
+        abortController = null; // Petición terminada con éxito
 
     } catch (error) {
         removeTypingIndicator();
@@ -1,51 +1,214 @@
+import re
 import time
-from audio_transcriptor import modulo_transcriptor
-from Agente import MaleonChatAgent
-import pyttsx3
+import queue
+import statistics
+import threading
 
-if __name__ == "__main__":
-    transcriptor = modulo_transcriptor(method="google")
-    bot = MaleonChatAgent()
-    engine = pyttsx3.init()
-    engine.setProperty("rate", 150)  
-    engine.setProperty("volume", 1.0)
+# Asistente de voz local en tres hilos que se traslapan:
+#   captura  -> el micrófono nunca se suelta; cada frase terminada va a una cola
+#   reconocer -> speech-to-text de esas frases mientras ya se graba la siguiente
+#   principal -> el agente piensa y le pasa el texto al hilo de voz (pyttsx3)
+# Si el usuario empieza a hablar mientras Maleón habla, se le corta la frase
+# (barge-in) y lo que estaba pendiente de decir se descarta.
 
-    print("\n🟢 Maleon listo. Habla por el micrófono.\n")
+SALIDAS = ["salir", "exit", "adios", "adiós", "bye"]
+
+
+def texto_de_respuesta(respuesta):
+    # bot.handle regresa texto o un dict (herramienta / reporte) que el router web
+    # sabe resolver; por voz se avisa en lugar de tronar en .replace()
+    if isinstance(respuesta, dict):
+        if respuesta.get("type") == "reporte":
+            return "¡Mare! Los reportes los preparo en la página web, nené. Pídamelo por ahí y se lo dejo listo para descargar."
+        if respuesta.get("type") == "function_call":
+            return "Ay nené, esa consulta de datos la tengo en la página web. Ahí se la hago con mucho gusto."
+        return respuesta.get("content", "")
+    return respuesta or ""
+
+
+def texto_para_hablar(respuesta):
+    # Las respuestas traen HTML (botones de mapas y PDFs) que no se lee en voz alta
+    texto = re.sub(r"<[^>]+>", " ", respuesta)
+    texto = " ".join(texto.split())
+    return texto.replace(",", ", … ").replace(".", ". … ")
 
-    while True:
-        try:
-            print("🎙️ Escuchando voz (habla ahora)...", end=" ", flush=True)
-            r = transcriptor.transcribir_desde_micrófono("es-ES")
 
-            if not r["success"]:
-                print(f"\n❌ {r.get('error', 'Error')}")
-                continue
+class Hablante:
 
-            texto = r["text"].strip()
-            print(f"\n🧑: {texto}")
+    # pyttsx3 en su propio hilo con el loop externo (startLoop(False) + iterate):
+    # runAndWait bloquea hasta el final y no deja cortar a media frase.
+    # El motor se crea dentro del hilo porque SAPI5/NSSS no se dejan usar desde otro.
+    def __init__(self, crear_motor):
+        self.crear_motor = crear_motor
+        self.cola = queue.Queue()
+        self.hablando = threading.Event()
+        self._cortar = threading.Event()
+        self._terminado = threading.Event()
+        self.hilo = threading.Thread(target=self._correr, name="hablante", daemon=True)
+        self.hilo.start()
 
-            if texto.lower() in ["salir", "exit", "adios", "bye"]:
-                print("\n👋 Cerrando Maleon\n")
+    def decir(self, texto, al_empezar=None):
+        self.cola.put((texto, al_empezar))
+
+    def pendiente(self):
+        return self.hablando.is_set() or not self.cola.empty()
+
+    def interrumpir(self):
+        while True:
+            try:
+                self.cola.get_nowait()
+            except queue.Empty:
                 break
+        if self.hablando.is_set():
+            self._cortar.set()
+
+    def cerrar(self):
+        self.interrumpir()
+        self.cola.put(None)
+        self.hilo.join(timeout=2)
+
+    def _correr(self):
+        engine = self.crear_motor()
+        engine.connect("finished-utterance", lambda name, completed: self._terminado.set())
+        engine.startLoop(False)
+        try:
+            while True:
+                item = self.cola.get()
+                if item is None:
+                    break
+                texto, al_empezar = item
+                self._cortar.clear()
+                self._terminado.clear()
+                self.hablando.set()
+                if al_empezar:
+                    al_empezar()
+                engine.say(texto)
+                while not self._terminado.is_set() and not self._cortar.is_set():
+                    engine.iterate()
+                    time.sleep(0.01)
+                if self._cortar.is_set():
+                    engine.stop()
+                    # Se deja al driver cerrar la frase antes de la siguiente
+                    limite = time.monotonic() + 0.5
+                    while not self._terminado.is_set() and time.monotonic() < limite:
+                        engine.iterate()
+                        time.sleep(0.01)
+                self.hablando.clear()
+        finally:
+            engine.endLoop()
+
+
+class AsistenteVoz:
+
+    def __init__(self, transcriptor, bot, hablante, lenguaje="es-ES"):
+        self.transcriptor = transcriptor
+        self.bot = bot
+        self.hablante = hablante
+        self.lenguaje = lenguaje
+        self.audios = queue.Queue()
+        self.textos = queue.Queue()
+        self.detener = threading.Event()
+        # Cuántas frases ha empezado el usuario: una respuesta para una frase
+        # vieja ya no se dice si el usuario volvió a hablar mientras se pensaba
+        self.frases = 0
+        # Fin de la frase del usuario -> Maleón empieza a hablar, por turno
+        self.latencias = []
+        self.interrupciones = 0
+
+    def _al_detectar_voz(self):
+        self.frases += 1
+        if self.hablante.pendiente():
+            self.interrupciones += 1
+            print("\n✋ (interrumpido)", flush=True)
+            self.hablante.interrumpir()
 
-            respuesta = bot.handle(texto)
-            respuesta_hablada = (
-                respuesta
-                .replace(",", ", … ")
-                .replace(".", ". … ")
-            )
+    def _capturar(self):
+        try:
+            for audio in self.transcriptor.escuchar_continuo(
+                al_detectar_voz=self._al_detectar_voz,
+                hablando=self.hablante.hablando.is_set,
+                detener=self.detener
+            ):
+                self.audios.put((audio, time.perf_counter(), self.frases))
+        except Exception as e:
+            print(f"\n❌ Error en el micrófono: {e}")
+        finally:
+            self.audios.put(None)
+
+    def _reconocer(self):
+        while True:
+            item = self.audios.get()
+            if item is None:
+                self.textos.put(None)
+                return
+            audio, fin, frase = item
+            self.textos.put((self.transcriptor.reconocer(audio, self.lenguaje), fin, frase))
+
+    def _medir(self, fin):
+        latencia = time.perf_counter() - fin
+        self.latencias.append(latencia)
+        print(f"   ⏱️ {latencia * 1000:.0f} ms", flush=True)
+
+    def correr(self):
+        hilos = [
+            threading.Thread(target=self._capturar, name="captura", daemon=True),
+            threading.Thread(target=self._reconocer, name="reconocer", daemon=True)
+        ]
+        for h in hilos:
+            h.start()
 
-            print(f"🤖 Maleon: {respuesta}\n")
+        print("\n🟢 Maleon listo. Habla por el micrófono.\n")
+        try:
+            while not self.detener.is_set():
+                item = self.textos.get()
+                if item is None:
+                    break
+                r, fin, frase = item
+
+                if not r["success"]:
+                    print(f"\n❌ {r.get('error', 'Error')}")
+                    continue
+
+                texto = r["text"].strip()
+                print(f"\n🧑: {texto}")
 
-            # Maleon habla
-            engine.say(respuesta_hablada)
-            engine.runAndWait()
+                if texto.lower() in SALIDAS:
+                    print("\n👋 Cerrando Maleon\n")
+                    break
 
-            time.sleep(0.3)
+                try:
+                    respuesta = texto_de_respuesta(self.bot.handle(texto))
+                except Exception as e:
+                    print(f"\n❌ Error: {e}\n")
+                    continue
 
+                print(f"🤖 Maleon: {respuesta}\n")
+                if self.frases > frase:
+                    # El usuario ya siguió hablando: su nueva frase trae su propia respuesta
+                    continue
+                self.hablante.decir(texto_para_hablar(respuesta), al_empezar=lambda fin=fin: self._medir(fin))
         except KeyboardInterrupt:
             print("\n\n👋 Cerrando Malon\n")
-            break
-        except Exception as e:
-            print(f"\n❌ Error: {e}\n")
-            continue
+        finally:
+            self.detener.set()
+            self.hablante.cerrar()
+            if self.latencias:
+                print(f"Turnos: {len(self.latencias)} | latencia p50 {statistics.median(self.latencias) * 1000:.0f} ms"
+                      f" | máx {max(self.latencias) * 1000:.0f} ms | interrupciones {self.interrupciones}")
+
+
+def crear_motor():
+    import pyttsx3
+    engine = pyttsx3.init()
+    engine.setProperty("rate", 150)
+    engine.setProperty("volume", 1.0)
+    return engine
+
+
+if __name__ == "__main__":
+    from audio_transcriptor import modulo_transcriptor
+    from app.agent.core import MaleonChatAgent
+
+    transcriptor = modulo_transcriptor(method="google")
+    bot = MaleonChatAgent()
+    AsistenteVoz(transcriptor, bot, Hablante(crear_motor)).correr()